@@ -5,6 +5,8 @@
 wget -qO - https://pgp.mongodb.com/server-6.0.asc | gpg --dearmor | sudo tee /etc/apt/trusted.gpg.d/mongodb-server-6.0.gpg > /dev/null
 echo "deb [ arch=amd64,arm64 ] https://repo.mongodb.org/apt/ubuntu jammy/mongodb-org/6.0 multiverse" | sudo tee /etc/apt/sources.list.d/mongodb-org-6.0.list
 sudo apt-get update
+# jammy's python3 is 3.10. Keep the backend on it: motor 2.x, the newest that
+# djongo's pymongo 3 allows, does not import on Python 3.11+.
 sudo apt-get install -y python3-venv
 sudo apt-get install -y mongodb-org
 sudo mkdir -p /usr/local/etc/vscode-dev-containers
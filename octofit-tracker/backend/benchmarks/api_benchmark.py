@@ -0,0 +1,240 @@
+"""Latency and throughput benchmark for every REST endpoint in urls.py.
+
+Seeds a throwaway ``test_`` database with ``populate_db``, then drives list
+and detail reads plus create/update/delete for each router prefix through
+DRF's test client. Per operation it reports throughput, p50/p95/p99
+latency, djongo SQL queries and MongoDB commands per request, and bytes per
+response, as JSON that can be diffed between commits::
+
+    python benchmarks/api_benchmark.py --users 500 --output before.json
+    # ... change code ...
+    python benchmarks/api_benchmark.py --users 500 --output after.json --compare before.json
+
+``--compare`` exits non-zero when any operation's p95 regresses by more than
+``--threshold``. ``--mongomock`` runs against mongomock instead of a local
+mongod (install it with ``pip install mongomock``); command counts are then
+unavailable because mongomock does not emit pymongo monitoring events.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# payload(n, context) for POST and PATCH per router prefix.
+CREATE_PAYLOADS = {
+    'users': lambda n, ctx: {
+        'email': f'bench{n}@octofit.test', 'username': f'Bench {n}', 'password': 'benchpass',
+        'team_id': ctx['team_id'],
+    },
+    'teams': lambda n, ctx: {'name': f'Bench Team {n}', 'description': 'Benchmark team'},
+    'activities': lambda n, ctx: {
+        'user_id': ctx['user_id'], 'activity_type': 'Running', 'duration': 30, 'distance': 5.0,
+        'calories_burned': 300, 'date': '2026-01-01T07:00:00Z', 'notes': 'benchmark',
+    },
+    'leaderboard': lambda n, ctx: {'team_id': f'bench-{n}', 'total_points': 0, 'rank': 100000 + n},
+    'workouts': lambda n, ctx: {
+        'name': f'Bench Workout {n}', 'description': 'Benchmark', 'difficulty': 'Easy',
+        'duration': 20, 'category': 'Cardio', 'exercises': [],
+    },
+}
+UPDATE_PAYLOADS = {
+    'users': {'username': 'Bench Updated'},
+    'teams': {'description': 'Updated'},
+    'activities': {'calories_burned': 123},
+    'leaderboard': {'total_points': 5},
+    'workouts': {'duration': 40},
+}
+
+
+class CommandCounter:
+    """pymongo CommandListener counting commands issued while enabled."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(samples):
+    latencies = [sample['seconds'] for sample in samples]
+    total = sum(latencies)
+    commands = [sample['commands'] for sample in samples if sample['commands'] is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample['status'] >= 400),
+        'throughput_rps': round(len(samples) / total, 1) if total else None,
+        'p50_ms': round(statistics.median(latencies) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries_per_request': round(statistics.mean(s['queries'] for s in samples), 2),
+        'mongo_commands_per_request': round(statistics.mean(commands), 2) if commands else None,
+        'bytes_per_response': round(statistics.mean(s['bytes'] for s in samples)),
+    }
+
+
+def compare(report, baseline, threshold):
+    """Return human-readable p95 regressions of ``report`` against ``baseline``."""
+    regressions = []
+    for name, current in report['operations'].items():
+        previous = baseline.get('operations', {}).get(name)
+        if not previous or not previous.get('p95_ms'):
+            continue
+        change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms']
+        if change > threshold:
+            regressions.append(f'{name}: p95 {previous["p95_ms"]}ms -> {current["p95_ms"]}ms (+{change:.0%})')
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--teams', type=int, default=10)
+    parser.add_argument('--activities-per-user', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per operation')
+    parser.add_argument('--cold-cache', action='store_true', help='Clear the response cache before each request')
+    parser.add_argument('--mongomock', action='store_true', help='Use mongomock instead of a local mongod')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--compare', help='Baseline JSON report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p95 slowdown, as a fraction')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+    import pymongo
+    from pymongo import monitoring
+
+    counter = None
+    if args.mongomock:
+        import mongomock
+        import djongo.database
+
+        # One shared in-memory server for djongo and the pymongo helpers.
+        client = mongomock.MongoClient()
+        pymongo.MongoClient = djongo.database.MongoClient = lambda *a, **kw: client
+    else:
+        counter = CommandCounter()
+        monitoring.register(counter)
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+    from rest_framework.test import APIClient
+    from octofit_tracker.mongo import get_collection
+    from octofit_tracker.urls import router
+
+    setup_test_environment()
+    old_name = settings.DATABASES['default']['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        call_command(
+            'populate_db', users=args.users, teams=args.teams, seed=args.seed,
+            activities_per_user=args.activities_per_user, stdout=open(os.devnull, 'w'),
+        )
+        from octofit_tracker.models import Team, User
+        context = {
+            'team_id': str(get_collection(Team).find_one({}, {'_id': 1})['_id']),
+            'user_id': str(get_collection(User).find_one({}, {'_id': 1})['_id']),
+        }
+        client = APIClient()
+
+        def measure(method, url, data=None):
+            if args.cold_cache:
+                cache.clear()
+            before = counter.count if counter else None
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(url, data, format='json')
+                seconds = time.perf_counter() - start
+            return response, {
+                'seconds': seconds,
+                'status': response.status_code,
+                'queries': len(queries),
+                'commands': counter.count - before if counter else None,
+                'bytes': len(response.content),
+            }
+
+        operations = {}
+        for prefix, viewset, _ in router.registry:
+            base = f'/api/{prefix}/'
+            model = viewset.queryset.model
+            ids = [str(doc['_id']) for doc in get_collection(model).find({}, {'_id': 1}).limit(args.requests)]
+
+            operations[f'{prefix}.list'] = [measure('get', base)[1] for _ in range(args.requests)]
+            if ids:
+                operations[f'{prefix}.retrieve'] = [
+                    measure('get', f'{base}{ids[i % len(ids)]}/')[1] for i in range(args.requests)
+                ]
+            if prefix not in CREATE_PAYLOADS:
+                continue
+            created, samples = [], []
+            for n in range(args.requests):
+                response, sample = measure('post', base, CREATE_PAYLOADS[prefix](n, context))
+                samples.append(sample)
+                if response.status_code == 201:
+                    created.append(response.data['_id'])
+            operations[f'{prefix}.create'] = samples
+            operations[f'{prefix}.update'] = [
+                measure('patch', f'{base}{object_id}/', UPDATE_PAYLOADS[prefix])[1] for object_id in created
+            ]
+            operations[f'{prefix}.destroy'] = [
+                measure('delete', f'{base}{object_id}/')[1] for object_id in created
+            ]
+
+        report = {
+            'dataset': {
+                'users': args.users, 'teams': args.teams,
+                'activities_per_user': args.activities_per_user, 'seed': args.seed,
+            },
+            'backend': 'mongomock' if args.mongomock else 'mongod',
+            'python': platform.python_version(),
+            'requests_per_operation': args.requests,
+            'operations': {name: summarize(samples) for name, samples in operations.items() if samples},
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(report, json.load(handle), args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
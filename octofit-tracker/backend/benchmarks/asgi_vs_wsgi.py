@@ -0,0 +1,139 @@
+"""Compare the WSGI API against the async (Motor) API under concurrent load.
+
+Start both servers against the same database, e.g.::
+
+    gunicorn octofit_tracker.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+    uvicorn octofit_tracker.asgi:application --workers 4 --port 8001
+
+then run::
+
+    python benchmarks/asgi_vs_wsgi.py --wsgi http://127.0.0.1:8000 \\
+        --asgi http://127.0.0.1:8001 --concurrency 500 --duration 30
+
+Each endpoint pair is driven by ``--concurrency`` keep-alive connections for
+``--duration`` seconds. Requests/sec and p50/p99 latency are printed as JSON.
+Only the standard library is used, so the load generator adds no dependencies.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+# (label, WSGI path, async path)
+ENDPOINTS = [
+    ('activities', '/api/activities/', '/api/async/activities/'),
+    ('leaderboard', '/api/leaderboard/', '/api/async/leaderboard/'),
+    ('stats', '/api/activities/stats/activity_type/', '/api/async/activities/stats/activity_type/'),
+]
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    version, status = status_line.split()[:2]
+    status = int(status)
+    # HTTP/1.0 responses close unless they opt in to keep-alive.
+    length, chunked, close = None, False, version == b'HTTP/1.0'
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value:
+            chunked = True
+        elif name == 'connection':
+            close = value != 'keep-alive' if version == b'HTTP/1.0' else value == 'close'
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+async def _client(host, port, path, deadline, latencies, errors):
+    request = f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n'.encode()
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, close = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+            if close:
+                writer.close()
+                writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors.append('connection')
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run_load(base_url, path, concurrency, duration):
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    latencies, errors = [], []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _client(host, port, path, deadline, latencies, errors) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    return {
+        'url': base_url + path,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+    }
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--wsgi', default='http://127.0.0.1:8000', help='Base URL of the WSGI server')
+    parser.add_argument('--asgi', default='http://127.0.0.1:8001', help='Base URL of the uvicorn server')
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per endpoint and server')
+    args = parser.parse_args(argv)
+
+    report = {'concurrency': args.concurrency, 'duration': args.duration, 'endpoints': {}}
+    for label, sync_path, async_path in ENDPOINTS:
+        wsgi = await run_load(args.wsgi, sync_path, args.concurrency, args.duration)
+        asgi = await run_load(args.asgi, async_path, args.concurrency, args.duration)
+        report['endpoints'][label] = {'wsgi': wsgi, 'asgi': asgi}
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""Password-check throughput of the login hashing pool, per core.
+
+Runs ``--logins`` concurrent ``verify_password`` calls through the same
+thread pool /api/auth/login/ uses, once per worker count, against a hash
+made with the configured PASSWORD_HASHERS. No database is needed::
+
+    python benchmarks/login_benchmark.py --logins 200 --workers 1 2 4 8
+
+Logins/sec and logins/sec per worker are printed as JSON, next to the
+number of CPUs, so the point where extra workers stop helping is visible.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    return parser.parse_args(argv)
+
+
+def run_logins(verify_password, encoded, count):
+    started = time.perf_counter()
+    # One caller thread per login, like request threads waiting on the pool.
+    with ThreadPoolExecutor(count) as callers:
+        results = list(callers.map(lambda _: verify_password('benchmark-password', encoded), range(count)))
+    elapsed = time.perf_counter() - started
+    if not all(results):
+        raise RuntimeError('A password check failed')
+    return elapsed
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth.hashers import identify_hasher, make_password
+    from octofit_tracker import passwords
+
+    encoded = make_password('benchmark-password')
+    settings.OCTOFIT_PASSWORD_QUEUE = args.logins
+    report = {'hasher': identify_hasher(encoded).algorithm, 'cpus': os.cpu_count(), 'logins': args.logins, 'runs': []}
+    for workers in sorted(set(args.workers)):
+        settings.OCTOFIT_PASSWORD_WORKERS = workers
+        passwords.reset_pool()
+        elapsed = run_logins(passwords.verify_password, encoded, args.logins)
+        report['runs'].append({
+            'workers': workers,
+            'logins_per_sec': round(args.logins / elapsed, 1),
+            'logins_per_sec_per_worker': round(args.logins / elapsed / workers, 1),
+        })
+    passwords.reset_pool()
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
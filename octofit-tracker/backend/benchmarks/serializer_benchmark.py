@@ -0,0 +1,101 @@
+"""Throughput of list serialization and JSON rendering on large activity lists.
+
+Builds ``--rows`` in-memory activity records (the rows the repository
+layer hands to serializers; no database is needed) and times, per row
+count, DRF's ``ListSerializer`` + ``JSONRenderer`` against the compiled list
+serializer + ``FastJSONRenderer``, checking that both produce the same bytes::
+
+    python benchmarks/serializer_benchmark.py --rows 100000 --repeat 3
+
+Rows/sec for each stage is printed as JSON. The fast renderer only beats
+the standard one when orjson is installed.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3, help='Best of this many runs per stage')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def make_rows(count, seed):
+    from bson import ObjectId
+    from octofit_tracker.models import Activity
+    from octofit_tracker.repositories import record_class_for
+
+    rng = random.Random(seed)
+    record = record_class_for(Activity)
+    start = datetime(2026, 1, 1)
+    user_ids = [str(ObjectId()) for _ in range(1000)]
+    return [
+        record({
+            '_id': ObjectId(), 'user_id': rng.choice(user_ids), 'activity_type': rng.choice(['Running', 'Yoga', 'Cycling']),
+            'duration': rng.randint(10, 120), 'distance': rng.choice([None, round(rng.uniform(1, 30), 2)]),
+            'calories_burned': rng.randint(50, 900), 'date': start + timedelta(seconds=rng.randint(0, 90 * 86400)),
+            'notes': rng.choice(['', 'Morning session', 'Intervals']),
+        })
+        for _ in range(count)
+    ]
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
+
+    import django
+    django.setup()
+
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.serializers import ListSerializer
+    from octofit_tracker.renderers import FastJSONRenderer, orjson
+    from octofit_tracker.serializers import ActivitySerializer
+
+    rows = make_rows(args.rows, args.seed)
+    drf_seconds, drf_data = best_of(args.repeat, lambda: ListSerializer(rows, child=ActivitySerializer()).data)
+    compiled_seconds, compiled_data = best_of(args.repeat, lambda: ActivitySerializer(rows, many=True).data)
+    json_seconds, drf_bytes = best_of(args.repeat, lambda: JSONRenderer().render(drf_data))
+    fast_seconds, fast_bytes = best_of(args.repeat, lambda: FastJSONRenderer().render(compiled_data))
+    if fast_bytes != drf_bytes:
+        print('Output differs between the DRF and fast paths', file=sys.stderr)
+        return 1
+
+    def rate(seconds):
+        return round(args.rows / seconds)
+
+    print(json.dumps({
+        'rows': args.rows,
+        'bytes': len(fast_bytes),
+        'orjson': orjson is not None,
+        'serialize_rows_per_sec': {'drf': rate(drf_seconds), 'compiled': rate(compiled_seconds)},
+        'render_rows_per_sec': {'json': rate(json_seconds), 'fast': rate(fast_seconds)},
+        'end_to_end_rows_per_sec': {
+            'drf': rate(drf_seconds + json_seconds), 'fast': rate(compiled_seconds + fast_seconds),
+        },
+        'speedup': round((drf_seconds + json_seconds) / (compiled_seconds + fast_seconds), 1),
+    }, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
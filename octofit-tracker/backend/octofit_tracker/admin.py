@@ -1,13 +1,19 @@
 from django.contrib import admin
+from .changelists import PerformanceModeAdmin
 from .models import User, Team, Activity, Leaderboard, Workout
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(PerformanceModeAdmin, admin.ModelAdmin):
     list_display = ['username', 'email', 'team_id', 'created_at']
     search_fields = ['username', 'email']
     list_filter = ['team_id', 'created_at']
     readonly_fields = ['created_at']
 
+    def save_model(self, request, obj, form, change):
+        if 'password' in form.changed_data:
+            obj.set_password(obj.password)
+        super().save_model(request, obj, form, change)
+
 @admin.register(Team)
 class TeamAdmin(admin.ModelAdmin):
     list_display = ['name', 'description', 'created_at']
@@ -15,7 +21,7 @@ class TeamAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 @admin.register(Activity)
-class ActivityAdmin(admin.ModelAdmin):
+class ActivityAdmin(PerformanceModeAdmin, admin.ModelAdmin):
     list_display = ['user_id', 'activity_type', 'duration', 'distance', 'calories_burned', 'date']
     search_fields = ['user_id', 'activity_type']
     list_filter = ['activity_type', 'date']
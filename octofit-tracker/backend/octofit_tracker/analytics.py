@@ -0,0 +1,323 @@
+import logging
+import threading
+import time
+from datetime import date, timedelta, timezone as dt_timezone
+
+from bson import ObjectId
+from django.conf import settings
+from django.utils import timezone
+
+from .leaderboard import team_ids_for_users
+from .models import Activity, User
+from .mongo import get_collection
+from .stats import DATE_FORMATS, parse_when, validate_grouping
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+LOAD_BATCH = 50000
+PROJECTION = {'user_id': 1, 'activity_type': 1, 'duration': 1, 'distance': 1, 'calories_burned': 1, 'date': 1}
+# Catch-ups re-read a little before the previous one; ObjectIds carry each app server's clock.
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def enabled():
+    return np is not None and settings.OCTOFIT_ANALYTICS_STORE
+
+
+def epoch_seconds(when):
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt_timezone.utc)
+    return int(when.timestamp())
+
+
+class _Codes:
+    """Dense integer codes for a growing set of string values."""
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def code(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ActivityColumns:
+    """Activities as NumPy columns for vectorised filters and group-bys.
+
+    A row is 37 bytes: the 12-byte ObjectId (to find it again on delete),
+    an int32 user index, int8 activity_type code, int32 duration, float32
+    distance and calories and int64 epoch seconds. Deletes move the last
+    row into the hole so the columns stay dense.
+    """
+    COLUMNS = {
+        'oid': 'S12',
+        'user': 'int32',
+        'type': 'int8',
+        'duration': 'int32',
+        'distance': 'float32',
+        'calories': 'float32',
+        'date': 'int64',
+    }
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in self.COLUMNS.items()}
+        self.users = _Codes()
+        self.teams = _Codes()
+        self.types = _Codes()
+        self.user_team = np.full(capacity, -1, 'int32')
+
+    def _grow(self, name, array, needed):
+        if needed <= len(array):
+            return array
+        grown = np.zeros(max(needed, 2 * len(array)), array.dtype)
+        if name == 'user_team':
+            grown[:] = -1
+        grown[:len(array)] = array
+        return grown
+
+    def _user_code(self, user_id, team_of):
+        code = self.users.index.get(user_id)
+        if code is None:
+            code = self.users.code(user_id)
+            self.user_team = self._grow('user_team', self.user_team, code + 1)
+            team_id = team_of.get(user_id)
+            self.user_team[code] = self.teams.code(team_id) if team_id else -1
+        return code
+
+    def append(self, documents, team_of):
+        count = len(documents)
+        if not count:
+            return
+        for name, array in self.columns.items():
+            self.columns[name] = self._grow(name, array, self.size + count)
+        rows = slice(self.size, self.size + count)
+        columns = self.columns
+        columns['oid'][rows] = [document['_id'].binary for document in documents]
+        columns['user'][rows] = [self._user_code(document['user_id'], team_of) for document in documents]
+        types = [self.types.code(document['activity_type']) for document in documents]
+        if len(self.types.values) > 127:
+            raise ValueError('More than 127 activity types do not fit the int8 type column')
+        columns['type'][rows] = types
+        columns['duration'][rows] = [document.get('duration') or 0 for document in documents]
+        columns['distance'][rows] = [document.get('distance') or 0 for document in documents]
+        columns['calories'][rows] = [document.get('calories_burned') or 0 for document in documents]
+        columns['date'][rows] = [epoch_seconds(document['date']) for document in documents]
+        self.size += count
+
+    def _oids(self, documents):
+        return np.array([document['_id'].binary for document in documents], 'S12')
+
+    def missing(self, documents):
+        """The documents whose rows are not loaded yet."""
+        if not documents:
+            return []
+        present = np.isin(self._oids(documents), self.columns['oid'][:self.size])
+        return [document for document, found in zip(documents, present) if not found]
+
+    def remove(self, documents):
+        if not documents or not self.size:
+            return
+        rows = np.flatnonzero(np.isin(self.columns['oid'][:self.size], self._oids(documents)))
+        if not rows.size:
+            return
+        # Fill the holes below the new size with the surviving rows above it.
+        size = self.size - rows.size
+        holes = rows[rows < size]
+        tail = np.arange(size, self.size)
+        movers = tail[~np.isin(tail, rows)]
+        for array in self.columns.values():
+            array[holes] = array[movers]
+        self.size = size
+
+    def mask(self, query_params):
+        """Boolean row mask for the user_id/team_id/activity_type/since/until filters."""
+        columns = {name: array[:self.size] for name, array in self.columns.items()}
+        mask = np.ones(self.size, bool)
+        if query_params.get('user_id'):
+            mask &= columns['user'] == self.users.index.get(query_params['user_id'], -1)
+        if query_params.get('team_id'):
+            team = self.teams.index.get(query_params['team_id'], -2)
+            mask &= self.user_team[columns['user']] == team
+        if query_params.get('activity_type'):
+            mask &= columns['type'] == self.types.index.get(query_params['activity_type'], -1)
+        if query_params.get('since'):
+            mask &= columns['date'] >= epoch_seconds(parse_when('since', query_params['since']))
+        if query_params.get('until'):
+            mask &= columns['date'] < epoch_seconds(parse_when('until', query_params['until']))
+        return mask
+
+    def _group_codes(self, group_by, rows):
+        """Return one group code per selected row and the key for each code."""
+        if group_by is None:
+            return np.zeros(len(rows['user']), 'int64'), [None]
+        if group_by == 'user':
+            return rows['user'], self.users.values
+        if group_by == 'team':
+            codes = self.user_team[rows['user']]
+            # -1 (no team) becomes the last code, keyed None like the Mongo path.
+            return np.where(codes < 0, len(self.teams.values), codes), self.teams.values + [None]
+        if group_by == 'activity_type':
+            return rows['type'], self.types.values
+        days, day_codes = np.unique(rows['date'] // SECONDS_PER_DAY, return_inverse=True)
+        labels = [date.fromordinal(EPOCH_ORDINAL + int(day)).strftime(DATE_FORMATS[group_by]) for day in days]
+        keys = sorted(set(labels))
+        position = {key: code for code, key in enumerate(keys)}
+        return np.array([position[label] for label in labels], 'int64')[day_codes], keys
+
+    def stats(self, group_by, query_params):
+        """Totals per group, shaped and ordered like ``stats.activity_stats``."""
+        mask = self.mask(query_params)
+        if not mask.any():
+            return []
+        rows = {name: array[:self.size][mask] for name, array in self.columns.items()}
+        codes, keys = self._group_codes(group_by, rows)
+        groups, inverse = np.unique(codes, return_inverse=True)
+        counts = np.bincount(inverse)
+        totals = {
+            name: np.bincount(inverse, weights=rows[column].astype('float64'))
+            for name, column in (('duration', 'duration'), ('distance', 'distance'), ('calories_burned', 'calories'))
+        }
+        results = [
+            {
+                'key': keys[group],
+                'count': int(counts[i]),
+                'duration': int(round(totals['duration'][i])),
+                'distance': round(float(totals['distance'][i]), 2),
+                'calories_burned': int(round(totals['calories_burned'][i])),
+            }
+            for i, group in enumerate(groups)
+        ]
+        return sorted(results, key=lambda row: (row['key'] is None, row['key'] or ''))
+
+
+class AnalyticsStore:
+    """Process-wide ActivityColumns, loaded on first use and fed by activity writes.
+
+    Writes made by other processes are picked up off the request path: a
+    background catch-up appends the activities inserted since the previous
+    one every OCTOFIT_ANALYTICS_SYNC_SECONDS, and a background reload every
+    OCTOFIT_ANALYTICS_RELOAD_SECONDS picks up their edits and deletes and
+    users' team changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.columns = None
+        # In-process changes made while a reload reads the collection, replayed onto it.
+        self.journal = None
+        self.loaded_at = self.synced_at = 0.0
+        self.caught_up_to = None
+
+    def _change(self, columns, added, removed, team_of):
+        columns.remove(removed)
+        columns.append(columns.missing(added), team_of)
+
+    def _load(self):
+        with self._lock:
+            self.journal = []
+        started = timezone.now()
+        try:
+            team_of = {
+                str(doc['_id']): doc['team_id']
+                for doc in get_collection(User).find({'team_id': {'$nin': [None, '']}}, {'team_id': 1})
+            }
+            columns = ActivityColumns(capacity=max(get_collection(Activity).estimated_document_count(), 1024))
+            batch = []
+            for document in get_collection(Activity).find({}, PROJECTION).batch_size(LOAD_BATCH):
+                batch.append(document)
+                if len(batch) >= LOAD_BATCH:
+                    columns.append(batch, team_of)
+                    batch = []
+            columns.append(batch, team_of)
+        except Exception:
+            with self._lock:
+                self.journal = None
+            raise
+        with self._lock:
+            journal, self.journal = self.journal, None
+            for added, removed, added_teams in journal:
+                self._change(columns, added, removed, added_teams)
+            self.columns = columns
+            self.loaded_at = self.synced_at = time.monotonic()
+            self.caught_up_to = started
+
+    def _catch_up(self):
+        started = timezone.now()
+        first_id = ObjectId.from_datetime(self.caught_up_to - SYNC_OVERLAP)
+        documents = list(get_collection(Activity).find({'_id': {'$gte': first_id}}, PROJECTION))
+        team_of = team_ids_for_users(document['user_id'] for document in documents)
+        with self._lock:
+            self._change(self.columns, documents, (), team_of)
+            self.synced_at = time.monotonic()
+            self.caught_up_to = started
+
+    def refresh(self, full=False):
+        """Bring the columns up to date with the database; ``full`` reloads them."""
+        with self._refreshing:
+            self._refresh(full)
+
+    def _refresh(self, full):
+        if full or self.columns is None or time.monotonic() - self.loaded_at > settings.OCTOFIT_ANALYTICS_RELOAD_SECONDS:
+            self._load()
+        else:
+            self._catch_up()
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh(False)
+        except Exception:
+            logger.exception('Analytics refresh failed')
+        finally:
+            self._refreshing.release()
+
+    def schedule_refresh(self):
+        """Start a background refresh if one is due and none is running."""
+        if time.monotonic() - self.synced_at < settings.OCTOFIT_ANALYTICS_SYNC_SECONDS:
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return
+        threading.Thread(target=self._refresh_in_background, name='analytics-refresh', daemon=True).start()
+
+    def apply(self, added, removed):
+        team_of = team_ids_for_users(activity['user_id'] for activity in added) if added else {}
+        with self._lock:
+            if self.journal is not None:
+                self.journal.append((added, removed, team_of))
+            if self.columns is not None:
+                self._change(self.columns, added, removed, team_of)
+
+    def stats(self, group_by, query_params):
+        validate_grouping(group_by)
+        if self.columns is None:
+            with self._refreshing:
+                if self.columns is None:
+                    self._load()
+        else:
+            self.schedule_refresh()
+        with self._lock:
+            return self.columns.stats(group_by, query_params)
+
+
+store = AnalyticsStore()
+
+
+def apply_activity_changes(added=(), removed=()):
+    """Keep the loaded columns in step with activity writes."""
+    if enabled():
+        store.apply(added, removed)
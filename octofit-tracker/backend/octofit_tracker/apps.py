@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class OctofitTrackerConfig(AppConfig):
+    name = 'octofit_tracker'
+
+    def ready(self):
+        from . import profiling, signals  # noqa: F401
+        if settings.OCTOFIT_PROFILING:
+            # Listeners only attach to MongoClients created after registration.
+            profiling.install()
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup; the stream needs configured settings.
+from octofit_tracker.sse import LEADERBOARD_STREAM_PATH, leaderboard_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django 4.1 cannot stream from async iterators, so the event stream is
+    # served beside it rather than through a view.
+    if scope['type'] == 'http' and scope['path'] == LEADERBOARD_STREAM_PATH:
+        return await leaderboard_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
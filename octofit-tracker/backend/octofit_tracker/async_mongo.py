@@ -0,0 +1,34 @@
+import asyncio
+import weakref
+
+from django.conf import settings
+from django.db import connections
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Motor clients are bound to the event loop they were first used on. ASGI
+# servers keep one loop per worker; under WSGI each async view call gets a
+# fresh loop and so a fresh client, which is why these routes are ASGI-only.
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client(alias='default'):
+    """Return the pooled Motor client for ``alias`` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    client = clients.get(alias)
+    if client is None:
+        client = AsyncIOMotorClient(
+            **connections[alias].settings_dict.get('CLIENT', {}),
+            maxPoolSize=settings.OCTOFIT_ASYNC_MONGO_POOL_SIZE,
+            tz_aware=True,
+        )
+        clients[alias] = client
+    return client
+
+
+def get_async_db(alias='default'):
+    return get_async_client(alias)[connections[alias].settings_dict['NAME']]
+
+
+def get_async_collection(model, alias='default'):
+    return get_async_db(alias)[model._meta.db_table]
@@ -0,0 +1,86 @@
+from django.http import JsonResponse
+from rest_framework.exceptions import ValidationError
+
+from .async_mongo import get_async_collection
+from .keyset import NEWEST_FIRST, decode_cursor, encode_cursor, newest_first_after
+from .models import Activity, Leaderboard, User
+from .mongo import to_object_id
+from .serializers import ActivitySerializer, LeaderboardSerializer, represent_document
+from .stats import EMPTY_TOTALS, build_match, format_stats, stats_pipeline
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+ACTIVITY_FIELDS = ActivitySerializer.Meta.fields
+LEADERBOARD_FIELDS = LeaderboardSerializer.Meta.fields
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+async def activity_list(request):
+    """Newest-first activities with keyset pagination on (date, _id)."""
+    query = {}
+    if request.GET.get('cursor'):
+        try:
+            query = newest_first_after(*decode_cursor(request.GET['cursor']))
+        except ValueError as exc:
+            return JsonResponse({'detail': str(exc)}, status=404)
+    size = _page_size(request)
+    projection = dict.fromkeys(ACTIVITY_FIELDS, 1)
+    cursor = get_async_collection(Activity).find(query, projection).sort(NEWEST_FIRST).limit(size + 1)
+    documents = await cursor.to_list(size + 1)
+
+    next_url = None
+    if len(documents) > size:
+        documents = documents[:size]
+        params = request.GET.copy()
+        params['cursor'] = encode_cursor(documents[-1]['date'], documents[-1]['_id'])
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    return JsonResponse({
+        'next': next_url,
+        'previous': None,
+        'results': [represent_document(document, ACTIVITY_FIELDS) for document in documents],
+    })
+
+
+async def leaderboard(request):
+    projection = dict.fromkeys(LEADERBOARD_FIELDS, 1)
+    cursor = get_async_collection(Leaderboard).find({}, projection).sort('rank', 1).limit(MAX_PAGE_SIZE)
+    documents = await cursor.to_list(MAX_PAGE_SIZE)
+    return JsonResponse({
+        'next': None,
+        'previous': None,
+        'results': [represent_document(document, LEADERBOARD_FIELDS) for document in documents],
+    })
+
+
+async def _team_ids_for_users(user_ids):
+    object_ids = [oid for oid in map(to_object_id, set(user_ids)) if oid is not None]
+    cursor = get_async_collection(User).find({'_id': {'$in': object_ids}}, {'team_id': 1})
+    return {str(doc['_id']): doc['team_id'] async for doc in cursor if doc.get('team_id')}
+
+
+async def activity_stats(request, group_by=None):
+    """Async twin of ActivityViewSet.stats / grouped_stats."""
+    try:
+        team_users = None
+        if request.GET.get('team_id'):
+            cursor = get_async_collection(User).find({'team_id': request.GET['team_id']}, {'_id': 1})
+            team_users = [str(doc['_id']) async for doc in cursor]
+        pipeline = stats_pipeline(group_by, build_match(request.GET, team_users))
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+
+    rows = await get_async_collection(Activity).aggregate(pipeline, allowDiskUse=True).to_list(None)
+    team_of = await _team_ids_for_users(row['_id'] for row in rows) if group_by == 'team' else None
+    rows = format_stats(rows, team_of)
+    if group_by is None:
+        return JsonResponse(rows[0] if rows else EMPTY_TOTALS)
+    return JsonResponse({'group_by': group_by, 'results': rows})
+
@@ -0,0 +1,97 @@
+from pymongo.errors import BulkWriteError
+
+from .derived import apply_activity_changes
+from .models import Activity
+from .mongo import get_collection
+
+BULK_MAX_ITEMS = 1000
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _activity_document(validated_data, idempotency_key):
+    # Build through the model so field defaults match what djongo would store.
+    activity = Activity(**validated_data, idempotency_key=idempotency_key)
+    return {
+        field.attname: getattr(activity, field.attname)
+        for field in Activity._meta.concrete_fields
+        if field.attname != '_id'
+    }
+
+
+def bulk_create_activities(items, serializer):
+    """Validate and insert a batch of activities, returning one result per item.
+
+    ``serializer`` is an unvalidated ``ActivitySerializer(data=items, many=True)``.
+    Items carrying an ``idempotency_key`` that was already stored, or that
+    repeats earlier in the batch, are reported as duplicates instead of being
+    inserted again. Valid rows go to MongoDB in one unordered
+    ``insert_many`` and derived data is updated once for the whole batch.
+    """
+    if serializer.is_valid():
+        errors = [{}] * len(items)
+        validated = list(serializer.validated_data)
+    else:
+        errors = serializer.errors
+        validated = [
+            serializer.child.run_validation(item) if not error else None
+            for item, error in zip(items, errors)
+        ]
+
+    keys = [
+        item.get('idempotency_key') if isinstance(item, dict) else None
+        for item in items
+    ]
+    keys = [str(key) if key not in (None, '') else None for key in keys]
+    collection = get_collection(Activity)
+    seen = {
+        doc['idempotency_key']: doc['_id']
+        for doc in collection.find(
+            {'idempotency_key': {'$in': [key for key in keys if key]}},
+            {'idempotency_key': 1},
+        )
+    }
+
+    results = [None] * len(items)
+    pending = []
+    for index, (key, data, error) in enumerate(zip(keys, validated, errors)):
+        if error:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': error}
+        elif key and key in seen:
+            results[index] = {'index': index, 'status': 'duplicate', '_id': seen[key]}
+        else:
+            if key:
+                seen[key] = None
+            pending.append((index, _activity_document(data, key)))
+
+    inserted = []
+    if pending:
+        documents = [document for _, document in pending]
+        failed = {}
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as exc:
+            failed = {error['index']: error for error in exc.details['writeErrors']}
+        for position, (index, document) in enumerate(pending):
+            error = failed.get(position)
+            if error is None:
+                inserted.append(document)
+                results[index] = {'index': index, 'status': 'created', '_id': document['_id']}
+            elif error['code'] == DUPLICATE_KEY_ERROR:
+                # Another request stored the same key between our lookup and insert.
+                existing = collection.find_one({'idempotency_key': document['idempotency_key']}, {'_id': 1})
+                results[index] = {'index': index, 'status': 'duplicate', '_id': existing and existing['_id']}
+            else:
+                results[index] = {'index': index, 'status': 'failed', 'errors': {'non_field_errors': [error['errmsg']]}}
+
+    # Keys repeated within the batch point at the row that was created.
+    created_ids = {doc['idempotency_key']: doc['_id'] for doc in inserted if doc['idempotency_key']}
+    for result, key in zip(results, keys):
+        if result['status'] == 'duplicate' and result['_id'] is None:
+            result['_id'] = created_ids.get(key)
+
+    if inserted:
+        apply_activity_changes(added=inserted)
+    for result in results:
+        if result.get('_id') is not None:
+            result['_id'] = str(result['_id'])
+    return results
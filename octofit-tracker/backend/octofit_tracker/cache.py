@@ -0,0 +1,81 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from rest_framework import status
+from rest_framework.response import Response
+
+KEY_PREFIX = 'octofit'
+
+
+def _generation_key(model):
+    return f'{KEY_PREFIX}:generation:{model._meta.label_lower}'
+
+
+def get_generation(model):
+    generation = cache.get(_generation_key(model))
+    if generation is None:
+        # add() so concurrent first readers agree on one starting value.
+        cache.add(_generation_key(model), 1, timeout=None)
+        generation = cache.get(_generation_key(model), 1)
+    return generation
+
+
+def invalidate_model(model):
+    """Make every cached response for ``model`` unreachable.
+
+    Bumping a per-model generation is O(1) on any backend; the orphaned
+    entries are evicted by the cache's LRU policy.
+    """
+    try:
+        cache.incr(_generation_key(model))
+    except ValueError:
+        cache.set(_generation_key(model), 2, timeout=None)
+
+
+def make_etag(data):
+    payload = json.dumps(data, sort_keys=True, default=str).encode()
+    return '"%s"' % hashlib.md5(payload).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return header.strip() == '*' or etag in [tag.strip() for tag in header.split(',')]
+
+
+class CachedResponseMixin:
+    """Read-through cache for list/retrieve with ETag / If-None-Match support.
+
+    Entries are keyed by scheme, host, path, sorted query params and rendered
+    format, since bodies carry absolute next/previous links, and are dropped
+    when the model's post_save/post_delete signals fire.
+    """
+    cache_timeout = DEFAULT_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        query = sorted(request.query_params.lists())
+        raw = json.dumps([request.scheme, request.get_host(), request.path, query, request.accepted_renderer.format])
+        model = self.get_queryset().model
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        return f'{KEY_PREFIX}:response:{model._meta.label_lower}:{get_generation(model)}:{digest}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = (make_etag(response.data), response.data)
+            cache.set(key, cached, timeout=self.cache_timeout)
+        etag, data = cached
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
@@ -0,0 +1,202 @@
+from django.conf import settings
+from django.contrib.admin.filters import AllValuesFieldListFilter, FieldListFilter
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import BooleanField, DateField, Q
+from django.utils.functional import cached_property
+
+from .cache import KEY_PREFIX
+from .keyset import decode_cursor, encode_cursor
+from .mongo import get_collection
+
+CURSOR_VAR = 'cursor'
+
+
+def enabled():
+    return settings.OCTOFIT_ADMIN_PERFORMANCE_MODE
+
+
+def prefix_upper_bound(prefix):
+    """Smallest string greater than every string starting with ``prefix``."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never runs djongo's ``COUNT``, which walks every document.
+
+    An unfiltered changelist's size comes from ``estimated_document_count``,
+    which costs the same at any size. A filtered one is only counted up to
+    ``page_number``'s rows plus one more, enough to know a next page exists.
+    """
+
+    def __init__(self, *args, page_number=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_number = page_number
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            return get_collection(self.object_list.model).estimated_document_count()
+        offset = (self.page_number - 1) * self.per_page
+        return offset + len(self.object_list.values_list('pk', flat=True)[offset:offset + self.per_page + 1])
+
+
+class CachedValuesFieldListFilter(AllValuesFieldListFilter):
+    """AllValuesFieldListFilter whose choices come from a cached ``distinct``.
+
+    Django builds the choices with a ``SELECT DISTINCT`` over the whole
+    collection on every changelist load; this asks MongoDB for the distinct
+    values once per OCTOFIT_ADMIN_CHOICES_SECONDS.
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = field_path
+        self.lookup_kwarg_isnull = f'{field_path}__isnull'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        self.lookup_val_isnull = params.get(self.lookup_kwarg_isnull)
+        self.empty_value_display = model_admin.get_empty_value_display()
+        self.lookup_choices = self.cached_choices(model, field)
+        FieldListFilter.__init__(self, field, request, params, model, model_admin, field_path)
+
+    @staticmethod
+    def cached_choices(model, field):
+        key = f'{KEY_PREFIX}:admin-choices:{model._meta.label_lower}:{field.attname}'
+        choices = cache.get(key)
+        if choices is None:
+            values = get_collection(model).distinct(field.attname)
+            choices = sorted(value for value in values if value is not None)
+            if len(choices) < len(values):
+                choices.append(None)
+            cache.set(key, choices, settings.OCTOFIT_ADMIN_CHOICES_SECONDS)
+        return choices
+
+
+def uses_all_values_filter(field):
+    # The fields Django would give AllValuesFieldListFilter.
+    return not (field.choices or field.is_relation or isinstance(field, (BooleanField, DateField)))
+
+
+class KeysetChangeList(ChangeList):
+    """ChangeList paged by ``?cursor=`` on (date, _id) instead of ``?p=`` offsets.
+
+    Applies while the list is in the admin's default newest-first order;
+    other orderings fall back to numbered pages. Either way the unfiltered
+    count comes from EstimatedCountPaginator, and filtered or searched
+    lists are not counted at all and only say whether another page follows.
+    """
+    keyset_field = 'date'
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, search and sort links start again from the first page.
+        if CURSOR_VAR not in (new_params or {}):
+            remove = [CURSOR_VAR] + list(remove or [])
+        return super().get_query_string(new_params, remove)
+
+    def uses_keyset(self, request):
+        return ORDER_VAR not in self.params and not self.list_editable \
+            and list(dict.fromkeys(self.get_ordering(request, self.queryset))) == [f'-{self.keyset_field}', '-pk']
+
+    def get_results(self, request):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.keyset = self.uses_keyset(request)
+        self.estimated_count = not self.queryset.query.where
+        if not self.keyset:
+            return self.get_page_results(request)
+        queryset = self.queryset
+        if self.cursor:
+            try:
+                date, object_id = decode_cursor(self.cursor)
+            except ValueError:
+                raise IncorrectLookupParameters
+            field = self.keyset_field
+            queryset = queryset.filter(Q(**{f'{field}__lt': date}) | Q(**{field: date, 'pk__lt': object_id}))
+        rows = list(queryset[:self.list_per_page + 1])
+        self.next_url = None
+        if len(rows) > self.list_per_page:
+            rows = rows[:self.list_per_page]
+            last = rows[-1]
+            self.next_url = self.get_query_string({CURSOR_VAR: encode_cursor(getattr(last, self.keyset_field), last.pk)})
+        self.first_url = self.get_query_string() if self.cursor else None
+
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        # A filtered count is a full COUNT in djongo; report this page's rows instead.
+        self.result_count = self.paginator.count if self.estimated_count else len(rows)
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = rows
+        self.can_show_all = False
+        self.multi_page = bool(self.next_url or self.cursor)
+
+    def get_page_results(self, request):
+        if self.estimated_count:
+            return super().get_results(request)
+        # Showing every filtered row at once is the unbounded read this avoids.
+        self.show_all = False
+        super().get_results(request)
+        has_next = self.result_count > self.page_num * self.list_per_page
+        self.next_url = self.get_query_string({PAGE_VAR: self.page_num + 1}) if has_next else None
+        self.first_url = self.get_query_string(remove=[PAGE_VAR]) if self.page_num > 1 else None
+        self.result_list = list(self.result_list)
+        self.result_count = len(self.result_list)
+        self.can_show_all = False
+
+
+class PerformanceModeAdmin:
+    """ModelAdmin mixin for large collections, active with OCTOFIT_ADMIN_PERFORMANCE_MODE.
+
+    Counts are estimated or skipped, plain value filters use cached choices,
+    search matches prefixes with index range scans instead of ``icontains``
+    regexes, and admins ordered newest first page by keyset.
+    """
+
+    @property
+    def change_list_template(self):
+        return 'admin/keyset_change_list.html' if enabled() else None
+
+    @property
+    def show_full_result_count(self):
+        # Django would COUNT the whole collection for "N results (M total)".
+        return not enabled()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList if enabled() else super().get_changelist(request, **kwargs)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if not enabled():
+            return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+        try:
+            page_number = max(int(request.GET.get(PAGE_VAR, 1)), 1)
+        except ValueError:
+            page_number = 1
+        return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page, page_number=page_number)
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if not enabled():
+            return list_filter
+        return [
+            (name, CachedValuesFieldListFilter)
+            if isinstance(name, str) and '__' not in name and uses_all_values_filter(self.model._meta.get_field(name))
+            else name
+            for name in list_filter
+        ]
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not enabled() or not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        # Case-sensitive, so each field's index bounds the scan.
+        upper = prefix_upper_bound(search_term)
+        condition = Q()
+        for name in self.get_search_fields(request):
+            name = name.lstrip('^=@')
+            condition |= Q(**{f'{name}__gte': search_term, f'{name}__lt': upper})
+        return queryset.filter(condition), False
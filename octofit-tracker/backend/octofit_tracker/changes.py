@@ -0,0 +1,220 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from pymongo import DeleteOne, ReplaceOne
+
+from .cache import invalidate_model
+from .derived import SNAPSHOT_FIELDS, dispatch_activity_changes, document_snapshot
+from .leaderboard import apply_team_moves, rerank
+from .models import Activity, Leaderboard, Team, User
+from .mongo import get_collection, get_db, to_object_id
+from .rankings import remove_user_totals
+
+# Dispatched in this order, so team and membership changes land before the
+# activities of the same batch are attributed to teams.
+NAMESPACES = (Team._meta.db_table, User._meta.db_table, Activity._meta.db_table)
+CHANGE_HANDLERS = {
+    Team._meta.db_table: ('octofit_tracker.changes.team_changes',),
+    User._meta.db_table: ('octofit_tracker.changes.user_changes',),
+    Activity._meta.db_table: ('octofit_tracker.changes.activity_changes',),
+}
+TOKEN_COLLECTION = 'change_stream_tokens'
+# Fields remembered per document, so updates and deletes know what they replaced.
+STATE_FIELDS = {
+    User._meta.db_table: ('team_id',),
+    Activity._meta.db_table: SNAPSHOT_FIELDS[1:],
+}
+OPERATIONS = ('insert', 'update', 'replace', 'delete')
+
+
+def change_handlers():
+    configured = getattr(settings, 'OCTOFIT_CHANGE_HANDLERS', CHANGE_HANDLERS)
+    return {namespace: [import_string(path) for path in paths] for namespace, paths in configured.items()}
+
+
+def state_collection(namespace):
+    return get_db()[f'change_state_{namespace}']
+
+
+def load_token(name):
+    document = get_db()[TOKEN_COLLECTION].find_one({'_id': name})
+    return document['token'] if document else None
+
+
+def save_token(name, token):
+    get_db()[TOKEN_COLLECTION].update_one(
+        {'_id': name}, {'$set': {'token': token, 'updated_at': timezone.now()}}, upsert=True
+    )
+
+
+def clear_token(name):
+    get_db()[TOKEN_COLLECTION].delete_one({'_id': name})
+
+
+def seed_state():
+    """Remember the current fields of every watched document, replacing any old state.
+
+    Runs once, when a watcher starts without a resume token.
+    """
+    for namespace, fields in STATE_FIELDS.items():
+        collection = state_collection(namespace)
+        collection.delete_many({})
+        batch = []
+        for document in get_db()[namespace].find({}, dict.fromkeys(fields, 1)):
+            batch.append(document)
+            if len(batch) >= 1000:
+                collection.insert_many(batch)
+                batch = []
+        if batch:
+            collection.insert_many(batch)
+
+
+def latest_documents(events):
+    """Collapse a batch to each document's state after its last event; None if deleted."""
+    latest = {}
+    for event in events:
+        document = event.get('fullDocument')
+        # An update's looked-up document is None when a later write deleted it.
+        latest[event['documentKey']['_id']] = None if event['operationType'] == 'delete' else document
+    return latest
+
+
+def load_state(namespace, ids):
+    return {document['_id']: document for document in state_collection(namespace).find({'_id': {'$in': list(ids)}})}
+
+
+def save_state(namespace, latest):
+    fields = STATE_FIELDS[namespace]
+    operations = [
+        DeleteOne({'_id': _id}) if document is None
+        else ReplaceOne({'_id': _id}, {field: document.get(field) for field in fields}, upsert=True)
+        for _id, document in latest.items()
+    ]
+    if operations:
+        state_collection(namespace).bulk_write(operations, ordered=False)
+
+
+def stream_teams(user_ids):
+    """Map user ids to the team each had at this point in the stream."""
+    object_ids = [oid for oid in map(to_object_id, set(user_ids)) if oid is not None]
+    return {str(_id): document.get('team_id') for _id, document in load_state(User._meta.db_table, object_ids).items()}
+
+
+def activity_changes(events):
+    """Fold a batch of activity events into derived data as net added/removed rows.
+
+    The previous version of each document comes from the remembered state.
+    Rows carry their user's team from the remembered user state rather
+    than the users collection, which may already reflect later team moves.
+    """
+    latest = latest_documents(events)
+    before = load_state(Activity._meta.db_table, latest)
+    added, removed = [], []
+    for _id, document in latest.items():
+        old = document_snapshot(before[_id]) if _id in before else None
+        new = document_snapshot(dict(document, _id=_id)) if document is not None else None
+        if old != new:
+            removed += [old] if old else []
+            added += [new] if new else []
+    team_of = stream_teams(row['user_id'] for row in added + removed)
+    for row in added + removed:
+        row['team_id'] = team_of.get(row['user_id'])
+    dispatch_activity_changes(added, removed)
+    save_state(Activity._meta.db_table, latest)
+
+
+def user_changes(events):
+    """Move a user's points between teams when their ``team_id`` changes; drop deleted users' totals."""
+    latest = latest_documents(events)
+    before = load_state(User._meta.db_table, latest)
+    apply_team_moves({
+        _id: ((before.get(_id) or {}).get('team_id'), (document or {}).get('team_id'))
+        for _id, document in latest.items()
+    })
+    remove_user_totals(_id for _id, document in latest.items() if document is None)
+    save_state(User._meta.db_table, latest)
+
+
+def team_changes(events):
+    """Drop deleted teams from the leaderboard and invalidate cached team responses."""
+    deleted = [str(_id) for _id, document in latest_documents(events).items() if document is None]
+    if deleted:
+        get_collection(Leaderboard).delete_many({'team_id': {'$in': deleted}})
+        rerank()
+    invalidate_model(Team)
+    invalidate_model(Leaderboard)
+
+
+def dispatch(events, handlers=None):
+    handlers = handlers if handlers is not None else change_handlers()
+    by_namespace = defaultdict(list)
+    for event in events:
+        by_namespace[event['ns']['coll']].append(event)
+    for namespace in NAMESPACES:
+        if by_namespace[namespace]:
+            for handler in handlers.get(namespace, ()):
+                handler(by_namespace[namespace])
+
+
+class ChangeWatcher:
+    """Tail one database-level change stream over NAMESPACES in batches.
+
+    A batch closes when ``batch_size`` events have arrived or ``max_wait``
+    seconds have passed, and the resume token is saved only after its
+    handlers ran, so a restart re-delivers at most the unfinished batch.
+    Events already recorded in the per-document state are skipped, but a
+    crash between a handler's derived writes and its ``save_state`` applies
+    that batch's changes twice, which rebuild_leaderboard, rebuild_rankings
+    and backfill_rollups repair.
+    """
+
+    def __init__(self, name='derived', batch_size=500, max_wait=0.5):
+        self.name = name
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.handlers = change_handlers()
+
+    def watch(self, token):
+        pipeline = [{'$match': {'ns.coll': {'$in': list(NAMESPACES)}, 'operationType': {'$in': list(OPERATIONS)}}}]
+        return get_db().watch(
+            pipeline, full_document='updateLookup', resume_after=token,
+            max_await_time_ms=int(self.max_wait * 1000), batch_size=self.batch_size,
+        )
+
+    def open_stream(self):
+        token = load_token(self.name)
+        stream = self.watch(token)
+        if token is None:
+            # After opening, so no write falls between the state and the stream.
+            # Writes made while seeding count as already applied.
+            seed_state()
+        return stream
+
+    def next_batch(self, stream):
+        events = []
+        deadline = time.monotonic() + self.max_wait
+        while len(events) < self.batch_size and time.monotonic() < deadline:
+            event = stream.try_next()
+            if event is None:
+                break
+            events.append(event)
+        return events
+
+    def run(self, stream, on_batch=None):
+        """Dispatch batches until the stream closes; returns the number of events handled."""
+        handled = 0
+        token = None
+        while stream.alive:
+            events = self.next_batch(stream)
+            if events:
+                dispatch(events, self.handlers)
+                handled += len(events)
+            if stream.resume_token is not None and stream.resume_token != token:
+                token = stream.resume_token
+                save_token(self.name, token)
+            if events and on_batch:
+                on_batch(events)
+        return handled
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Each handler takes ``added`` and ``removed`` lists of activity snapshots.
+ACTIVITY_HANDLERS = (
+    'octofit_tracker.leaderboard.apply_activity_changes',
+    'octofit_tracker.rollups.apply_activity_changes',
+    'octofit_tracker.rankings.apply_activity_changes',
+    'octofit_tracker.scoring.apply_activity_changes',
+    'octofit_tracker.analytics.apply_activity_changes',
+    'octofit_tracker.feeds.apply_activity_changes',
+)
+
+
+SNAPSHOT_FIELDS = ('_id', 'user_id', 'activity_type', 'duration', 'distance', 'calories_burned', 'date')
+
+
+def activity_snapshot(activity):
+    """Capture the fields derived data depends on from an Activity instance."""
+    return {field: getattr(activity, field) for field in SNAPSHOT_FIELDS}
+
+
+def document_snapshot(document):
+    """Same as ``activity_snapshot`` for a raw activities document."""
+    return {field: document.get(field) for field in SNAPSHOT_FIELDS}
+
+
+def activity_handlers():
+    return [import_string(path) for path in getattr(settings, 'OCTOFIT_ACTIVITY_HANDLERS', ACTIVITY_HANDLERS)]
+
+
+def apply_activity_changes(added=(), removed=()):
+    """Fold created and deleted activities into every derived store.
+
+    An update is the old row in ``removed`` plus the new row in ``added``.
+    All activity writes, single or bulk, come through here. In
+    ``changestream`` mode this is a no-op and the ``watch_changes`` command
+    dispatches the same changes from the database's change stream instead.
+    """
+    if settings.OCTOFIT_DERIVED_DATA_MODE == 'changestream':
+        return
+    dispatch_activity_changes(added, removed)
+
+
+def dispatch_activity_changes(added=(), removed=()):
+    added, removed = list(added), list(removed)
+    if not added and not removed:
+        return
+    for handler in activity_handlers():
+        handler(added=added, removed=removed)
@@ -0,0 +1,60 @@
+import csv
+import json
+
+from pymongo import ASCENDING
+
+from .models import Activity
+from .mongo import get_collection
+from .serializers import ActivitySerializer, represent_document
+
+EXPORT_FIELDS = ActivitySerializer.Meta.fields
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CHUNK_ROWS = 500
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the csv writer's caller."""
+
+    def write(self, value):
+        return value
+
+
+def export_documents(match, batch_size=1000):
+    """Stream matching activities oldest first from a server-side cursor."""
+    projection = dict.fromkeys(EXPORT_FIELDS, 1)
+    cursor = get_collection(Activity).find(match, projection)
+    # The reverse of activities_date_id_idx, so no in-memory sort.
+    return cursor.sort([('date', ASCENDING), ('_id', ASCENDING)]).batch_size(batch_size)
+
+
+def _ndjson_lines(documents):
+    for document in documents:
+        yield json.dumps(represent_document(document, EXPORT_FIELDS), separators=(',', ':')) + '\n'
+
+
+def _csv_lines(documents):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for document in documents:
+        row = represent_document(document, EXPORT_FIELDS)
+        yield writer.writerow(['' if row[name] is None else row[name] for name in EXPORT_FIELDS])
+
+
+def export_activities(match, output='ndjson', batch_size=1000):
+    """Yield ``output`` text in chunks of CHUNK_ROWS rows.
+
+    Memory stays flat: at most one cursor batch and one chunk are held at a
+    time, whatever the size of the export.
+    """
+    lines = _csv_lines if output == 'csv' else _ndjson_lines
+    chunk = []
+    for line in lines(export_documents(match, batch_size)):
+        chunk.append(line)
+        if len(chunk) >= CHUNK_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
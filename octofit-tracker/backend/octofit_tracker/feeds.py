@@ -0,0 +1,80 @@
+import uuid
+
+from pymongo import ReturnDocument, UpdateOne
+from rest_framework.exceptions import ValidationError
+
+from .indexes import declared_indexes
+from .keyset import NEWEST_FIRST, decode_cursor, newest_first_after
+from .models import Activity
+from .mongo import get_db
+from .stats import parse_when
+
+FEED_INDEX = 'activities_user_date_id_idx'
+VERSION_COLLECTION = 'feed_versions'
+
+
+def versions_collection():
+    return get_db()[VERSION_COLLECTION]
+
+
+def feed_version(user_id):
+    """Opaque token that changes whenever one of the user's activities does.
+
+    Versions live in MongoDB, so every worker and command sees the same
+    one; reading it is a single ``_id`` lookup instead of the page query.
+    A user without a version gets a fresh random one rather than a counter,
+    so an old ETag can never match a newer feed.
+    """
+    document = versions_collection().find_one({'_id': user_id})
+    if document is None:
+        document = versions_collection().find_one_and_update(
+            {'_id': user_id}, {'$setOnInsert': {'version': uuid.uuid4().hex}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )
+    return document['version']
+
+
+def apply_activity_changes(added=(), removed=()):
+    user_ids = {row['user_id'] for row in list(added) + list(removed)}
+    if user_ids:
+        versions_collection().bulk_write([
+            UpdateOne({'_id': user_id}, {'$set': {'version': uuid.uuid4().hex}}, upsert=True)
+            for user_id in user_ids
+        ], ordered=False)
+
+
+def reset_feed_versions():
+    """Give every feed a new version, after writes that bypassed the handlers."""
+    versions_collection().delete_many({})
+
+
+def feed_query(user_id, query_params):
+    """Mongo filter for one user's activities from since/until/activity_type/cursor params."""
+    conditions = [{'user_id': user_id}]
+    if query_params.get('activity_type'):
+        conditions.append({'activity_type': query_params['activity_type']})
+    date = {}
+    if query_params.get('since'):
+        date['$gte'] = parse_when('since', query_params['since'])
+    if query_params.get('until'):
+        date['$lt'] = parse_when('until', query_params['until'])
+    if date:
+        conditions.append({'date': date})
+    if query_params.get('cursor'):
+        try:
+            conditions.append(newest_first_after(*decode_cursor(query_params['cursor'])))
+        except ValueError as exc:
+            raise ValidationError({'cursor': str(exc)})
+    return {'$and': conditions} if len(conditions) > 1 else conditions[0]
+
+
+def user_feed(repository, query, size):
+    """Return up to ``size + 1`` newest-first records matching a ``feed_query``.
+
+    The scan is pinned to the (user_id, date, _id) index, so every page is
+    an index range walk in sort order whatever the filters select.
+    """
+    projection = dict.fromkeys(repository.record_class.__slots__, 1)
+    cursor = repository.collection().find(query, projection)
+    cursor = cursor.sort(NEWEST_FIRST).hint(declared_indexes(Activity)[FEED_INDEX]).limit(size + 1)
+    return [repository.record_class(document) for document in cursor]
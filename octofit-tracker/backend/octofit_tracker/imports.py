@@ -0,0 +1,153 @@
+import csv
+import hashlib
+import json
+import os
+from collections import deque
+from itertools import islice
+
+from django.utils import timezone
+
+from .bulk import bulk_create_activities
+from .models import User
+from .mongo import get_collection, get_db, reset_clients
+from .serializers import ActivitySerializer
+
+IMPORT_FORMATS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+IMPORT_FIELDS = set(ActivitySerializer.Meta.fields) | {'idempotency_key'}
+CHECKPOINT_COLLECTION = 'import_checkpoints'
+
+# Set per process by init_worker; maps lower-cased email to user id.
+_email_map = {}
+
+
+def load_email_map():
+    """Resolve every user's email to its id with one projected scan of users."""
+    return {
+        doc['email'].lower(): str(doc['_id'])
+        for doc in get_collection(User).find({}, {'email': 1})
+        if doc.get('email')
+    }
+
+
+def init_worker(email_map, fresh_clients=False):
+    global _email_map
+    if fresh_clients:
+        # pymongo clients must not be shared across fork.
+        reset_clients()
+    _email_map = email_map
+
+
+def default_job(path):
+    """Name a job after the file's name and a digest of its contents.
+
+    Files that merely share a name and size get different row keys, so
+    one is never skipped as a duplicate of the other.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return f'{os.path.basename(path)}:{digest.hexdigest()[:16]}'
+
+
+def job_key(job):
+    return 'import:' + hashlib.sha1(job.encode()).hexdigest()[:12]
+
+
+def read_rows(path, fmt, skip=0):
+    """Yield (row_number, raw_row) pairs, skipping the first ``skip`` rows.
+
+    CSV rows come back as dicts; NDJSON lines come back unparsed so that
+    decoding happens in the workers.
+    """
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'csv':
+            rows = csv.DictReader(handle)
+        else:
+            rows = (line for line in handle if line.strip())
+        for number, row in enumerate(rows, start=1):
+            if number > skip:
+                yield number, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _normalise(number, raw, key_prefix):
+    """Turn a raw row into ActivitySerializer input, or return its errors."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError as exc:
+            return None, {'non_field_errors': [f'Invalid JSON: {exc}']}
+    if not isinstance(raw, dict):
+        return None, {'non_field_errors': ['Expected an object.']}
+    item = {name: value for name, value in raw.items() if name in IMPORT_FIELDS and value not in ('', None)}
+    if not item.get('user_id') and raw.get('email'):
+        user_id = _email_map.get(str(raw['email']).strip().lower())
+        if user_id is None:
+            return None, {'email': [f'No user with email {raw["email"]}.']}
+        item['user_id'] = user_id
+    # Row-derived keys make re-running or resuming an import idempotent.
+    item.setdefault('idempotency_key', f'{key_prefix}:{number}')
+    return item, None
+
+
+def import_chunk(task):
+    """Worker entry point: parse, validate and insert one chunk of rows.
+
+    Returns the number of rows read, per-status counts, and the results of
+    rows that were not created, tagged with their row numbers.
+    """
+    key_prefix, rows = task
+    counts = {'created': 0, 'duplicate': 0, 'invalid': 0, 'failed': 0}
+    problems, items, numbers = [], [], []
+    for number, raw in rows:
+        item, errors = _normalise(number, raw, key_prefix)
+        if errors:
+            problems.append({'row': number, 'status': 'invalid', 'errors': errors})
+        else:
+            items.append(item)
+            numbers.append(number)
+    if items:
+        for result in bulk_create_activities(items, ActivitySerializer(data=items, many=True)):
+            result['row'] = numbers[result.pop('index')]
+            if result['status'] != 'created':
+                problems.append(result)
+            else:
+                counts['created'] += 1
+    for problem in problems:
+        counts[problem['status']] += 1
+    return len(rows), counts, sorted(problems, key=lambda problem: problem['row'])
+
+
+def ordered_imap(pool, func, tasks, window):
+    """Like Pool.imap, but never reads more than ``window`` tasks ahead of the results."""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def load_checkpoint(job):
+    document = get_db()[CHECKPOINT_COLLECTION].find_one({'_id': job})
+    return document['rows'] if document else 0
+
+
+def save_checkpoint(job, rows):
+    get_db()[CHECKPOINT_COLLECTION].update_one(
+        {'_id': job}, {'$set': {'rows': rows, 'updated_at': timezone.now()}}, upsert=True
+    )
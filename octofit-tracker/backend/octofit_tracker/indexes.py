@@ -0,0 +1,42 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from .mongo import get_collection
+
+
+def index_keys(index):
+    """Translate a Django ``models.Index`` into a pymongo key list."""
+    return [
+        (name.lstrip('-'), DESCENDING if name.startswith('-') else ASCENDING)
+        for name in index.fields
+    ]
+
+
+def declared_indexes(model):
+    """Return ``{name: keys}`` for the indexes declared in ``Meta.indexes``."""
+    return {index.name: index_keys(index) for index in model._meta.indexes}
+
+
+def index_usage(model, alias='default'):
+    """Return ``{name: ops}`` from ``$indexStats``, summed across hosts."""
+    usage = {}
+    for row in get_collection(model, alias).aggregate([{'$indexStats': {}}]):
+        usage[row['name']] = usage.get(row['name'], 0) + row['accesses']['ops']
+    return usage
+
+
+def ensure_indexes(model, alias='default'):
+    """Create any declared index that is missing; returns the names created.
+
+    djongo's CREATE INDEX translation mangles descending keys, so the
+    indexes are built with pymongo instead.
+    """
+    collection = get_collection(model, alias)
+    existing = collection.index_information()
+    missing = [
+        IndexModel(keys, name=name)
+        for name, keys in declared_indexes(model).items()
+        if name not in existing
+    ]
+    if not missing:
+        return []
+    return collection.create_indexes(missing)
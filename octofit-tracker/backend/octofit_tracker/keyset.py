@@ -0,0 +1,39 @@
+import base64
+from datetime import timezone as dt_timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(date, object_id):
+    """Opaque cursor for the (date, _id) position of the last row on a page."""
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, dt_timezone.utc)
+    raw = f'{date.isoformat()}|{object_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Return ``(date, ObjectId)`` or raise ValueError for a malformed cursor."""
+    try:
+        date, object_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        date = parse_datetime(date)
+        object_id = ObjectId(object_id)
+    except (ValueError, UnicodeDecodeError, InvalidId):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    if date is None:
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return date, object_id
+
+
+def newest_first_after(date, object_id):
+    """Filter for rows after a cursor when sorting by date then _id, descending."""
+    return {'$or': [
+        {'date': {'$lt': date}},
+        {'date': date, '_id': {'$lt': object_id}},
+    ]}
+
+
+NEWEST_FIRST = [('date', -1), ('_id', -1)]
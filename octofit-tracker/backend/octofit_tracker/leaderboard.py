@@ -0,0 +1,188 @@
+from collections import defaultdict
+
+from django.dispatch import Signal
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from .cache import invalidate_model
+from .models import Activity, Leaderboard, Team, User
+from .mongo import get_collection, to_object_id
+from .rankings import user_totals_collection
+
+# Sent with ``changes``, a list of {team_id, total_points, rank} dicts,
+# whenever derived writes move points or ranks.
+leaderboard_changed = Signal()
+
+
+def leaderboard_change(row):
+    return {'team_id': row['team_id'], 'total_points': row.get('total_points') or 0, 'rank': row['rank']}
+
+
+def team_ids_for_users(user_ids):
+    """Map user ids to team ids with a single ``$in`` lookup."""
+    object_ids = [oid for oid in map(to_object_id, set(user_ids)) if oid is not None]
+    if not object_ids:
+        return {}
+    cursor = get_collection(User).find({'_id': {'$in': object_ids}}, {'team_id': 1})
+    return {str(doc['_id']): doc['team_id'] for doc in cursor if doc.get('team_id')}
+
+
+def teams_for_activities(activities):
+    """Map the user ids of activity snapshots to team ids.
+
+    Snapshots dispatched from the change stream carry the ``team_id`` their
+    user had at that point in the stream, which the live users collection
+    may already have moved past; the rest are looked up.
+    """
+    team_of, missing = {}, set()
+    for activity in activities:
+        if 'team_id' not in activity:
+            missing.add(activity['user_id'])
+        elif activity['team_id']:
+            team_of[activity['user_id']] = activity['team_id']
+    if missing:
+        team_of = dict(team_ids_for_users(missing), **team_of)
+    return team_of
+
+
+def apply_activity_changes(added=(), removed=()):
+    """Fold created and deleted activities into the team totals.
+
+    An update is expressed as the old row in ``removed`` plus the new row in
+    ``added``, so a change of user or calories moves points between teams.
+    """
+    user_deltas = defaultdict(int)
+    for activity in added:
+        user_deltas[activity['user_id']] += activity.get('calories_burned') or 0
+    for activity in removed:
+        user_deltas[activity['user_id']] -= activity.get('calories_burned') or 0
+    return apply_user_deltas(user_deltas, teams_for_activities([*added, *removed]))
+
+
+def apply_user_deltas(user_deltas, team_of=None):
+    """Increment team totals by per-user point deltas, then re-rank.
+
+    Only the affected teams are touched with ``$inc``; the activities
+    collection is never read. Users missing from ``team_of`` are looked up.
+    """
+    user_deltas = {user_id: delta for user_id, delta in user_deltas.items() if delta}
+    if not user_deltas:
+        return []
+    team_of = team_of if team_of is not None else team_ids_for_users(user_deltas)
+    team_deltas = defaultdict(int)
+    for user_id, delta in user_deltas.items():
+        team_id = team_of.get(user_id)
+        if team_id:
+            team_deltas[team_id] += delta
+    return apply_team_deltas(team_deltas)
+
+
+def apply_team_moves(moves):
+    """Move users' accumulated points between teams, then re-rank.
+
+    ``moves`` maps user ids to ``(old_team_id, new_team_id)``; either side
+    may be empty for a user joining or leaving a team. Points come from the
+    per-user totals, so the activities collection is never read.
+    """
+    moves = {str(user_id): teams for user_id, teams in moves.items() if teams[0] != teams[1]}
+    if not moves:
+        return []
+    points = {
+        document['_id']: document.get('calories_burned') or 0
+        for document in user_totals_collection().find({'_id': {'$in': list(moves)}}, {'calories_burned': 1})
+    }
+    team_deltas = defaultdict(int)
+    for user_id, (old_team, new_team) in moves.items():
+        if old_team:
+            team_deltas[old_team] -= points.get(user_id, 0)
+        if new_team:
+            team_deltas[new_team] += points.get(user_id, 0)
+    return apply_team_deltas(team_deltas)
+
+
+def apply_team_deltas(team_deltas):
+    """Increment the given teams' totals with ``$inc`` and re-rank."""
+    team_deltas = {team_id: delta for team_id, delta in team_deltas.items() if delta}
+    if not team_deltas:
+        return []
+
+    now = timezone.now()
+    get_collection(Leaderboard).bulk_write([
+        UpdateOne(
+            {'team_id': team_id},
+            {'$inc': {'total_points': delta}, '$set': {'updated_at': now}},
+            upsert=True,
+        )
+        for team_id, delta in team_deltas.items()
+    ], ordered=False)
+    return rerank(touched=team_deltas)
+
+
+def rerank(touched=()):
+    """Assign ranks 1..N by total_points, writing only rows whose rank moved.
+
+    Sends ``leaderboard_changed`` for those rows and the ``touched`` teams.
+    Returns the leaderboard rows whose rank changed.
+    """
+    collection = get_collection(Leaderboard)
+    rows = collection.find({}, {'team_id': 1, 'total_points': 1, 'rank': 1})
+    rows = sorted(rows, key=lambda row: (-(row.get('total_points') or 0), row['team_id']))
+    changed, pushed = [], []
+    for rank, row in enumerate(rows, start=1):
+        moved = row.get('rank') != rank
+        row['rank'] = rank
+        if moved:
+            changed.append(row)
+        if moved or row['team_id'] in touched:
+            pushed.append(leaderboard_change(row))
+    if changed:
+        collection.bulk_write([
+            UpdateOne({'_id': row['_id']}, {'$set': {'rank': row['rank']}})
+            for row in changed
+        ], ordered=False)
+    # Totals changed even when no rank moved; these writes bypass model signals.
+    invalidate_model(Leaderboard)
+    if pushed:
+        leaderboard_changed.send(sender=Leaderboard, changes=pushed)
+    return changed
+
+
+def rebuild_leaderboard():
+    """Recompute every team's total with one aggregation over activities.
+
+    Used for repairs; normal writes go through ``apply_activity_changes``.
+    Returns the number of leaderboard rows written.
+    """
+    per_user = {
+        row['_id']: row['points']
+        for row in get_collection(Activity).aggregate([
+            {'$group': {'_id': '$user_id', 'points': {'$sum': '$calories_burned'}}},
+        ], allowDiskUse=True)
+    }
+
+    totals = {str(doc['_id']): 0 for doc in get_collection(Team).find({}, {'_id': 1})}
+    for doc in get_collection(User).find({'team_id': {'$nin': [None, '']}}, {'team_id': 1}):
+        totals[doc['team_id']] = totals.get(doc['team_id'], 0) + per_user.get(str(doc['_id']), 0)
+
+    collection = get_collection(Leaderboard)
+    collection.delete_many({'team_id': {'$nin': list(totals)}})
+    if not totals:
+        invalidate_model(Leaderboard)
+        return 0
+
+    now = timezone.now()
+    ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    collection.bulk_write([
+        UpdateOne(
+            {'team_id': team_id},
+            {'$set': {'total_points': points, 'rank': rank, 'updated_at': now}},
+            upsert=True,
+        )
+        for rank, (team_id, points) in enumerate(ranked, start=1)
+    ], ordered=False)
+    invalidate_model(Leaderboard)
+    leaderboard_changed.send(sender=Leaderboard, changes=[
+        {'team_id': team_id, 'total_points': points, 'rank': rank}
+        for rank, (team_id, points) in enumerate(ranked, start=1)
+    ])
+    return len(ranked)
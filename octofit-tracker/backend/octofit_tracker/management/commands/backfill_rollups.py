@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker.rollups import backfill_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily and weekly activity rollups from the activities collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Activities per rollup flush')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Backfilling activity rollups...')
+        count = backfill_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {count} activities'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from octofit_tracker.exports import EXPORT_CONTENT_TYPES, export_activities
+from octofit_tracker.stats import activity_match
+
+FILTERS = ('user_id', 'team_id', 'activity_type', 'since', 'until')
+
+
+class Command(BaseCommand):
+    help = 'Stream activities as NDJSON or CSV to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-format', choices=list(EXPORT_CONTENT_TYPES), default='ndjson')
+        parser.add_argument('--output', help='File to write; defaults to stdout')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Mongo cursor batch size')
+        parser.add_argument('--user-id')
+        parser.add_argument('--team-id')
+        parser.add_argument('--activity-type')
+        parser.add_argument('--since', help='ISO date or datetime, inclusive')
+        parser.add_argument('--until', help='ISO date or datetime, exclusive')
+
+    def handle(self, *args, **options):
+        try:
+            match = activity_match({name: options[name] for name in FILTERS if options[name]})
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+        chunks = export_activities(match, options['output_format'], options['batch_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as handle:
+                for chunk in chunks:
+                    handle.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f'Exported activities to {options["output"]}'))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,85 @@
+import json
+import os
+import time
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand, CommandError
+from octofit_tracker.cache import invalidate_model
+from octofit_tracker.imports import (
+    IMPORT_FORMATS, chunked, default_job, import_chunk, init_worker, job_key, load_checkpoint, load_email_map,
+    ordered_imap, read_rows, save_checkpoint,
+)
+from octofit_tracker.models import Leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Stream activities from a CSV or NDJSON file into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row, or NDJSON with one activity per line')
+        parser.add_argument('--format', dest='input_format', choices=sorted(set(IMPORT_FORMATS.values())),
+                            help='Input format; detected from the file extension by default')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows validated and inserted together')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes parsing, validating and inserting chunks')
+        parser.add_argument('--job',
+                            help='Checkpoint name; defaults to the file name and a hash of its contents')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows recorded by the last checkpoint of this job')
+        parser.add_argument('--errors',
+                            help='Write rejected and duplicate rows to this NDJSON file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'No such file: {path}')
+        fmt = options['input_format'] or IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError('Cannot detect the format; pass --format csv or --format ndjson')
+        job = options['job'] or default_job(path)
+        skip = load_checkpoint(job) if options['resume'] else 0
+        if skip:
+            self.stdout.write(f'Resuming {job} after row {skip}')
+
+        email_map = load_email_map()
+        self.stdout.write(f'Loaded {len(email_map)} user emails')
+        tasks = ((job_key(job), chunk) for chunk in chunked(read_rows(path, fmt, skip), options['chunk_size']))
+
+        totals = {'created': 0, 'duplicate': 0, 'invalid': 0, 'failed': 0}
+        rows = skip
+        errors = open(options['errors'], 'a') if options['errors'] else None
+        start = time.perf_counter()
+        pool = None
+        try:
+            if options['workers'] > 1:
+                pool = Pool(options['workers'], initializer=init_worker, initargs=(email_map, True))
+                results = ordered_imap(pool, import_chunk, tasks, window=options['workers'] * 2)
+            else:
+                init_worker(email_map)
+                results = map(import_chunk, tasks)
+            for count, counts, problems in results:
+                rows += count
+                for status, value in counts.items():
+                    totals[status] += value
+                if errors:
+                    errors.writelines(json.dumps(problem, default=str) + '\n' for problem in problems)
+                # Results arrive in input order, so every row up to here is done.
+                save_checkpoint(job, rows)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f'{rows} rows, {(rows - skip) / elapsed:.0f} rows/s')
+        finally:
+            if pool is not None:
+                pool.terminate()
+            if errors:
+                errors.close()
+
+        # Workers invalidated their own process caches, not this one's.
+        invalidate_model(Leaderboard)
+        elapsed = time.perf_counter() - start
+        rate = (rows - skip) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {totals["created"]} activities from {rows - skip} rows in {elapsed:.1f}s '
+            f'({rate:.0f} rows/s): {totals["duplicate"]} duplicate, {totals["invalid"]} invalid, '
+            f'{totals["failed"]} failed'
+        ))
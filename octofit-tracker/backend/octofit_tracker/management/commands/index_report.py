@@ -0,0 +1,57 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from pymongo.errors import OperationFailure
+from octofit_tracker.indexes import declared_indexes, ensure_indexes, index_usage
+from octofit_tracker.mongo import get_collection
+
+
+class Command(BaseCommand):
+    help = 'Report missing and unused MongoDB indexes using $indexStats'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--create-missing',
+            action='store_true',
+            help='Build declared indexes that do not exist yet',
+        )
+
+    def handle(self, *args, **options):
+        problems = 0
+        for model in apps.get_app_config('octofit_tracker').get_models():
+            collection = get_collection(model)
+            declared = declared_indexes(model)
+            existing = collection.index_information()
+            table = model._meta.db_table
+
+            for name, keys in declared.items():
+                if name not in existing:
+                    problems += 1
+                    self.stdout.write(self.style.WARNING(f'{table}: missing index {name} {keys}'))
+                elif existing[name]['key'] != keys:
+                    problems += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'{table}: index {name} has keys {existing[name]["key"]}, expected {keys}'
+                    ))
+
+            try:
+                usage = index_usage(model)
+            except OperationFailure as exc:
+                self.stdout.write(self.style.WARNING(f'{table}: $indexStats unavailable ({exc})'))
+                usage = {}
+            for name, ops in sorted(usage.items()):
+                if name == '_id_':
+                    continue
+                if ops == 0:
+                    problems += 1
+                    self.stdout.write(self.style.WARNING(f'{table}: index {name} unused since last restart'))
+                else:
+                    self.stdout.write(f'{table}: index {name} used {ops} times')
+
+            if options['create_missing']:
+                for name in ensure_indexes(model):
+                    self.stdout.write(self.style.SUCCESS(f'{table}: created index {name}'))
+
+        if problems:
+            self.stdout.write(self.style.WARNING(f'{problems} index issue(s) found'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All declared indexes exist and are in use'))
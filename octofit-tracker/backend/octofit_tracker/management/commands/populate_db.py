@@ -1,214 +1,325 @@
+import random
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from multiprocessing import Pool
+
+from bson import ObjectId
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand
+from django.utils import timezone
+from octofit_tracker.cache import invalidate_model
+from octofit_tracker.feeds import reset_feed_versions
+from octofit_tracker.leaderboard import rebuild_leaderboard
 from octofit_tracker.models import User, Team, Activity, Leaderboard, Workout
-from datetime import datetime, timedelta
-from bson import ObjectId
+from octofit_tracker.mongo import get_collection, reset_clients
+from octofit_tracker.passwords import hash_many
+from octofit_tracker.rankings import rebuild_user_totals
+from octofit_tracker.rollups import backfill_rollups
+
+HERO_TEAMS = [
+    {'name': 'Team Marvel', 'description': 'Earth\'s Mightiest Heroes united for fitness excellence'},
+    {'name': 'Team DC', 'description': 'Justice League champions committed to peak performance'},
+]
+
+HERO_USERS = [
+    # Team Marvel
+    {'email': 'ironman@avengers.com', 'username': 'Iron Man', 'password': 'stark123', 'team': 'Team Marvel'},
+    {'email': 'captainamerica@avengers.com', 'username': 'Captain America', 'password': 'shield123', 'team': 'Team Marvel'},
+    {'email': 'thor@asgard.com', 'username': 'Thor', 'password': 'mjolnir123', 'team': 'Team Marvel'},
+    {'email': 'blackwidow@shield.com', 'username': 'Black Widow', 'password': 'natasha123', 'team': 'Team Marvel'},
+    {'email': 'hulk@gamma.com', 'username': 'Hulk', 'password': 'smash123', 'team': 'Team Marvel'},
+    {'email': 'spiderman@daily.com', 'username': 'Spider-Man', 'password': 'parker123', 'team': 'Team Marvel'},
+    # Team DC
+    {'email': 'superman@dailyplanet.com', 'username': 'Superman', 'password': 'krypton123', 'team': 'Team DC'},
+    {'email': 'batman@wayne.com', 'username': 'Batman', 'password': 'gotham123', 'team': 'Team DC'},
+    {'email': 'wonderwoman@themyscira.com', 'username': 'Wonder Woman', 'password': 'diana123', 'team': 'Team DC'},
+    {'email': 'flash@central.com', 'username': 'Flash', 'password': 'speedforce123', 'team': 'Team DC'},
+    {'email': 'aquaman@atlantis.com', 'username': 'Aquaman', 'password': 'arthur123', 'team': 'Team DC'},
+    {'email': 'greenlantern@oa.com', 'username': 'Green Lantern', 'password': 'willpower123', 'team': 'Team DC'},
+]
+
+ACTIVITY_TYPES = ['Running', 'Cycling', 'Swimming', 'Weight Training', 'Yoga', 'Boxing']
+DISTANCE_TYPES = ['Running', 'Cycling', 'Swimming']
+# Synthetic users are generated and seeded in fixed-size chunks, so the data
+# depends on neither --workers nor --batch-size.
+USERS_PER_CHUNK = 1000
+
+HERO_WORKOUTS = [
+    {
+        'name': 'Superhero Strength',
+        'description': 'Build strength like the mightiest heroes',
+        'difficulty': 'Hard',
+        'duration': 60,
+        'category': 'Strength',
+        'exercises': [
+            {'name': 'Deadlifts', 'sets': 4, 'reps': 8},
+            {'name': 'Bench Press', 'sets': 4, 'reps': 10},
+            {'name': 'Squats', 'sets': 4, 'reps': 12},
+            {'name': 'Pull-ups', 'sets': 3, 'reps': 15}
+        ]
+    },
+    {
+        'name': 'Speed Force Cardio',
+        'description': 'Run at super speed with this cardio blast',
+        'difficulty': 'Medium',
+        'duration': 45,
+        'category': 'Cardio',
+        'exercises': [
+            {'name': 'Sprint Intervals', 'duration': '20 minutes'},
+            {'name': 'Jump Rope', 'duration': '10 minutes'},
+            {'name': 'Burpees', 'sets': 3, 'reps': 20},
+            {'name': 'Mountain Climbers', 'sets': 3, 'reps': 30}
+        ]
+    },
+    {
+        'name': 'Warrior Flexibility',
+        'description': 'Stretch and flow like an Amazonian warrior',
+        'difficulty': 'Easy',
+        'duration': 30,
+        'category': 'Flexibility',
+        'exercises': [
+            {'name': 'Sun Salutations', 'reps': 5},
+            {'name': 'Warrior Poses', 'duration': '10 minutes'},
+            {'name': 'Deep Stretches', 'duration': '15 minutes'},
+            {'name': 'Meditation', 'duration': '5 minutes'}
+        ]
+    },
+    {
+        'name': 'Web-Slinger Agility',
+        'description': 'Train agility like your friendly neighborhood Spider-Man',
+        'difficulty': 'Medium',
+        'duration': 40,
+        'category': 'Agility',
+        'exercises': [
+            {'name': 'Ladder Drills', 'duration': '10 minutes'},
+            {'name': 'Box Jumps', 'sets': 3, 'reps': 15},
+            {'name': 'Cone Drills', 'duration': '10 minutes'},
+            {'name': 'Plyometric Push-ups', 'sets': 3, 'reps': 12}
+        ]
+    },
+    {
+        'name': 'Atlantean Swim Workout',
+        'description': 'Master the waters with this aquatic training',
+        'difficulty': 'Hard',
+        'duration': 50,
+        'category': 'Swimming',
+        'exercises': [
+            {'name': 'Freestyle', 'distance': '1000m'},
+            {'name': 'Backstroke', 'distance': '500m'},
+            {'name': 'Breaststroke', 'distance': '500m'},
+            {'name': 'Butterfly', 'distance': '200m'}
+        ]
+    },
+    {
+        'name': 'Arc Reactor Core',
+        'description': 'Build a powerful core like Tony Stark\'s arc reactor',
+        'difficulty': 'Medium',
+        'duration': 35,
+        'category': 'Core',
+        'exercises': [
+            {'name': 'Plank', 'duration': '3 minutes'},
+            {'name': 'Russian Twists', 'sets': 3, 'reps': 30},
+            {'name': 'Leg Raises', 'sets': 3, 'reps': 20},
+            {'name': 'Bicycle Crunches', 'sets': 3, 'reps': 40}
+        ]
+    }
+]
+
+
+def insert_batched(collection, documents, batch_size):
+    """insert_many in slices of batch_size; returns the number inserted."""
+    count = 0
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        count += len(batch)
+    return count
+
+
+def seeded_object_id(rng, when):
+    """An ObjectId stamped with ``when`` whose remaining eight bytes come from ``rng``."""
+    return ObjectId(int(when.timestamp()).to_bytes(4, 'big') + rng.getrandbits(64).to_bytes(8, 'big'))
+
+
+def hero_activities(users, base_date):
+    for user in users:
+        for i in range(10):  # 10 activities per user
+            activity_type = ACTIVITY_TYPES[i % len(ACTIVITY_TYPES)]
+            duration = 30 + (i * 5)
+            yield {
+                'user_id': str(user['_id']),
+                'activity_type': activity_type,
+                'duration': duration,
+                'distance': round(duration * 0.15, 2) if activity_type in DISTANCE_TYPES else None,
+                'calories_burned': duration * 8,
+                'date': base_date + timedelta(days=i * 3),
+                'notes': f'{activity_type} session {i+1} for {user["username"]}',
+                'idempotency_key': None,
+            }
+
+
+def synthetic_activities(user_ids, activities_per_user, seed, base_date, days):
+    """Generate activities for a chunk of users, reproducible from ``seed``."""
+    rng = random.Random(seed)
+    span = days * 24 * 60
+    for user_id in user_ids:
+        for i in range(activities_per_user):
+            activity_type = rng.choice(ACTIVITY_TYPES)
+            duration = rng.randint(15, 120)
+            distance = round(duration * rng.uniform(0.08, 0.4), 2) if activity_type in DISTANCE_TYPES else None
+            calories_burned = duration * rng.randint(5, 12)
+            when = base_date + timedelta(minutes=rng.randrange(span))
+            yield {
+                '_id': seeded_object_id(rng, when),
+                'user_id': user_id,
+                'activity_type': activity_type,
+                'duration': duration,
+                'distance': distance,
+                'calories_burned': calories_burned,
+                'date': when,
+                'notes': f'{activity_type} session {i+1}',
+                'idempotency_key': None,
+            }
+
+
+def insert_activity_chunk(chunk):
+    """Worker entry point: generate and insert one chunk of users' activities."""
+    user_ids, activities_per_user, seed, base_date, days, batch_size = chunk
+    documents = synthetic_activities(user_ids, activities_per_user, seed, base_date, days)
+    return insert_batched(get_collection(Activity), documents, batch_size)
+
 
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0,
+                            help='Generate this many synthetic users instead of the hero dataset')
+        parser.add_argument('--teams', type=int, default=10,
+                            help='Number of synthetic teams')
+        parser.add_argument('--activities-per-user', type=int, default=10,
+                            help='Synthetic activities generated for each user')
+        parser.add_argument('--days', type=int, default=30,
+                            help='Spread synthetic activities over this many past days')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Documents per insert_many call')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Seed for synthetic data; the same seed and --end-date give the same data')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='Synthetic activities fall in the --days before this date (YYYY-MM-DD, '
+                                 'default today in UTC)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes generating and inserting synthetic activities')
+
+    def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting database population...'))
+        batch_size = options['batch_size']
         
-        # Delete existing data
+        # Delete existing data, keeping the collections and their indexes
         self.stdout.write('Deleting existing data...')
-        User.objects.all().delete()
-        Team.objects.all().delete()
-        Activity.objects.all().delete()
-        Leaderboard.objects.all().delete()
-        Workout.objects.all().delete()
+        for model in (User, Team, Activity, Leaderboard, Workout):
+            get_collection(model).delete_many({})
+        
+        if options['users']:
+            self.populate_synthetic(options)
+        else:
+            self.populate_heroes(batch_size)
         
-        # Create Teams
+        self.stdout.write('Creating workouts...')
+        get_collection(Workout).insert_many([dict(workout) for workout in HERO_WORKOUTS])
+        
+        # Calculate team points and create leaderboard
+        self.stdout.write('Creating leaderboard...')
+        rebuild_leaderboard()
+        self.stdout.write('Creating activity rollups...')
+        backfill_rollups(batch_size)
+        self.stdout.write('Creating user rankings...')
+        rebuild_user_totals()
+        # Direct collection writes do not fire the invalidation signals.
+        for model in (Team, Workout):
+            invalidate_model(model)
+        reset_feed_versions()
+        
+        self.stdout.write(self.style.SUCCESS('Successfully populated database!'))
+        for model, label in ((Team, 'teams'), (User, 'users'), (Activity, 'activities'),
+                             (Workout, 'workouts'), (Leaderboard, 'leaderboard entries')):
+            count = get_collection(model).estimated_document_count()
+            self.stdout.write(self.style.SUCCESS(f'Created {count} {label}'))
+
+    def populate_heroes(self, batch_size):
+        now = timezone.now()
         self.stdout.write('Creating teams...')
-        team_marvel = Team.objects.create(
-            name='Team Marvel',
-            description='Earth\'s Mightiest Heroes united for fitness excellence'
-        )
-        team_dc = Team.objects.create(
-            name='Team DC',
-            description='Justice League champions committed to peak performance'
-        )
+        teams = [dict(team, created_at=now) for team in HERO_TEAMS]
+        get_collection(Team).insert_many(teams)
+        team_ids = {team['name']: str(team['_id']) for team in teams}
         
         # Create Users (Superheroes)
         self.stdout.write('Creating users...')
-        users_data = [
-            # Team Marvel
-            {'email': 'ironman@avengers.com', 'username': 'Iron Man', 'password': 'stark123', 'team': team_marvel},
-            {'email': 'captainamerica@avengers.com', 'username': 'Captain America', 'password': 'shield123', 'team': team_marvel},
-            {'email': 'thor@asgard.com', 'username': 'Thor', 'password': 'mjolnir123', 'team': team_marvel},
-            {'email': 'blackwidow@shield.com', 'username': 'Black Widow', 'password': 'natasha123', 'team': team_marvel},
-            {'email': 'hulk@gamma.com', 'username': 'Hulk', 'password': 'smash123', 'team': team_marvel},
-            {'email': 'spiderman@daily.com', 'username': 'Spider-Man', 'password': 'parker123', 'team': team_marvel},
-            # Team DC
-            {'email': 'superman@dailyplanet.com', 'username': 'Superman', 'password': 'krypton123', 'team': team_dc},
-            {'email': 'batman@wayne.com', 'username': 'Batman', 'password': 'gotham123', 'team': team_dc},
-            {'email': 'wonderwoman@themyscira.com', 'username': 'Wonder Woman', 'password': 'diana123', 'team': team_dc},
-            {'email': 'flash@central.com', 'username': 'Flash', 'password': 'speedforce123', 'team': team_dc},
-            {'email': 'aquaman@atlantis.com', 'username': 'Aquaman', 'password': 'arthur123', 'team': team_dc},
-            {'email': 'greenlantern@oa.com', 'username': 'Green Lantern', 'password': 'willpower123', 'team': team_dc},
+        users = [
+            {
+                'email': user['email'],
+                'username': user['username'],
+                'password': password,
+                'team_id': team_ids[user['team']],
+                'created_at': now,
+            }
+            for user, password in zip(HERO_USERS, hash_many(user['password'] for user in HERO_USERS))
         ]
+        get_collection(User).insert_many(users)
         
-        users = []
-        for user_data in users_data:
-            user = User.objects.create(
-                email=user_data['email'],
-                username=user_data['username'],
-                password=user_data['password'],
-                team_id=str(user_data['team']._id)
-            )
-            users.append(user)
-        
-        # Create Activities
         self.stdout.write('Creating activities...')
-        activity_types = ['Running', 'Cycling', 'Swimming', 'Weight Training', 'Yoga', 'Boxing']
-        base_date = datetime.now() - timedelta(days=30)
-        
-        for user in users:
-            for i in range(10):  # 10 activities per user
-                activity_type = activity_types[i % len(activity_types)]
-                duration = 30 + (i * 5)
-                distance = round(duration * 0.15, 2) if activity_type in ['Running', 'Cycling', 'Swimming'] else None
-                calories = duration * 8
-                
-                Activity.objects.create(
-                    user_id=str(user._id),
-                    activity_type=activity_type,
-                    duration=duration,
-                    distance=distance,
-                    calories_burned=calories,
-                    date=base_date + timedelta(days=i * 3),
-                    notes=f'{activity_type} session {i+1} for {user.username}'
-                )
+        insert_batched(get_collection(Activity), hero_activities(users, now - timedelta(days=30)), batch_size)
+
+    def populate_synthetic(self, options):
+        rng = random.Random(options['seed'])
+        end_date = options['end_date'] or timezone.now().astimezone(dt_timezone.utc).date()
+        end = datetime.combine(end_date, time.min, tzinfo=dt_timezone.utc)
+        batch_size = options['batch_size']
         
-        # Create Workouts
-        self.stdout.write('Creating workouts...')
-        workouts_data = [
-            {
-                'name': 'Superhero Strength',
-                'description': 'Build strength like the mightiest heroes',
-                'difficulty': 'Hard',
-                'duration': 60,
-                'category': 'Strength',
-                'exercises': [
-                    {'name': 'Deadlifts', 'sets': 4, 'reps': 8},
-                    {'name': 'Bench Press', 'sets': 4, 'reps': 10},
-                    {'name': 'Squats', 'sets': 4, 'reps': 12},
-                    {'name': 'Pull-ups', 'sets': 3, 'reps': 15}
-                ]
-            },
+        self.stdout.write(f'Creating {options["teams"]} teams...')
+        teams = [
             {
-                'name': 'Speed Force Cardio',
-                'description': 'Run at super speed with this cardio blast',
-                'difficulty': 'Medium',
-                'duration': 45,
-                'category': 'Cardio',
-                'exercises': [
-                    {'name': 'Sprint Intervals', 'duration': '20 minutes'},
-                    {'name': 'Jump Rope', 'duration': '10 minutes'},
-                    {'name': 'Burpees', 'sets': 3, 'reps': 20},
-                    {'name': 'Mountain Climbers', 'sets': 3, 'reps': 30}
-                ]
-            },
-            {
-                'name': 'Warrior Flexibility',
-                'description': 'Stretch and flow like an Amazonian warrior',
-                'difficulty': 'Easy',
-                'duration': 30,
-                'category': 'Flexibility',
-                'exercises': [
-                    {'name': 'Sun Salutations', 'reps': 5},
-                    {'name': 'Warrior Poses', 'duration': '10 minutes'},
-                    {'name': 'Deep Stretches', 'duration': '15 minutes'},
-                    {'name': 'Meditation', 'duration': '5 minutes'}
-                ]
-            },
-            {
-                'name': 'Web-Slinger Agility',
-                'description': 'Train agility like your friendly neighborhood Spider-Man',
-                'difficulty': 'Medium',
-                'duration': 40,
-                'category': 'Agility',
-                'exercises': [
-                    {'name': 'Ladder Drills', 'duration': '10 minutes'},
-                    {'name': 'Box Jumps', 'sets': 3, 'reps': 15},
-                    {'name': 'Cone Drills', 'duration': '10 minutes'},
-                    {'name': 'Plyometric Push-ups', 'sets': 3, 'reps': 12}
-                ]
-            },
-            {
-                'name': 'Atlantean Swim Workout',
-                'description': 'Master the waters with this aquatic training',
-                'difficulty': 'Hard',
-                'duration': 50,
-                'category': 'Swimming',
-                'exercises': [
-                    {'name': 'Freestyle', 'distance': '1000m'},
-                    {'name': 'Backstroke', 'distance': '500m'},
-                    {'name': 'Breaststroke', 'distance': '500m'},
-                    {'name': 'Butterfly', 'distance': '200m'}
-                ]
-            },
-            {
-                'name': 'Arc Reactor Core',
-                'description': 'Build a powerful core like Tony Stark\'s arc reactor',
-                'difficulty': 'Medium',
-                'duration': 35,
-                'category': 'Core',
-                'exercises': [
-                    {'name': 'Plank', 'duration': '3 minutes'},
-                    {'name': 'Russian Twists', 'sets': 3, 'reps': 30},
-                    {'name': 'Leg Raises', 'sets': 3, 'reps': 20},
-                    {'name': 'Bicycle Crunches', 'sets': 3, 'reps': 40}
-                ]
+                '_id': seeded_object_id(rng, end), 'name': f'Team {i:04d}', 'description': f'Synthetic team {i}',
+                'created_at': end,
             }
+            for i in range(1, options['teams'] + 1)
         ]
+        insert_batched(get_collection(Team), teams, batch_size)
         
-        for workout_data in workouts_data:
-            Workout.objects.create(**workout_data)
-        
-        # Calculate team points and create leaderboard
-        self.stdout.write('Creating leaderboard...')
-        
-        # Calculate Team Marvel points
-        marvel_users = User.objects.filter(team_id=str(team_marvel._id))
-        marvel_points = 0
-        for user in marvel_users:
-            user_activities = Activity.objects.filter(user_id=str(user._id))
-            marvel_points += sum(activity.calories_burned for activity in user_activities)
-        
-        # Calculate Team DC points
-        dc_users = User.objects.filter(team_id=str(team_dc._id))
-        dc_points = 0
-        for user in dc_users:
-            user_activities = Activity.objects.filter(user_id=str(user._id))
-            dc_points += sum(activity.calories_burned for activity in user_activities)
+        self.stdout.write(f'Creating {options["users"]} users...')
+        user_ids = [str(seeded_object_id(rng, end)) for _ in range(options['users'])]
+        # One hash shared by every synthetic user; hashing each would dominate the run.
+        password = make_password('password123')
+        users = (
+            {
+                '_id': ObjectId(user_id),
+                'email': f'user{i:07d}@octofit.test',
+                'username': f'User {i}',
+                'password': password,
+                'team_id': str(rng.choice(teams)['_id']) if teams else None,
+                'created_at': end,
+            }
+            for i, user_id in enumerate(user_ids, start=1)
+        )
+        insert_batched(get_collection(User), users, batch_size)
         
-        # Determine ranks
-        if marvel_points > dc_points:
-            Leaderboard.objects.create(
-                team_id=str(team_marvel._id),
-                total_points=marvel_points,
-                rank=1
-            )
-            Leaderboard.objects.create(
-                team_id=str(team_dc._id),
-                total_points=dc_points,
-                rank=2
-            )
+        per_user = options['activities_per_user']
+        self.stdout.write(f'Creating {len(user_ids) * per_user} activities...')
+        base_date = end - timedelta(days=options['days'])
+        chunks = [
+            (user_ids[start:start + USERS_PER_CHUNK], per_user, options['seed'] + start,
+             base_date, options['days'], batch_size)
+            for start in range(0, len(user_ids), USERS_PER_CHUNK)
+        ]
+        if options['workers'] > 1:
+            # pymongo clients must not be shared across fork.
+            with Pool(options['workers'], initializer=reset_clients) as pool:
+                inserted = sum(pool.imap_unordered(insert_activity_chunk, chunks))
         else:
-            Leaderboard.objects.create(
-                team_id=str(team_dc._id),
-                total_points=dc_points,
-                rank=1
-            )
-            Leaderboard.objects.create(
-                team_id=str(team_marvel._id),
-                total_points=marvel_points,
-                rank=2
-            )
-        
-        self.stdout.write(self.style.SUCCESS(f'Successfully populated database!'))
-        self.stdout.write(self.style.SUCCESS(f'Created {Team.objects.count()} teams'))
-        self.stdout.write(self.style.SUCCESS(f'Created {User.objects.count()} users'))
-        self.stdout.write(self.style.SUCCESS(f'Created {Activity.objects.count()} activities'))
-        self.stdout.write(self.style.SUCCESS(f'Created {Workout.objects.count()} workouts'))
-        self.stdout.write(self.style.SUCCESS(f'Created {Leaderboard.objects.count()} leaderboard entries'))
+            inserted = sum(map(insert_activity_chunk, chunks))
+        self.stdout.write(f'Inserted {inserted} activities')
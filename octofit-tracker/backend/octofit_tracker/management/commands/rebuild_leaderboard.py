@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker.leaderboard import rebuild_leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute leaderboard totals and ranks from the activities collection'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding leaderboard...')
+        count = rebuild_leaderboard()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt leaderboard for {count} teams'))
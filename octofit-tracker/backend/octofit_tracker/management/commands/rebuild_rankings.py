@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from octofit_tracker.rankings import rebuild_user_totals
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user ranking totals from the activities collection'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write('Rebuilding user totals...')
+        count = rebuild_user_totals()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt totals for {count} users'))
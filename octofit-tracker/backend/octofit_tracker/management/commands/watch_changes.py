@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+from octofit_tracker.changes import ChangeWatcher, clear_token
+
+# ChangeStreamHistoryLost: the saved resume token is older than the oplog.
+HISTORY_LOST = 286
+
+
+class Command(BaseCommand):
+    help = 'Tail change streams on activities, users and teams and keep derived data current'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', default='derived',
+                            help='Resume token name; run one watcher per name')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Most events dispatched together')
+        parser.add_argument('--max-wait', type=float, default=0.5,
+                            help='Seconds to gather events before dispatching a batch')
+        parser.add_argument('--reset', action='store_true',
+                            help='Forget the saved resume token and start from the current state. '
+                                 'Run the rebuild commands afterwards to repair missed writes')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            clear_token(options['name'])
+        watcher = ChangeWatcher(options['name'], options['batch_size'], options['max_wait'])
+        try:
+            stream = watcher.open_stream()
+        except OperationFailure as exc:
+            if exc.code == HISTORY_LOST:
+                raise CommandError('The saved resume token is no longer in the oplog; rerun with --reset')
+            raise CommandError(f'Cannot open a change stream (a replica set is required): {exc}')
+        self.stdout.write(f'Watching changes as {options["name"]}')
+
+        def report(events):
+            self.stdout.write(f'Dispatched {len(events)} events')
+
+        try:
+            handled = watcher.run(stream, on_batch=report)
+        except KeyboardInterrupt:
+            handled = None
+        finally:
+            stream.close()
+        if handled is not None:
+            self.stdout.write(self.style.SUCCESS(f'Change stream closed after {handled} events'))
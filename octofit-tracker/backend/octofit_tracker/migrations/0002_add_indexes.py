@@ -0,0 +1,82 @@
+from django.db import migrations, models
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+# Frozen copy of the Meta.indexes added below, as pymongo key lists.
+INDEXES = {
+    'activities': {
+        'activities_user_date_idx': [('user_id', ASCENDING), ('date', DESCENDING)],
+        'activities_type_date_idx': [('activity_type', ASCENDING), ('date', DESCENDING)],
+        'activities_date_idx': [('date', DESCENDING)],
+    },
+    'leaderboard': {
+        'leaderboard_team_idx': [('team_id', ASCENDING)],
+        'leaderboard_rank_idx': [('rank', ASCENDING)],
+    },
+    'users': {
+        'users_team_idx': [('team_id', ASCENDING)],
+    },
+}
+
+
+def _db(schema_editor):
+    from octofit_tracker.mongo import get_db
+    return get_db(schema_editor.connection.alias)
+
+
+def create_indexes(apps, schema_editor):
+    db = _db(schema_editor)
+    for collection, indexes in INDEXES.items():
+        db[collection].create_indexes([IndexModel(keys, name=name) for name, keys in indexes.items()])
+
+
+def drop_indexes(apps, schema_editor):
+    db = _db(schema_editor)
+    for collection, indexes in INDEXES.items():
+        existing = db[collection].index_information()
+        for name in indexes:
+            if name in existing:
+                db[collection].drop_index(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0001_initial'),
+    ]
+
+    # djongo translates CREATE INDEX ... DESC into a key literally named
+    # 'date" DESC', so the database side is done through pymongo.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(create_indexes, drop_indexes),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='activity',
+                    index=models.Index(fields=['user_id', '-date'], name='activities_user_date_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='activity',
+                    index=models.Index(fields=['activity_type', '-date'], name='activities_type_date_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='activity',
+                    index=models.Index(fields=['-date'], name='activities_date_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='leaderboard',
+                    index=models.Index(fields=['team_id'], name='leaderboard_team_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='leaderboard',
+                    index=models.Index(fields=['rank'], name='leaderboard_rank_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='user',
+                    index=models.Index(fields=['team_id'], name='users_team_idx'),
+                ),
+            ],
+        ),
+    ]
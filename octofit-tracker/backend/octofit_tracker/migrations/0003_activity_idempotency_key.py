@@ -0,0 +1,38 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:37
+
+from django.db import migrations, models
+from pymongo import ASCENDING
+
+
+def create_idempotency_index(apps, schema_editor):
+    from octofit_tracker.mongo import get_db
+    # Partial so the many activities without a key do not collide on null.
+    get_db(schema_editor.connection.alias)['activities'].create_index(
+        [('idempotency_key', ASCENDING)],
+        name='activities_idempotency_key_uniq',
+        unique=True,
+        partialFilterExpression={'idempotency_key': {'$type': 'string'}},
+    )
+
+
+def drop_idempotency_index(apps, schema_editor):
+    from octofit_tracker.mongo import get_db
+    collection = get_db(schema_editor.connection.alias)['activities']
+    if 'activities_idempotency_key_uniq' in collection.index_information():
+        collection.drop_index('activities_idempotency_key_uniq')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0002_add_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(create_idempotency_index, drop_idempotency_index),
+    ]
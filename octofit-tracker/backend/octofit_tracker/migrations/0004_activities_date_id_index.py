@@ -0,0 +1,47 @@
+from django.db import migrations, models
+from pymongo import DESCENDING, IndexModel
+
+
+def _collection(schema_editor):
+    from octofit_tracker.mongo import get_db
+    return get_db(schema_editor.connection.alias)['activities']
+
+
+def widen_date_index(apps, schema_editor):
+    # (date, _id) lets newest-first keyset pages sort entirely from the index.
+    collection = _collection(schema_editor)
+    collection.create_indexes([IndexModel([('date', DESCENDING), ('_id', DESCENDING)], name='activities_date_id_idx')])
+    if 'activities_date_idx' in collection.index_information():
+        collection.drop_index('activities_date_idx')
+
+
+def narrow_date_index(apps, schema_editor):
+    collection = _collection(schema_editor)
+    collection.create_indexes([IndexModel([('date', DESCENDING)], name='activities_date_idx')])
+    if 'activities_date_id_idx' in collection.index_information():
+        collection.drop_index('activities_date_id_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0003_activity_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(widen_date_index, narrow_date_index),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='activity',
+                    name='activities_date_idx',
+                ),
+                migrations.AddIndex(
+                    model_name='activity',
+                    index=models.Index(fields=['-date', '-_id'], name='activities_date_id_idx'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_rollup_indexes(apps, schema_editor):
+    from octofit_tracker.rollups import ensure_rollup_indexes
+    ensure_rollup_indexes(schema_editor.connection.alias)
+
+
+def drop_rollups(apps, schema_editor):
+    from octofit_tracker.mongo import get_db
+    db = get_db(schema_editor.connection.alias)
+    for name in ('activity_rollups_daily', 'activity_rollups_weekly'):
+        db.drop_collection(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0004_activities_date_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_rollup_indexes, drop_rollups),
+    ]
@@ -0,0 +1,51 @@
+import uuid
+
+from django.db import migrations
+from django.utils import timezone
+from pymongo import ASCENDING, DeleteMany, IndexModel, UpdateOne
+
+
+# Frozen copies of the rankings constants at the time of this migration.
+METRICS = ('calories_burned', 'distance', 'duration')
+USER_TOTALS = 'user_totals'
+GENERATION = 'user_totals_generation'
+
+
+def _db(schema_editor):
+    from octofit_tracker.mongo import get_db
+    return get_db(schema_editor.connection.alias)
+
+
+def build_user_totals(apps, schema_editor):
+    db = _db(schema_editor)
+    collection = db[USER_TOTALS]
+    collection.create_indexes([IndexModel([('updated_at', ASCENDING)], name='user_totals_updated_idx')])
+    now = timezone.now()
+    rows = db['activities'].aggregate([
+        {'$group': {
+            '_id': '$user_id',
+            **{metric: {'$sum': {'$ifNull': [f'${metric}', 0]}} for metric in METRICS},
+        }},
+    ], allowDiskUse=True)
+    operations = [
+        UpdateOne({'_id': row.pop('_id')}, {'$set': dict(row, updated_at=now)}, upsert=True)
+        for row in rows
+    ]
+    collection.bulk_write(operations + [DeleteMany({'updated_at': {'$lt': now}})], ordered=True)
+    # Running processes reload their rankings when the generation changes.
+    db[GENERATION].update_one({'_id': USER_TOTALS}, {'$set': {'token': uuid.uuid4().hex}}, upsert=True)
+
+
+def drop_user_totals(apps, schema_editor):
+    _db(schema_editor).drop_collection(USER_TOTALS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0005_activity_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_user_totals, drop_user_totals),
+    ]
@@ -0,0 +1,45 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import migrations
+from pymongo import UpdateOne
+
+
+BATCH_SIZE = 1000
+
+
+def _is_hashed(value):
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
+def hash_passwords(apps, schema_editor):
+    from octofit_tracker.mongo import get_db
+
+    collection = get_db(schema_editor.connection.alias)['users']
+    plain = [doc for doc in collection.find({}, {'password': 1}) if not _is_hashed(doc.get('password') or '')]
+    # PBKDF2 releases the GIL, so a thread per core hashes in parallel.
+    with ThreadPoolExecutor() as executor:
+        for start in range(0, len(plain), BATCH_SIZE):
+            batch = plain[start:start + BATCH_SIZE]
+            hashed = executor.map(make_password, (doc.get('password') or '' for doc in batch))
+            collection.bulk_write([
+                # Matching the old value leaves passwords changed meanwhile alone.
+                UpdateOne({'_id': doc['_id'], 'password': doc.get('password')}, {'$set': {'password': encoded}})
+                for doc, encoded in zip(batch, hashed)
+            ], ordered=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0006_user_totals'),
+    ]
+
+    operations = [
+        # Hashes cannot be reversed; unapplying leaves them in place.
+        migrations.RunPython(hash_passwords, migrations.RunPython.noop),
+    ]
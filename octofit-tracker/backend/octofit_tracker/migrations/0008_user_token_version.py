@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+def default_token_versions(apps, schema_editor):
+    from octofit_tracker.mongo import get_db
+
+    get_db(schema_editor.connection.alias)['users'].update_many(
+        {'token_version': {'$exists': False}}, {'$set': {'token_version': 0}}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0007_hash_user_passwords'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='token_version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(default_token_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+def _collection(schema_editor):
+    from octofit_tracker.mongo import get_db
+    return get_db(schema_editor.connection.alias)['activities']
+
+
+def widen_user_date_index(apps, schema_editor):
+    # (user_id, date, _id) serves per-user newest-first keyset pages from the index alone.
+    collection = _collection(schema_editor)
+    collection.create_indexes([IndexModel(
+        [('user_id', ASCENDING), ('date', DESCENDING), ('_id', DESCENDING)], name='activities_user_date_id_idx'
+    )])
+    if 'activities_user_date_idx' in collection.index_information():
+        collection.drop_index('activities_user_date_idx')
+
+
+def narrow_user_date_index(apps, schema_editor):
+    collection = _collection(schema_editor)
+    collection.create_indexes([IndexModel([('user_id', ASCENDING), ('date', DESCENDING)], name='activities_user_date_idx')])
+    if 'activities_user_date_id_idx' in collection.index_information():
+        collection.drop_index('activities_user_date_id_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('octofit_tracker', '0008_user_token_version'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(widen_user_date_index, narrow_user_date_index),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='activity',
+                    name='activities_user_date_idx',
+                ),
+                migrations.AddIndex(
+                    model_name='activity',
+                    index=models.Index(fields=['user_id', '-date', '-_id'], name='activities_user_date_id_idx'),
+                ),
+            ],
+        ),
+    ]
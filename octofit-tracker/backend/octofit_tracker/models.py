@@ -1,3 +1,4 @@
+from django.contrib.auth.hashers import check_password, make_password
 from djongo import models
 
 class User(models.Model):
@@ -7,13 +8,37 @@ class User(models.Model):
     password = models.CharField(max_length=255)
     team_id = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    token_version = models.IntegerField(default=0)  # bumped to revoke issued API tokens
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['team_id'], name='users_team_idx'),
+        ]
     
     def __str__(self):
         return self.username
 
+    # Set as request.user by token authentication.
+    is_authenticated = True
+    is_anonymous = False
+
+    def save(self, *args, **kwargs):
+        # token_version only changes through tokens.revoke_tokens; writing back
+        # a stale copy from a form or serializer would un-revoke tokens.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'token_version'
+            ]
+        super().save(*args, **kwargs)
+
+    def set_password(self, raw_password):
+        self.password = make_password(raw_password)
+
+    def check_password(self, raw_password):
+        return check_password(raw_password, self.password)
+
 class Team(models.Model):
     _id = models.ObjectIdField()
     name = models.CharField(max_length=100)
@@ -35,9 +60,15 @@ class Activity(models.Model):
     calories_burned = models.IntegerField()
     date = models.DateTimeField()
     notes = models.TextField(blank=True)
+    idempotency_key = models.CharField(max_length=100, blank=True, null=True)  # set by bulk sync clients
     
     class Meta:
         db_table = 'activities'
+        indexes = [
+            models.Index(fields=['user_id', '-date', '-_id'], name='activities_user_date_id_idx'),
+            models.Index(fields=['activity_type', '-date'], name='activities_type_date_idx'),
+            models.Index(fields=['-date', '-_id'], name='activities_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.activity_type} - {self.user_id}"
@@ -51,6 +82,10 @@ class Leaderboard(models.Model):
     
     class Meta:
         db_table = 'leaderboard'
+        indexes = [
+            models.Index(fields=['team_id'], name='leaderboard_team_idx'),
+            models.Index(fields=['rank'], name='leaderboard_rank_idx'),
+        ]
     
     def __str__(self):
         return f"Team {self.team_id} - Rank {self.rank}"
@@ -0,0 +1,45 @@
+import threading
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.db import connections
+from pymongo import MongoClient
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(alias='default'):
+    """Return the process-wide pooled MongoClient for a Django database alias."""
+    client = _clients.get(alias)
+    if client is None:
+        with _lock:
+            client = _clients.get(alias)
+            if client is None:
+                client = MongoClient(**connections[alias].settings_dict.get('CLIENT', {}))
+                _clients[alias] = client
+    return client
+
+
+def get_db(alias='default'):
+    # Read NAME on every call so the test runner's test_ database is honoured.
+    return get_client(alias)[connections[alias].settings_dict['NAME']]
+
+
+def get_collection(model, alias='default'):
+    return get_db(alias)[model._meta.db_table]
+
+
+def to_object_id(value):
+    """Coerce a string id to an ObjectId, returning None when it is not one."""
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+def reset_clients():
+    """Forget inherited clients, e.g. in a freshly forked worker process."""
+    _clients.clear()
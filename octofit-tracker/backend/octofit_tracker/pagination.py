@@ -0,0 +1,36 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+from .mongo import to_object_id
+
+
+class ObjectIdCursorPagination(CursorPagination):
+    """Keyset pagination on ``_id``.
+
+    Each page is a range scan from the cursor position rather than a
+    translated ``OFFSET``, so deep pages cost the same as the first one.
+    """
+    ordering = '_id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        # paginate_queryset has already swapped the class attribute for
+        # get_ordering()'s tuple, so the leading field is ordering[0].
+        field = self.ordering[0].lstrip('-')
+        if cursor is None or cursor.position is None or field != '_id':
+            return cursor
+        # djongo compares ObjectIds, not their hex strings.
+        position = to_object_id(cursor.position)
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor._replace(position=position)
+
+
+class DateCursorPagination(ObjectIdCursorPagination):
+    ordering = '-date'
+
+
+class RankCursorPagination(ObjectIdCursorPagination):
+    ordering = 'rank'
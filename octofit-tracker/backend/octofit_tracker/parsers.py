@@ -0,0 +1,23 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline-delimited JSON into a list, one item per non-blank line."""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        items = []
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line.decode(encoding)))
+            except ValueError as exc:
+                raise ParseError(f'NDJSON parse error on line {number}: {exc}')
+        return items
@@ -0,0 +1,99 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import User
+from .mongo import get_collection
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class PoolFull(APIException):
+    """More password hashes are queued than OCTOFIT_PASSWORD_QUEUE allows."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many password checks in progress; retry shortly.'
+    default_code = 'password_pool_full'
+    wait = 1
+
+
+def get_executor():
+    """Return the process-wide pool that runs password hashers.
+
+    PBKDF2 and argon2 release the GIL while hashing, so threads use every
+    core; the bounded queue in front of it turns a burst of logins or
+    signups into fast 503s instead of request threads stuck waiting.
+    """
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(settings.OCTOFIT_PASSWORD_QUEUE)
+                _executor = ThreadPoolExecutor(settings.OCTOFIT_PASSWORD_WORKERS, thread_name_prefix='password')
+    return _executor
+
+
+def reset_pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = _slots = None
+
+
+def is_hashed(value):
+    try:
+        identify_hasher(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _run(function, *args):
+    """Run ``function`` on the pool and wait for it, or raise PoolFull if the queue is full."""
+    executor = get_executor()
+    if not _slots.acquire(blocking=False):
+        raise PoolFull
+    try:
+        return executor.submit(function, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(raw_password):
+    """``make_password`` on the bounded pool, for signups and password changes."""
+    return _run(make_password, raw_password)
+
+
+def hash_many(raw_passwords):
+    """Hash a batch of passwords on the pool, in order."""
+    return list(get_executor().map(make_password, raw_passwords))
+
+
+def _verify(raw_password, encoded, user_id):
+    if encoded is None:
+        # Hash anyway, so unknown emails take as long as wrong passwords.
+        make_password(raw_password)
+        return False
+
+    def rehash(raw_password):
+        # Conditional on the old hash, so a concurrent password change wins.
+        get_collection(User).update_one(
+            {'_id': user_id, 'password': encoded}, {'$set': {'password': make_password(raw_password)}}
+        )
+    return check_password(raw_password, encoded, setter=rehash if user_id is not None else None)
+
+
+def verify_password(raw_password, encoded, user_id=None):
+    """Check a password on the bounded hashing pool.
+
+    A correct password stored with outdated hasher settings is re-hashed
+    and saved for ``user_id``. Raises PoolFull instead of queueing without
+    bound when logins arrive faster than the pool can hash.
+    """
+    return _run(_verify, raw_password, encoded, user_id)
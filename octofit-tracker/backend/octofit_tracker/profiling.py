@@ -0,0 +1,220 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from pymongo import monitoring
+
+_current = ContextVar('octofit_request_profile', default=None)
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RequestProfile:
+    __slots__ = ('mongo_commands', 'mongo_seconds', 'djongo_seconds', 'view_returned')
+
+    def __init__(self):
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.djongo_seconds = 0.0
+        self.view_returned = None
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Attribute driver time to the request running on the current context."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        profile = _current.get()
+        if profile is not None:
+            profile.mongo_commands += 1
+            profile.mongo_seconds += event.duration_micros / 1e6
+
+    failed = succeeded
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    """Per-view histograms, exposed in the Prometheus text format."""
+    METRICS = {
+        'octofit_request_duration_seconds': ('Request wall time', DURATION_BUCKETS),
+        'octofit_djongo_seconds': ('Time in djongo SQL parsing and translation', DURATION_BUCKETS),
+        'octofit_mongo_seconds': ('Time in the MongoDB driver', DURATION_BUCKETS),
+        'octofit_render_seconds': ('Time rendering the response body', DURATION_BUCKETS),
+        'octofit_mongo_commands': ('MongoDB commands per request', COUNT_BUCKETS),
+        'octofit_response_bytes': ('Response body size', BYTES_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, view, values):
+        with self._lock:
+            for name, value in values.items():
+                key = (name, view)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(self.METRICS[name][1])
+                histogram.observe(value)
+
+    def render(self):
+        with self._lock:
+            snapshot = sorted(self._histograms.items())
+            lines = []
+            for name, (help_text, _) in self.METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, view), histogram in snapshot:
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{view="{view}"}} {histogram.total}')
+                    lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+_installed = False
+
+
+def install():
+    """Register the pymongo listener; must run before any MongoClient exists."""
+    global _installed
+    if not _installed:
+        monitoring.register(CommandTimer())
+        _installed = True
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name or match.func.__name__
+    action = (getattr(match.func, 'actions', None) or {}).get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class QueryProfilingMiddleware:
+    """Per-request Mongo command counts and a time breakdown.
+
+    Splits the request into djongo translation (execute time not spent in
+    the driver), driver time from pymongo command monitoring, response
+    rendering and everything else. Reported as a Server-Timing header and
+    as per-view histograms on /metrics. The hot path is a context variable
+    and a handful of perf_counter calls.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'OCTOFIT_PROFILING', False):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self.time_execute):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, profile, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # Motor copies the context into its executor threads, so driver time
+        # lands on this profile; ORM work in sync_to_async threads is not
+        # split out as djongo time.
+        profile = RequestProfile()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, profile, time.perf_counter() - start)
+
+    def report(self, request, response, profile, total):
+        render = time.perf_counter() - profile.view_returned if profile.view_returned else 0.0
+        render = min(render, total)
+        djongo = profile.djongo_seconds
+        mongo = profile.mongo_seconds
+        app = max(total - render - djongo - mongo, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'djongo;dur={djongo * 1000:.2f}',
+            f'mongo;dur={mongo * 1000:.2f};desc="{profile.mongo_commands} commands"',
+            f'render;dur={render * 1000:.2f}',
+            f'app;dur={app * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(view_label(request), {
+            'octofit_request_duration_seconds': total,
+            'octofit_djongo_seconds': djongo,
+            'octofit_mongo_seconds': mongo,
+            'octofit_render_seconds': render,
+            'octofit_mongo_commands': profile.mongo_commands,
+            'octofit_response_bytes': size,
+        })
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook returns.
+        profile = _current.get()
+        if profile is not None:
+            profile.view_returned = time.perf_counter()
+        return response
+
+    def time_execute(self, execute, sql, params, many, context):
+        profile = _current.get()
+        mongo_before = profile.mongo_seconds
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            profile.djongo_seconds += max(elapsed - (profile.mongo_seconds - mongo_before), 0.0)
+
+
+def metrics_view(request):
+    """Prometheus scrape target for staff users, or ``Bearer OCTOFIT_METRICS_TOKEN``."""
+    token = settings.OCTOFIT_METRICS_TOKEN
+    bearer = request.META.get('HTTP_AUTHORIZATION', '').partition('Bearer ')[2]
+    if not (request.user.is_staff or token and constant_time_compare(bearer, token)):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_CHANNEL = 'leaderboard'
+SUBSCRIBER_QUEUE_SIZE = 16
+# Sent instead of the missed updates when a subscriber's queue overflows
+# or the process may have missed published changes.
+RESYNC = {'resync': True}
+# Seconds between Redis reconnect attempts, doubling up to the maximum.
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+
+class Subscription:
+    __slots__ = ('channel', 'loop', 'queue')
+
+    def __init__(self, channel, loop):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, message):
+        # Runs on self.loop. A slow client gets one resync, not an unbounded backlog.
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESYNC
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+def _deliver_all(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.deliver(message)
+
+
+class Hub:
+    """Per-process fan-out of channel changes to async subscribers.
+
+    Changes received from any thread are merged by key, so a burst of
+    writes to the same rows becomes one message, and flushed to subscribers
+    at most once per ``interval`` seconds with one loop callback per event
+    loop, however many connections are idle on it.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._pending = {}
+        self._timer = None
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.channel].discard(subscription)
+
+    def receive(self, channel, changes, key):
+        with self._lock:
+            if not self._subscriptions[channel]:
+                return
+            pending = self._pending.setdefault(channel, {})
+            for change in changes:
+                pending[change[key]] = change
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending, self._timer = self._pending, {}, None
+            targets = {channel: list(self._subscriptions[channel]) for channel in pending}
+        for channel, changes in pending.items():
+            self._send(targets[channel], {'changes': list(changes.values())})
+
+    def resync(self):
+        """Tell every subscriber to refetch, after changes may have been lost."""
+        with self._lock:
+            self._pending = {}
+            targets = [subscription for subscriptions in self._subscriptions.values() for subscription in subscriptions]
+        self._send(targets, RESYNC)
+
+    def _send(self, targets, message):
+        by_loop = defaultdict(list)
+        for subscription in targets:
+            by_loop[subscription.loop].append(subscription)
+        for loop, subscriptions in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_all, subscriptions, message)
+            except RuntimeError:
+                # The loop closed with subscribers still registered.
+                pass
+
+
+class LocalBackend:
+    """Deliver to subscribers in this process only; enough for one ASGI worker."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, channel, changes, key):
+        self.hub.receive(channel, changes, key)
+
+    def start(self):
+        pass
+
+
+class RedisBackend:
+    """Redis PUBLISH/SUBSCRIBE, so every worker's subscribers see every writer's changes.
+
+    Needs the ``redis`` package and OCTOFIT_REDIS_URL. Each process listens
+    on one connection and feeds its own Hub, which still coalesces. A lost
+    connection is retried with backoff; once resubscribed, local subscribers
+    get RESYNC, since anything published meanwhile never reached them.
+    """
+    prefix = 'octofit:pubsub:'
+
+    def __init__(self, hub):
+        import redis
+
+        self.hub = hub
+        self.client = redis.Redis.from_url(settings.OCTOFIT_REDIS_URL)
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def publish(self, channel, changes, key):
+        payload = json.dumps({'key': key, 'changes': changes}, default=str)
+        self.client.publish(self.prefix + channel, payload)
+
+    def start(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='octofit-pubsub', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        delay, reconnecting = RECONNECT_DELAY, False
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(self.prefix + '*')
+                if reconnecting:
+                    self.hub.resync()
+                delay = RECONNECT_DELAY
+                for message in pubsub.listen():
+                    channel = message['channel'].decode()[len(self.prefix):]
+                    payload = json.loads(message['data'])
+                    self.hub.receive(channel, payload['changes'], payload['key'])
+            except Exception:
+                logger.warning('Redis pub/sub listener failed; reconnecting in %.1fs', delay, exc_info=True)
+            finally:
+                reconnecting = True
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = import_string(settings.OCTOFIT_PUBSUB_BACKEND)
+                _broker = backend(Hub(settings.OCTOFIT_PUSH_INTERVAL))
+    return _broker
+
+
+def reset_broker():
+    global _broker
+    _broker = None
+
+
+def publish(channel, changes, key='team_id'):
+    if changes:
+        get_broker().publish(channel, changes, key)
+
+
+def subscribe(channel):
+    """Register a subscription on the running event loop."""
+    broker = get_broker()
+    broker.start()
+    return broker.hub.subscribe(channel)
+
+
+def unsubscribe(subscription):
+    get_broker().hub.unsubscribe(subscription)
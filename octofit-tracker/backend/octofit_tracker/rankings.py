@@ -0,0 +1,305 @@
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from pymongo import ASCENDING, DeleteMany, IndexModel, UpdateOne
+
+from .models import Activity
+from .mongo import get_collection, get_db
+
+RANKING_METRICS = ('calories_burned', 'distance', 'duration')
+USER_TOTALS_COLLECTION = 'user_totals'
+# Holds a token replaced whenever totals are removed, which incremental syncs cannot see.
+GENERATION_COLLECTION = 'user_totals_generation'
+USER_TOTALS_INDEX = IndexModel([('updated_at', ASCENDING)], name='user_totals_updated_idx')
+# Re-read totals written this long before the last sync, to absorb clock skew between writers.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class _End:
+    """Sorts after every key, so the tail sentinel never needs a None check."""
+    __slots__ = ()
+
+    def __lt__(self, other):
+        return False
+
+    __le__ = __eq__ = __lt__
+
+    def __gt__(self, other):
+        return True
+
+    __ge__ = __gt__
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, next, width):
+        self.key = key
+        self.next = next
+        self.width = width
+
+
+_TAIL = _Node(_End(), [], [])
+
+
+class IndexableSkiplist:
+    """Sorted collection of unique keys with O(log n) insert, remove, bisect and index.
+
+    Each link records how many positions it skips, which is what makes
+    positional lookups logarithmic.
+    """
+
+    def __init__(self, expected_size=1 << 20):
+        self.levels = max(1, int(math.log2(expected_size)) + 1)
+        self.head = _Node(None, [_TAIL] * self.levels, [1] * self.levels)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, key):
+        chain = [None] * self.levels
+        steps = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key <= key:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = min(self.levels, 1 - int(math.log2(1.0 - random.random())))
+        new = _Node(key, [None] * height, [None] * height)
+        skipped = 0
+        for level in range(height):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - skipped
+            previous.width[level] = skipped + 1
+            skipped += steps[level]
+        for level in range(height, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain = [None] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+        target = chain[0].next[0]
+        if target is _TAIL or target.key != key:
+            raise KeyError(key)
+        for level in range(len(target.next)):
+            previous = chain[level]
+            previous.width[level] += target.width[level] - 1
+            previous.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def bisect_left(self, key):
+        """Number of keys strictly less than ``key``."""
+        node = self.head
+        position = 0
+        for level in reversed(range(self.levels)):
+            while node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def islice(self, start, stop):
+        """Yield the keys at positions start..stop-1."""
+        stop = min(stop, self.size)
+        if start >= stop:
+            return
+        node = self.head
+        position = start + 1
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= position:
+                position -= node.width[level]
+                node = node.next[level]
+        for _ in range(stop - start):
+            yield node.key
+            node = node.next[0]
+
+
+class Ranking:
+    """Scores for one metric, ordered highest first with tied users sharing a rank."""
+
+    def __init__(self):
+        self.scores = {}
+        self.order = IndexableSkiplist()
+
+    def __len__(self):
+        return len(self.scores)
+
+    def set(self, user_id, score):
+        previous = self.scores.get(user_id)
+        if previous == score:
+            return
+        if previous is not None:
+            self.order.remove((-previous, user_id))
+        self.scores[user_id] = score
+        self.order.insert((-score, user_id))
+
+    def discard(self, user_id):
+        previous = self.scores.pop(user_id, None)
+        if previous is not None:
+            self.order.remove((-previous, user_id))
+
+    def rank_of_score(self, score):
+        # '' sorts before every id, so this counts strictly higher scores.
+        return self.order.bisect_left((-score, '')) + 1
+
+    def rank(self, user_id):
+        score = self.scores.get(user_id, 0)
+        return self.rank_of_score(score), score
+
+    def top(self, limit, offset=0):
+        rows = []
+        previous_score, rank = None, None
+        for position, (negative, user_id) in enumerate(self.order.islice(offset, offset + limit), start=offset + 1):
+            score = -negative
+            if score != previous_score:
+                rank = position if rows else self.rank_of_score(score)
+                previous_score = score
+            rows.append({'rank': rank, 'user_id': user_id, 'score': score})
+        return rows
+
+
+def user_totals_collection():
+    return get_db()[USER_TOTALS_COLLECTION]
+
+
+def current_generation():
+    document = get_db()[GENERATION_COLLECTION].find_one({'_id': USER_TOTALS_COLLECTION})
+    return document['token'] if document else None
+
+
+def bump_generation():
+    get_db()[GENERATION_COLLECTION].update_one(
+        {'_id': USER_TOTALS_COLLECTION}, {'$set': {'token': uuid.uuid4().hex}}, upsert=True
+    )
+
+
+def ensure_user_totals_indexes(alias='default'):
+    get_db(alias)[USER_TOTALS_COLLECTION].create_indexes([USER_TOTALS_INDEX])
+
+
+def apply_activity_changes(added=(), removed=()):
+    """Fold created and deleted activities into per-user all-time totals."""
+    deltas = defaultdict(lambda: dict.fromkeys(RANKING_METRICS, 0))
+    for activities, sign in ((added, 1), (removed, -1)):
+        for activity in activities:
+            for metric in RANKING_METRICS:
+                deltas[activity['user_id']][metric] += sign * (activity.get(metric) or 0)
+    now = timezone.now()
+    operations = [
+        UpdateOne({'_id': user_id}, {'$inc': totals, '$set': {'updated_at': now}}, upsert=True)
+        for user_id, totals in deltas.items()
+        if any(totals.values())
+    ]
+    if operations:
+        user_totals_collection().bulk_write(operations, ordered=False)
+        board.mark_stale()
+
+
+def rebuild_user_totals():
+    """Recompute every user's totals with one aggregation over activities."""
+    now = timezone.now()
+    rows = get_collection(Activity).aggregate([
+        {'$group': {
+            '_id': '$user_id',
+            **{metric: {'$sum': {'$ifNull': [f'${metric}', 0]}} for metric in RANKING_METRICS},
+        }},
+    ], allowDiskUse=True)
+    operations = [
+        UpdateOne({'_id': row.pop('_id')}, {'$set': dict(row, updated_at=now)}, upsert=True)
+        for row in rows
+    ]
+    collection = user_totals_collection()
+    collection.bulk_write(operations + [DeleteMany({'updated_at': {'$lt': now}})], ordered=True)
+    bump_generation()
+    board.reset()
+    return len(operations)
+
+
+def remove_user_totals(user_ids):
+    """Drop deleted users' totals; every process reloads its rankings on its next sync."""
+    user_ids = [str(user_id) for user_id in user_ids]
+    if user_ids:
+        user_totals_collection().delete_many({'_id': {'$in': user_ids}})
+        bump_generation()
+        board.mark_stale()
+
+
+class RankingBoard:
+    """Process-wide rankings for every metric, loaded from ``user_totals`` on first use.
+
+    Afterwards only totals updated since the last sync are re-read, at most
+    once per OCTOFIT_RANKING_SYNC_SECONDS or right after this process wrote,
+    so writes from other workers show up without rescanning every user.
+    Removed totals leave nothing to re-read, so removals change the
+    generation token and a changed token triggers a full reload.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.rankings = None
+        self.generation = None
+        self.synced_at = None
+        self.checked_at = 0.0
+        self.stale = True
+
+    def mark_stale(self):
+        self.stale = True
+
+    def _apply(self, documents):
+        for document in documents:
+            for metric, ranking in self.rankings.items():
+                ranking.set(document['_id'], document.get(metric) or 0)
+
+    def refresh(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.rankings is not None and not self.stale \
+                    and now - self.checked_at < settings.OCTOFIT_RANKING_SYNC_SECONDS:
+                return
+            self.stale = False
+            self.checked_at = now
+            started = timezone.now()
+            generation = current_generation()
+            if self.rankings is None or generation != self.generation:
+                self.rankings = {metric: Ranking() for metric in RANKING_METRICS}
+                self.generation = generation
+                self._apply(user_totals_collection().find({}))
+            else:
+                self._apply(user_totals_collection().find({'updated_at': {'$gte': self.synced_at - SYNC_OVERLAP}}))
+            self.synced_at = started
+
+    def top(self, metric, limit, offset=0):
+        self.refresh()
+        with self._lock:
+            ranking = self.rankings[metric]
+            return len(ranking), ranking.top(limit, offset)
+
+    def rank(self, metric, user_id):
+        self.refresh()
+        with self._lock:
+            ranking = self.rankings[metric]
+            return len(ranking), ranking.rank(user_id)
+
+
+board = RankingBoard()
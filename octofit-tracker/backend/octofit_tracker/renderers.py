@@ -0,0 +1,43 @@
+import re
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson writes exponents as 1e16 / 1e-6 where json.dumps writes 1e+16 / 1e-06.
+# Scanning for the exponent first is several times faster than matching whole
+# number tokens; each hit is then checked for a mantissa after one of :,[
+EXPONENT = re.compile(rb'e-?\d+[,}\]]')
+MANTISSA = re.compile(rb'[:,\[]-?\d+(?:\.\d+)?$')
+
+
+def has_exponent_number(content):
+    return any(
+        MANTISSA.search(content, max(match.start() - 40, 0), match.start())
+        for match in EXPONENT.finditer(content)
+    )
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it is installed.
+
+    The output is byte-for-byte what JSONRenderer produces. Anything orjson
+    would write differently (indented output, exponent floats, non-string
+    keys, integers over 64 bits) is rendered by JSONRenderer instead.
+    NaN and infinity render as null rather than raising.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict \
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if has_exponent_number(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,177 @@
+from bson.codec_options import CodecOptions
+from pymongo import ASCENDING, DESCENDING
+
+from .models import Activity, Leaderboard, User
+from .mongo import get_collection, to_object_id
+
+LOOKUP_OPERATORS = {
+    'exact': None,
+    'gt': '$gt',
+    'gte': '$gte',
+    'lt': '$lt',
+    'lte': '$lte',
+    'in': '$in',
+    'ne': '$ne',
+}
+
+
+class Record:
+    """Read-only row with the model's attribute names, built straight from a document.
+
+    Serializers read records exactly as they read model instances, without
+    the per-row Model.__init__, field descriptors and instance __dict__.
+    """
+    __slots__ = ()
+
+    def __init__(self, document):
+        for name in self.__slots__:
+            setattr(self, name, document.get(name))
+
+    @property
+    def pk(self):
+        return self._id
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self._id}>'
+
+
+def record_class_for(model):
+    attnames = tuple(field.attname for field in model._meta.concrete_fields)
+    return type(f'{model.__name__}Record', (Record,), {'__slots__': attnames})
+
+
+class RecordQuery:
+    """The subset of the QuerySet API used by the ViewSets and paginators.
+
+    Supports filter() with exact/gt/gte/lt/lte/in/ne lookups, order_by(),
+    only(), get(), count(), iteration and slicing, each translated directly
+    into a pymongo find on the shared client.
+    """
+
+    def __init__(self, repository, query=None, sort=None, fields=None):
+        self.repository = repository
+        self.query = query or {}
+        self.sort = sort or []
+        self.fields = fields
+        self._cache = None
+
+    @property
+    def model(self):
+        return self.repository.model
+
+    def _clone(self, **changes):
+        state = {'query': self.query, 'sort': self.sort, 'fields': self.fields}
+        state.update(changes)
+        return RecordQuery(self.repository, **state)
+
+    def _condition(self, lookup, value):
+        name, _, operator = lookup.partition('__')
+        operator = operator or 'exact'
+        if operator not in LOOKUP_OPERATORS:
+            raise ValueError(f'Unsupported lookup: {lookup}')
+        field = self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+        # Coerce like the ORM would, e.g. cursor positions arrive as strings.
+        if field.attname == '_id':
+            convert = to_object_id
+        else:
+            convert = field.to_python
+        value = [convert(v) for v in value] if operator == 'in' else convert(value)
+        mongo_operator = LOOKUP_OPERATORS[operator]
+        return field.attname, value if mongo_operator is None else {mongo_operator: value}
+
+    def filter(self, **lookups):
+        conditions = [dict([self._condition(lookup, value)]) for lookup, value in lookups.items()]
+        query = {'$and': [self.query] + conditions} if self.query else (
+            conditions[0] if len(conditions) == 1 else {'$and': conditions}
+        )
+        return self._clone(query=query)
+
+    def order_by(self, *names):
+        sort = [
+            (self.model._meta.get_field(name.lstrip('-')).attname,
+             DESCENDING if name.startswith('-') else ASCENDING)
+            for name in names
+        ]
+        return self._clone(sort=sort)
+
+    def only(self, *names):
+        return self._clone(fields=list(dict.fromkeys(('_id',) + names)))
+
+    def all(self):
+        return self._clone()
+
+    def _find(self, skip=0, limit=0):
+        projection = dict.fromkeys(self.fields, 1) if self.fields else None
+        cursor = self.repository.collection().find(self.query, projection, skip=skip, limit=limit)
+        if self.sort:
+            cursor = cursor.sort(self.sort)
+        record_class = self.repository.record_class
+        return [record_class(document) for document in cursor]
+
+    def __iter__(self):
+        if self._cache is None:
+            self._cache = self._find()
+        return iter(self._cache)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            if key.step is not None:
+                raise ValueError('Slicing with a step is not supported')
+            start = key.start or 0
+            if key.stop is None:
+                return self._find(skip=start)
+            return self._find(skip=start, limit=max(key.stop - start, 0)) if key.stop > start else []
+        rows = self._find(skip=key, limit=1)
+        if not rows:
+            raise IndexError(key)
+        return rows[0]
+
+    def count(self):
+        return self.repository.collection().count_documents(self.query)
+
+    def get(self, **lookups):
+        rows = self.filter(**lookups)._find(limit=2)
+        if not rows:
+            raise self.model.DoesNotExist(f'{self.model.__name__} matching query does not exist.')
+        if len(rows) > 1:
+            raise self.model.MultipleObjectsReturned(f'get() returned more than one {self.model.__name__}')
+        return rows[0]
+
+
+class Repository:
+    model = None
+
+    def __init__(self):
+        self.record_class = record_class_for(self.model)
+
+    def collection(self):
+        # Aware datetimes, as the ORM returns with USE_TZ, keep cursors and output identical.
+        return get_collection(self.model).with_options(codec_options=CodecOptions(tz_aware=True))
+
+    def query(self):
+        return RecordQuery(self)
+
+    def get(self, object_id):
+        object_id = to_object_id(object_id)
+        document = self.collection().find_one({'_id': object_id}) if object_id else None
+        return self.record_class(document) if document else None
+
+
+class ActivityRepository(Repository):
+    model = Activity
+
+
+class UserRepository(Repository):
+    model = User
+
+
+class LeaderboardRepository(Repository):
+    model = Leaderboard
+
+
+activities = ActivityRepository()
+users = UserRepository()
+leaderboard = LeaderboardRepository()
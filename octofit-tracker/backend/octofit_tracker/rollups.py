@@ -0,0 +1,172 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from bson import ObjectId
+from django.utils import timezone
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from .leaderboard import teams_for_activities
+from .models import Activity, User
+from .mongo import get_collection, get_db
+from .stats import DATE_FORMATS
+
+COLLECTIONS = {
+    'day': 'activity_rollups_daily',
+    'week': 'activity_rollups_weekly',
+}
+TOTAL_FIELDS = ('count', 'duration', 'distance', 'calories_burned')
+ROLLUP_INDEX = IndexModel(
+    [('scope', ASCENDING), ('owner_id', ASCENDING), ('period', ASCENDING)],
+    name='rollups_owner_period_uniq', unique=True,
+)
+HISTORY_DAYS = 365
+BACKFILL_OVERLAP = timedelta(minutes=1)
+
+
+def get_rollup_collection(period, alias='default'):
+    return get_db(alias)[COLLECTIONS[period]]
+
+
+def ensure_rollup_indexes(alias='default'):
+    for period in COLLECTIONS:
+        get_rollup_collection(period, alias).create_indexes([ROLLUP_INDEX])
+
+
+def period_start(when, period):
+    """Truncate a date to the UTC start of its day or ISO week, as stored in the rollups."""
+    if when.tzinfo is not None:
+        when = when.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    start = datetime(when.year, when.month, when.day)
+    if period == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def _empty_totals():
+    return dict.fromkeys(TOTAL_FIELDS, 0)
+
+
+def rollup_deltas(activities, team_of, sign=1, deltas=None):
+    """Accumulate per-bucket deltas keyed by (period, scope, owner_id, start)."""
+    if deltas is None:
+        deltas = defaultdict(_empty_totals)
+    for activity in activities:
+        owners = [('user', activity['user_id'])]
+        if team_of.get(activity['user_id']):
+            owners.append(('team', team_of[activity['user_id']]))
+        for period in COLLECTIONS:
+            start = period_start(activity['date'], period)
+            for scope, owner_id in owners:
+                totals = deltas[(period, scope, owner_id, start)]
+                totals['count'] += sign
+                totals['duration'] += sign * (activity.get('duration') or 0)
+                totals['distance'] += sign * (activity.get('distance') or 0)
+                totals['calories_burned'] += sign * (activity.get('calories_burned') or 0)
+    return deltas
+
+
+def write_deltas(deltas, collections=None):
+    """Apply bucket deltas with ``$inc`` upserts, dropping buckets that emptied."""
+    if collections is None:
+        collections = {period: get_rollup_collection(period) for period in COLLECTIONS}
+    updates, shrunk = defaultdict(list), defaultdict(list)
+    for (period, scope, owner_id, start), totals in deltas.items():
+        if not any(totals.values()):
+            continue
+        key = {'scope': scope, 'owner_id': owner_id, 'period': start}
+        updates[period].append(UpdateOne(key, {'$inc': totals}, upsert=True))
+        if totals['count'] < 0:
+            shrunk[period].append(key)
+    for period, operations in updates.items():
+        collection = collections[period]
+        collection.bulk_write(operations, ordered=False)
+        if shrunk[period]:
+            collection.delete_many({'$or': shrunk[period], 'count': {'$lte': 0}})
+
+
+def apply_activity_changes(added=(), removed=()):
+    """Fold created and deleted activities into the daily and weekly rollups.
+
+    Team buckets follow the user's current team; ``backfill_rollups``
+    reattributes history after users change teams.
+    """
+    team_of = teams_for_activities([*added, *removed])
+    deltas = rollup_deltas(added, team_of)
+    rollup_deltas(removed, team_of, sign=-1, deltas=deltas)
+    write_deltas(deltas)
+
+
+def backfill_rollups(batch_size=5000):
+    """Rebuild both rollup collections with one pass over activities in date order.
+
+    Buckets are flushed every ``batch_size`` activities; since the stream is
+    date ordered, each flush touches only the few buckets in its date range.
+    The rebuild writes to staging collections that are renamed over the live
+    ones at the end, so /history/ keeps serving the old buckets meanwhile.
+    The live ``$inc`` updates made during the run are discarded by the
+    rename: activities inserted meanwhile are re-read by ``_id`` before it
+    and folded in unless the scan already counted them, but edits and
+    deletes of existing activities are not replayed. Run it with those
+    paused, or run it again afterwards. Returns the number of activities read.
+    """
+    started = timezone.now()
+    db = get_db()
+    staging = {period: db[f'{name}_backfill'] for period, name in COLLECTIONS.items()}
+    for collection in staging.values():
+        collection.drop()
+        collection.create_indexes([ROLLUP_INDEX])
+
+    team_of = {
+        str(doc['_id']): doc['team_id']
+        for doc in get_collection(User).find({'team_id': {'$nin': [None, '']}}, {'team_id': 1})
+    }
+    projection = {field: 1 for field in ('user_id', 'date', 'duration', 'distance', 'calories_burned')}
+    cursor = get_collection(Activity).find({}, projection).sort('date', ASCENDING).batch_size(batch_size)
+
+    # ObjectIds carry each app server's clock, so look a little further back.
+    first_new_id = ObjectId.from_datetime(started - BACKFILL_OVERLAP)
+    seen_new = set()
+    deltas, pending, total = None, 0, 0
+    for activity in cursor:
+        if activity['_id'] >= first_new_id:
+            seen_new.add(activity['_id'])
+        deltas = rollup_deltas([activity], team_of, deltas=deltas)
+        pending += 1
+        if pending >= batch_size:
+            write_deltas(deltas, staging)
+            deltas, total, pending = None, total + pending, 0
+    if deltas:
+        write_deltas(deltas, staging)
+    inserted = [
+        activity for activity in get_collection(Activity).find({'_id': {'$gte': first_new_id}}, projection)
+        if activity['_id'] not in seen_new
+    ]
+    if inserted:
+        write_deltas(rollup_deltas(inserted, teams_for_activities(inserted)), staging)
+    for period, collection in staging.items():
+        collection.rename(COLLECTIONS[period], dropTarget=True)
+    return total + pending + len(inserted)
+
+
+def read_history(scope, owner_id, period='day', since=None, until=None):
+    """Return totals per bucket for one user or team, oldest first.
+
+    ``since`` defaults to HISTORY_DAYS ago and ``until`` is exclusive, so a
+    default daily chart reads at most HISTORY_DAYS small documents.
+    """
+    if since is None:
+        since = timezone.now() - timedelta(days=HISTORY_DAYS)
+    query = {'scope': scope, 'owner_id': owner_id, 'period': {'$gte': period_start(since, period)}}
+    if until is not None:
+        query['period']['$lt'] = until.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    rows = get_rollup_collection(period).find(query, {'_id': 0}).sort('period', ASCENDING)
+    return [
+        {
+            'key': row['period'].strftime(DATE_FORMATS[period]),
+            'count': row['count'],
+            'duration': row['duration'],
+            'distance': round(row['distance'], 2),
+            'calories_burned': row['calories_burned'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,281 @@
+import logging
+import re
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from bson import ObjectId
+from django.conf import settings
+from django.utils import timezone
+
+from .leaderboard import teams_for_activities
+from .models import Activity
+from .mongo import get_collection
+from .rankings import Ranking
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ('team', 'user')
+PROJECTION = {'user_id': 1, 'activity_type': 1, 'date': 1, 'duration': 1, 'distance': 1, 'calories_burned': 1}
+# ObjectIds are stamped by each app server's clock, so catch-ups re-read a
+# little before the previous one to allow for skew between hosts.
+SYNC_OVERLAP = timedelta(minutes=1)
+_ROLLING = re.compile(r'^(\d+)d$')
+
+
+def points_for(activity, formulas=None):
+    """Score one activity with the linear formula configured for its type."""
+    formulas = formulas or settings.OCTOFIT_POINT_FORMULAS
+    weights = formulas.get(activity.get('activity_type'), formulas['default'])
+    return round(sum(weight * (activity.get(field) or 0) for field, weight in weights.items()))
+
+
+def day_number(when):
+    if when.tzinfo is not None:
+        when = when.astimezone(dt_timezone.utc)
+    return when.toordinal()
+
+
+class Window:
+    """``Nd`` is today and the N-1 days before it; ``month`` is the calendar month so far."""
+
+    def __init__(self, name):
+        self.name = name
+        match = _ROLLING.match(name)
+        if match:
+            self.days = int(match.group(1))
+        elif name == 'month':
+            self.days = None
+        else:
+            raise ValueError(f'Unknown scoring window: {name}')
+
+    @property
+    def length(self):
+        return self.days or 31
+
+    def start(self, today):
+        if self.days:
+            return today - self.days + 1
+        return date.fromordinal(today).replace(day=1).toordinal()
+
+
+class WindowEngine:
+    """Sliding-window point totals per owner, backed by a ring of day buckets.
+
+    Each slot holds one day's points per owner. Advancing to a new day
+    subtracts the buckets that fell out of each window and recycles their
+    slots, so the cost is proportional to the owners active on the dropped
+    days, never to the size of the activity history. Totals live in a
+    Ranking per window for O(log n) rank and top-K.
+    """
+
+    def __init__(self, windows, today):
+        self.windows = windows
+        self.size = max(window.length for window in windows)
+        self.slots = [{} for _ in range(self.size)]
+        self.today = today
+        self.rankings = {window.name: Ranking() for window in windows}
+
+    def _bump(self, ranking, owner, delta):
+        total = ranking.scores.get(owner, 0) + delta
+        if total:
+            ranking.set(owner, total)
+        else:
+            ranking.discard(owner)
+
+    def add(self, owner, day, points):
+        # Future-dated activities and days older than the ring are outside every window.
+        if not points or day > self.today or day <= self.today - self.size:
+            return
+        bucket = self.slots[day % self.size]
+        bucket[owner] = bucket.get(owner, 0) + points
+        for window in self.windows:
+            if day >= window.start(self.today):
+                self._bump(self.rankings[window.name], owner, points)
+
+    def advance(self, today):
+        if today <= self.today:
+            return
+        oldest_kept = self.today - self.size + 1
+        for window in self.windows:
+            ranking = self.rankings[window.name]
+            leaving = range(max(window.start(self.today), oldest_kept), min(window.start(today), self.today + 1))
+            for day in leaving:
+                for owner, points in self.slots[day % self.size].items():
+                    self._bump(ranking, owner, -points)
+        for day in range(max(self.today + 1, today - self.size + 1), today + 1):
+            self.slots[day % self.size] = {}
+        self.today = today
+
+    def start_date(self, window_name):
+        window = next(window for window in self.windows if window.name == window_name)
+        return date.fromordinal(window.start(self.today))
+
+
+def today_number():
+    return timezone.now().astimezone(dt_timezone.utc).toordinal()
+
+
+class ScoringBoard:
+    """Process-wide window engines for users and teams.
+
+    Loaded on first use from the activities inside the longest window, then
+    kept current by the derived-data handler. Writes made by other workers
+    are picked up off the request path: a background catch-up adds the
+    activities inserted since the previous one every
+    OCTOFIT_SCORING_SYNC_SECONDS, and a background rebuild every
+    OCTOFIT_SCORING_RELOAD_SECONDS picks up their edits and deletes. Each
+    counted activity is remembered by _id with the points it contributed,
+    so an activity seen both in-process and by a catch-up counts once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.engines = None
+        # _id -> (user_id, team_id, day, points) for every activity in the engines.
+        self.counted = None
+        # In-process changes made while a rebuild reads the window, replayed onto it.
+        self.journal = None
+        self.loaded_at = self.synced_at = 0.0
+        self.caught_up_to = None
+
+    def _since(self, size, today):
+        return datetime.combine(date.fromordinal(today - size + 1), dt_time.min)
+
+    def _read(self, query):
+        activities = list(get_collection(Activity).find(query, PROJECTION))
+        return activities, teams_for_activities(activities)
+
+    def _advance(self, engines, counted):
+        today = today_number()
+        if today <= engines['user'].today:
+            return
+        for engine in engines.values():
+            engine.advance(today)
+        oldest_kept = today - engines['user'].size
+        for activity_id in [key for key, entry in counted.items() if entry[2] <= oldest_kept]:
+            del counted[activity_id]
+
+    def _count(self, engines, counted, activities, team_of):
+        formulas = settings.OCTOFIT_POINT_FORMULAS
+        user_engine = engines['user']
+        for activity in activities:
+            day = day_number(activity['date'])
+            if activity['_id'] in counted or day > user_engine.today or day <= user_engine.today - user_engine.size:
+                continue
+            points = points_for(activity, formulas)
+            team_id = team_of.get(activity['user_id'])
+            user_engine.add(activity['user_id'], day, points)
+            if team_id:
+                engines['team'].add(team_id, day, points)
+            counted[activity['_id']] = (activity['user_id'], team_id, day, points)
+
+    def _uncount(self, engines, counted, activities):
+        for activity in activities:
+            entry = counted.pop(activity['_id'], None)
+            if entry is None:
+                continue
+            user_id, team_id, day, points = entry
+            engines['user'].add(user_id, day, -points)
+            if team_id:
+                engines['team'].add(team_id, day, -points)
+
+    def _change(self, engines, counted, added, removed, team_of):
+        self._advance(engines, counted)
+        self._uncount(engines, counted, removed)
+        self._count(engines, counted, added, team_of)
+
+    def apply(self, added, removed):
+        team_of = teams_for_activities(added) if added else {}
+        with self._lock:
+            if self.journal is not None:
+                self.journal.append((added, removed, team_of))
+            if self.engines is not None:
+                self._change(self.engines, self.counted, added, removed, team_of)
+
+    def _rebuild(self):
+        windows = [Window(name) for name in settings.OCTOFIT_SCORING_WINDOWS]
+        today = today_number()
+        engines = {scope: WindowEngine(windows, today) for scope in SCOPES}
+        counted = {}
+        with self._lock:
+            self.journal = []
+        started = timezone.now()
+        try:
+            activities, team_of = self._read({'date': {'$gte': self._since(engines['user'].size, today)}})
+            self._count(engines, counted, activities, team_of)
+        except Exception:
+            with self._lock:
+                self.journal = None
+            raise
+        with self._lock:
+            journal, self.journal = self.journal, None
+            for added, removed, team_of in journal:
+                self._change(engines, counted, added, removed, team_of)
+            self.engines, self.counted = engines, counted
+            self.loaded_at = self.synced_at = time.monotonic()
+            self.caught_up_to = started
+
+    def _catch_up(self):
+        started = timezone.now()
+        with self._lock:
+            since = self._since(self.engines['user'].size, today_number())
+        first_id = ObjectId.from_datetime(self.caught_up_to - SYNC_OVERLAP)
+        activities, team_of = self._read({'_id': {'$gte': first_id}, 'date': {'$gte': since}})
+        with self._lock:
+            self._change(self.engines, self.counted, activities, (), team_of)
+            self.synced_at = time.monotonic()
+            self.caught_up_to = started
+
+    def refresh(self, full=False):
+        """Bring the engines up to date with the database; ``full`` rebuilds them from the window."""
+        with self._refreshing:
+            self._refresh(full)
+
+    def _refresh(self, full):
+        if full or self.engines is None or time.monotonic() - self.loaded_at > settings.OCTOFIT_SCORING_RELOAD_SECONDS:
+            self._rebuild()
+        else:
+            self._catch_up()
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh(False)
+        except Exception:
+            logger.exception('Scoring refresh failed')
+        finally:
+            self._refreshing.release()
+
+    def schedule_refresh(self):
+        """Start a background refresh if one is due and none is running."""
+        if time.monotonic() - self.synced_at < settings.OCTOFIT_SCORING_SYNC_SECONDS:
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return
+        threading.Thread(target=self._refresh_in_background, name='scoring-refresh', daemon=True).start()
+
+    def standings(self, scope, window, limit, offset=0):
+        """Return the window start, owner count and one page of ranked owners."""
+        if self.engines is None:
+            with self._refreshing:
+                if self.engines is None:
+                    self._rebuild()
+        else:
+            self.schedule_refresh()
+        with self._lock:
+            self._advance(self.engines, self.counted)
+            engine = self.engines[scope]
+            ranking = engine.rankings[window]
+            return engine.start_date(window), len(ranking), ranking.top(limit, offset)
+
+
+board = ScoringBoard()
+
+
+def apply_activity_changes(added=(), removed=()):
+    """Fold created and deleted activities into the loaded window engines."""
+    board.apply(added, removed)
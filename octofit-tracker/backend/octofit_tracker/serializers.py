@@ -1,28 +1,194 @@
-from rest_framework import serializers
+from datetime import datetime, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from bson import ObjectId
+from django.conf import settings
+from django.db.models import Manager
+from django.utils import timezone
+from djongo.models import ObjectIdField
+from rest_framework import ISO_8601, serializers
+from rest_framework.serializers import LIST_SERIALIZER_KWARGS
+from rest_framework.settings import api_settings
 from .models import User, Team, Activity, Leaderboard, Workout
+from .passwords import hash_password
+
+
+def format_datetime(value):
+    """Format a datetime exactly as DRF's DateTimeField does with USE_TZ."""
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def represent_document(document, fields):
+    """Render a raw Mongo document the way the model serializers render instances."""
+    row = {}
+    for name in fields:
+        value = document.get(name)
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = format_datetime(value)
+        row[name] = value
+    return row
+
+
+def datetime_representation():
+    """``format_datetime`` with the current time zone looked up once, not per row."""
+    zone = timezone.get_current_timezone()
+    if not isinstance(zone, (ZoneInfo, dt_timezone)):
+        # pytz zones need localize(); leave them to the general path.
+        return lambda value: value if isinstance(value, str) else format_datetime(value) if value else None
+
+    def represent(value):
+        if not value or isinstance(value, str):
+            return value or None
+        if value.utcoffset() is None:
+            value = value.replace(tzinfo=zone)
+        value = value.astimezone(zone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return represent
+
+
+# Field classes whose to_representation reduces to a plain conversion of the
+# attribute. Subclasses are deliberately not matched.
+FAST_REPRESENTATIONS = {
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+}
+
+
+def compile_field(field, represent_datetime):
+    """Return (attribute, convert) reading one field straight off a row.
+
+    ``attribute`` is None when ``convert`` takes the whole row, as DRF's
+    ModelField does.
+    """
+    if isinstance(field, serializers.ModelField):
+        if isinstance(field.model_field, ObjectIdField):
+            attname = field.model_field.attname
+            return None, lambda row: str(getattr(row, attname))
+        return None, field.to_representation
+    if len(field.source_attrs) != 1:
+        return None, None
+    convert = FAST_REPRESENTATIONS.get(type(field))
+    if type(field) is serializers.DateTimeField and settings.USE_TZ and not hasattr(field, 'timezone') \
+            and str(getattr(field, 'format', api_settings.DATETIME_FORMAT)).lower() == ISO_8601:
+        convert = represent_datetime
+    return field.source_attrs[0], convert or field.to_representation
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """Renders many rows with an encoder built once from the child's fields.
+
+    Produces the same data as calling the child per row, without DRF's
+    per-field get_attribute dispatch and OrderedDict allocation.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        encode = self.child.row_encoder()
+        return [encode(item) for item in iterable]
+
 
-class UserSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """Keeps only the fields listed in the ``fields`` context entry, when present.
+
+    ``expandable_fields`` maps a name such as ``team`` to the string id field
+    it resolves and the serializer for the related model. The view resolves
+    the ids for a whole page up front and passes the rendered objects in the
+    ``expanded`` context entry, which are inlined here.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        bounds = {key: kwargs.pop(key, None) for key in ('allow_empty', 'max_length', 'min_length')}
+        list_kwargs = {key: value for key, value in bounds.items() if value is not None}
+        list_kwargs.update({key: value for key, value in kwargs.items() if key in LIST_SERIALIZER_KWARGS})
+        return CompiledListSerializer(*args, child=cls(*args, **kwargs), **list_kwargs)
+
+    def row_encoder(self):
+        """Return a function rendering one row exactly like ``to_representation``."""
+        if type(self).to_representation is not DynamicFieldsModelSerializer.to_representation:
+            return self.to_representation
+        columns = []
+        represent_datetime = datetime_representation()
+        for field in self._readable_fields:
+            attribute, convert = compile_field(field, represent_datetime)
+            if convert is None:
+                return self.to_representation
+            columns.append((field.field_name, attribute, convert))
+        expanded = [
+            (name, self.expandable_fields[name][0], related)
+            for name, related in (self.context.get('expanded') or {}).items()
+        ]
+
+        def encode(row):
+            data = {}
+            for name, attribute, convert in columns:
+                if attribute is None:
+                    data[name] = convert(row)
+                else:
+                    value = getattr(row, attribute)
+                    data[name] = None if value is None else convert(value)
+            for name, source, related in expanded:
+                data[name] = related.get(getattr(row, source))
+            return data
+        return encode
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for name, related in (self.context.get('expanded') or {}).items():
+            source = self.expandable_fields[name][0]
+            data[name] = related.get(getattr(instance, source))
+        return data
+
+class TeamSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = Team
+        fields = ['_id', 'name', 'description', 'created_at']
+
+class UserSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = User
         fields = ['_id', 'email', 'username', 'password', 'team_id', 'created_at']
         extra_kwargs = {'password': {'write_only': True}}
 
-class TeamSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Team
-        fields = ['_id', 'name', 'description', 'created_at']
+    expandable_fields = {'team': ('team_id', TeamSerializer)}
+
+    def validate_password(self, value):
+        return hash_password(value)
 
-class ActivitySerializer(serializers.ModelSerializer):
+class ActivitySerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Activity
         fields = ['_id', 'user_id', 'activity_type', 'duration', 'distance', 'calories_burned', 'date', 'notes']
 
-class LeaderboardSerializer(serializers.ModelSerializer):
+    expandable_fields = {'user': ('user_id', UserSerializer)}
+
+class LeaderboardSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Leaderboard
         fields = ['_id', 'team_id', 'total_points', 'rank', 'updated_at']
 
-class WorkoutSerializer(serializers.ModelSerializer):
+    expandable_fields = {'team': ('team_id', TeamSerializer)}
+
+class WorkoutSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Workout
         fields = ['_id', 'name', 'description', 'difficulty', 'duration', 'category', 'exercises']
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -54,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'octofit_tracker.profiling.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -64,6 +67,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request Mongo profiling: Server-Timing headers and /metrics. /metrics
+# is served to staff users and to scrapers sending this bearer token.
+OCTOFIT_PROFILING = os.environ.get('OCTOFIT_PROFILING', 'true').lower() == 'true'
+OCTOFIT_METRICS_TOKEN = os.environ.get('OCTOFIT_METRICS_TOKEN')
+
 ROOT_URLCONF = 'octofit_tracker.urls'
 
 TEMPLATES = [
@@ -100,6 +108,96 @@ DATABASES = {
     }
 }
 
+# Connection pool for the Motor client behind the async API views (ASGI only)
+OCTOFIT_ASYNC_MONGO_POOL_SIZE = int(os.environ.get('OCTOFIT_ASYNC_MONGO_POOL_SIZE', 200))
+
+
+# Cache
+# LocMemCache evicts least-recently-used entries past MAX_ENTRIES. Set
+# OCTOFIT_REDIS_URL to share the cache between workers; bound Redis with
+# maxmemory and maxmemory-policy allkeys-lru.
+OCTOFIT_REDIS_URL = os.environ.get('OCTOFIT_REDIS_URL')
+if OCTOFIT_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': OCTOFIT_REDIS_URL,
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'octofit',
+            'TIMEOUT': 300,
+            'OPTIONS': {'MAX_ENTRIES': 1000},
+        }
+    }
+
+
+# Per-user rankings are held in memory by each process and re-read from
+# the user_totals collection at most this often.
+OCTOFIT_RANKING_SYNC_SECONDS = float(os.environ.get('OCTOFIT_RANKING_SYNC_SECONDS', 1.0))
+
+# Competition windows for ?window= on /api/leaderboard/: 'Nd' for the last
+# N days or 'month' for the calendar month so far. Points are a linear formula over activity fields,
+# per activity_type with a 'default' fallback.
+OCTOFIT_SCORING_WINDOWS = ('7d', '30d', 'month')
+OCTOFIT_POINT_FORMULAS = {
+    'default': {'calories_burned': 1},
+}
+# Each process picks up activities other workers inserted this often, and
+# rebuilds its window totals to include their edits and deletes at the slower
+# reload interval. Both run in a background thread, never in the request.
+OCTOFIT_SCORING_SYNC_SECONDS = float(os.environ.get('OCTOFIT_SCORING_SYNC_SECONDS', 5.0))
+OCTOFIT_SCORING_RELOAD_SECONDS = int(os.environ.get('OCTOFIT_SCORING_RELOAD_SECONDS', 300))
+
+# 'inline' updates derived data (leaderboard, rollups, rankings, scoring) in
+# the request that wrote the activity. 'changestream' leaves it to the
+# watch_changes command, which also sees writes that bypass the API; it
+# needs a replica set, and OCTOFIT_REDIS_URL so the watcher's cache
+# invalidations, feed versions and leaderboard pushes reach the web
+# workers. Per-process scoring and analytics then catch up on their reload
+# interval.
+OCTOFIT_DERIVED_DATA_MODE = os.environ.get('OCTOFIT_DERIVED_DATA_MODE', 'inline')
+if OCTOFIT_DERIVED_DATA_MODE == 'changestream' and not OCTOFIT_REDIS_URL:
+    raise ImproperlyConfigured("OCTOFIT_DERIVED_DATA_MODE='changestream' requires OCTOFIT_REDIS_URL")
+
+# Answer /api/activities/stats/ from NumPy columns held in each process
+# instead of aggregating in MongoDB. Needs numpy; a background thread
+# appends other workers' inserts this often and reloads the columns at the
+# slower interval to include their edits, deletes and team changes.
+OCTOFIT_ANALYTICS_STORE = os.environ.get('OCTOFIT_ANALYTICS_STORE', 'false').lower() == 'true'
+OCTOFIT_ANALYTICS_SYNC_SECONDS = float(os.environ.get('OCTOFIT_ANALYTICS_SYNC_SECONDS', 5.0))
+OCTOFIT_ANALYTICS_RELOAD_SECONDS = int(os.environ.get('OCTOFIT_ANALYTICS_RELOAD_SECONDS', 600))
+
+# Password hashing for /api/auth/login/ runs on a per-process thread pool.
+# Checks beyond OCTOFIT_PASSWORD_QUEUE in flight are answered with 503.
+OCTOFIT_PASSWORD_WORKERS = int(os.environ.get('OCTOFIT_PASSWORD_WORKERS', os.cpu_count() or 1))
+OCTOFIT_PASSWORD_QUEUE = int(os.environ.get('OCTOFIT_PASSWORD_QUEUE', 64))
+
+# Signed API tokens from /api/auth/login/ are valid for OCTOFIT_TOKEN_MAX_AGE
+# seconds. Each process keeps up to OCTOFIT_TOKEN_CACHE_SIZE verified tokens
+# for OCTOFIT_TOKEN_CACHE_SECONDS, which bounds how long a revocation takes
+# to reach other processes.
+OCTOFIT_TOKEN_MAX_AGE = int(os.environ.get('OCTOFIT_TOKEN_MAX_AGE', 7 * 24 * 3600))
+OCTOFIT_TOKEN_CACHE_SECONDS = float(os.environ.get('OCTOFIT_TOKEN_CACHE_SECONDS', 30))
+OCTOFIT_TOKEN_CACHE_SIZE = int(os.environ.get('OCTOFIT_TOKEN_CACHE_SIZE', 10000))
+
+# Admin changelists for large collections: estimated counts, filter choices
+# cached for OCTOFIT_ADMIN_CHOICES_SECONDS, prefix search and keyset pages.
+OCTOFIT_ADMIN_PERFORMANCE_MODE = os.environ.get('OCTOFIT_ADMIN_PERFORMANCE_MODE', 'false').lower() == 'true'
+OCTOFIT_ADMIN_CHOICES_SECONDS = int(os.environ.get('OCTOFIT_ADMIN_CHOICES_SECONDS', 300))
+
+# Leaderboard push (ASGI only): changes are coalesced to at most one event
+# per OCTOFIT_PUSH_INTERVAL seconds. With OCTOFIT_REDIS_URL set, changes
+# are shared between workers over Redis pub/sub.
+OCTOFIT_PUSH_INTERVAL = float(os.environ.get('OCTOFIT_PUSH_INTERVAL', 1.0))
+OCTOFIT_PUBSUB_BACKEND = (
+    'octofit_tracker.pubsub.RedisBackend' if OCTOFIT_REDIS_URL else 'octofit_tracker.pubsub.LocalBackend'
+)
+
 
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = True
@@ -122,6 +220,22 @@ if codespace_name:
     CSRF_TRUSTED_ORIGINS.append(f'https://{codespace_name}-8000.app.github.dev')
 
 
+# Django REST Framework
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'octofit_tracker.pagination.ObjectIdCursorPagination',
+    'PAGE_SIZE': 100,
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'octofit_tracker.tokens.SignedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'octofit_tracker.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
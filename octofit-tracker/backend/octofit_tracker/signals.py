@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_model
+from .leaderboard import apply_team_moves, leaderboard_change, leaderboard_changed
+from .models import Leaderboard, Team, User, Workout
+from .mongo import get_collection
+from .pubsub import LEADERBOARD_CHANNEL, publish
+from .rankings import remove_user_totals
+
+
+@receiver([post_save, post_delete], sender=Leaderboard)
+@receiver([post_save, post_delete], sender=Team)
+@receiver([post_save, post_delete], sender=Workout)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate_model(sender)
+    if sender is Team:
+        # Leaderboard responses may embed teams through ?expand=team.
+        invalidate_model(Leaderboard)
+
+
+@receiver(leaderboard_changed)
+def push_leaderboard_changes(sender, changes, **kwargs):
+    publish(LEADERBOARD_CHANNEL, changes)
+
+
+@receiver(post_save, sender=Leaderboard)
+def push_saved_leaderboard_row(sender, instance, **kwargs):
+    publish(LEADERBOARD_CHANNEL, [leaderboard_change(vars(instance))])
+
+
+@receiver(post_delete, sender=Leaderboard)
+def push_deleted_leaderboard_row(sender, instance, **kwargs):
+    publish(LEADERBOARD_CHANNEL, [{'team_id': instance.team_id, 'deleted': True}])
+
+
+@receiver(pre_save, sender=User)
+def remember_stored_team(sender, instance, **kwargs):
+    # In changestream mode the watcher sees team moves and deletes instead.
+    if settings.OCTOFIT_DERIVED_DATA_MODE != 'changestream' and instance._id is not None:
+        document = get_collection(User).find_one({'_id': instance._id}, {'team_id': 1})
+        instance._stored_team_id = (document or {}).get('team_id')
+
+
+@receiver(post_save, sender=User)
+def move_points_to_new_team(sender, instance, created, **kwargs):
+    if hasattr(instance, '_stored_team_id'):
+        apply_team_moves({instance._id: (instance._stored_team_id, instance.team_id)})
+        del instance._stored_team_id
+
+
+@receiver(post_delete, sender=User)
+def remove_deleted_user_totals(sender, instance, **kwargs):
+    if settings.OCTOFIT_DERIVED_DATA_MODE != 'changestream':
+        apply_team_moves({instance._id: (instance.team_id, None)})
+        remove_user_totals([instance._id])
@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from .pubsub import LEADERBOARD_CHANNEL, RESYNC, subscribe, unsubscribe
+
+LEADERBOARD_STREAM_PATH = '/api/leaderboard/stream/'
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+STREAM_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+    (b'access-control-allow-origin', b'*'),
+]
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def leaderboard_stream(scope, receive, send):
+    """Server-Sent Events for leaderboard rank and point changes, as a raw ASGI app.
+
+    Clients load /api/leaderboard/ once and then apply ``leaderboard``
+    events, keyed by team_id; a ``resync`` event means updates were dropped
+    and the list should be fetched again. Each idle connection costs one
+    queue and one parked coroutine.
+    """
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405, 'headers': [(b'allow', b'GET')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    subscription = subscribe(LEADERBOARD_CHANNEL)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': STREAM_HEADERS})
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MILLISECONDS}\n\n'.encode(), 'more_body': True})
+        while True:
+            message = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {message, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                message.cancel()
+                break
+            if message in done:
+                data = message.result()
+                body = format_event('resync' if data is RESYNC else 'leaderboard', data)
+            else:
+                message.cancel()
+                # Comment lines keep proxies from closing idle connections.
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        unsubscribe(subscription)
+        disconnected.cancel()
@@ -0,0 +1,137 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .leaderboard import team_ids_for_users
+from .models import Activity, User
+from .mongo import get_collection
+
+DATE_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%G-W%V',
+    'month': '%Y-%m',
+}
+GROUPINGS = ('user', 'team', 'activity_type') + tuple(DATE_FORMATS)
+EMPTY_TOTALS = {'key': None, 'count': 0, 'duration': 0, 'distance': 0, 'calories_burned': 0}
+
+
+def parse_when(name, value):
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: f'Invalid date: {value}'})
+        when = datetime.combine(day, time.min)
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+def validate_grouping(group_by):
+    if group_by is not None and group_by not in GROUPINGS:
+        raise ValidationError({'group_by': f'Expected one of: {", ".join(GROUPINGS)}'})
+
+
+def build_match(query_params, team_users=None):
+    """Build a ``$match`` document from user_id/team_id/activity_type/since/until params.
+
+    ``team_users`` holds the user ids of the ``team_id`` param, looked up by
+    the caller with whichever driver it uses.
+    """
+    match = {}
+    user_id = query_params.get('user_id')
+    if query_params.get('team_id'):
+        team_users = list(team_users or [])
+        if user_id:
+            team_users = [uid for uid in team_users if uid == user_id]
+        match['user_id'] = {'$in': team_users}
+    elif user_id:
+        match['user_id'] = user_id
+    if query_params.get('activity_type'):
+        match['activity_type'] = query_params['activity_type']
+    since, until = query_params.get('since'), query_params.get('until')
+    if since or until:
+        match['date'] = {}
+        if since:
+            match['date']['$gte'] = parse_when('since', since)
+        if until:
+            match['date']['$lt'] = parse_when('until', until)
+    return match
+
+
+def activity_match(query_params):
+    team_users = None
+    if query_params.get('team_id'):
+        team_users = [
+            str(doc['_id'])
+            for doc in get_collection(User).find({'team_id': query_params['team_id']}, {'_id': 1})
+        ]
+    return build_match(query_params, team_users)
+
+
+def stats_pipeline(group_by=None, match=None):
+    """Return the ``$group`` pipeline for one of GROUPINGS, or overall totals for None.
+
+    Team grouping groups by user; ``format_stats`` folds the per-user rows,
+    which are at most one per user, so users are never joined onto activities.
+    """
+    validate_grouping(group_by)
+    if group_by in ('user', 'team'):
+        key = '$user_id'
+    elif group_by == 'activity_type':
+        key = '$activity_type'
+    elif group_by in DATE_FORMATS:
+        key = {'$dateToString': {'format': DATE_FORMATS[group_by], 'date': '$date'}}
+    else:
+        key = None
+
+    pipeline = [{'$match': match}] if match else []
+    pipeline += [
+        {'$group': {
+            '_id': key,
+            'count': {'$sum': 1},
+            'duration': {'$sum': '$duration'},
+            'distance': {'$sum': {'$ifNull': ['$distance', 0]}},
+            'calories_burned': {'$sum': '$calories_burned'},
+        }},
+        {'$sort': {'_id': 1}},
+    ]
+    return pipeline
+
+
+def format_stats(rows, team_of=None):
+    """Shape aggregation rows for the API; ``team_of`` folds user rows into teams."""
+    if team_of is not None:
+        rows = _fold_by_team(rows, team_of)
+    return [
+        {
+            'key': row['_id'],
+            'count': row['count'],
+            'duration': row['duration'],
+            'distance': round(row['distance'], 2),
+            'calories_burned': row['calories_burned'],
+        }
+        for row in rows
+    ]
+
+
+def activity_stats(group_by=None, match=None):
+    """Sum duration, distance and calories per group in a single aggregation."""
+    pipeline = stats_pipeline(group_by, match)
+    rows = list(get_collection(Activity).aggregate(pipeline, allowDiskUse=True))
+    team_of = team_ids_for_users(row['_id'] for row in rows) if group_by == 'team' else None
+    return format_stats(rows, team_of)
+
+
+def _fold_by_team(user_rows, team_of):
+    teams = {}
+    for row in user_rows:
+        team_id = team_of.get(row['_id'])
+        total = teams.setdefault(team_id, {
+            '_id': team_id, 'count': 0, 'duration': 0, 'distance': 0, 'calories_burned': 0,
+        })
+        for field in ('count', 'duration', 'distance', 'calories_burned'):
+            total[field] += row[field]
+    return sorted(teams.values(), key=lambda row: (row['_id'] is None, row['_id'] or ''))
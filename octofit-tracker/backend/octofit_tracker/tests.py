@@ -1,8 +1,46 @@
-from django.test import TestCase
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User as AdminUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from .admin import ActivityAdmin, UserAdmin
+from .analytics import np, store as analytics_store
+from .changelists import KeysetChangeList
+from .changes import ChangeWatcher, load_token
+from . import repositories
+from .indexes import declared_indexes, ensure_indexes
 from .models import User, Team, Activity, Leaderboard, Workout
-from datetime import datetime
+from .mongo import get_collection, to_object_id
+from .renderers import FastJSONRenderer
+from .passwords import reset_pool
+from .profiling import QueryProfilingMiddleware
+from .pubsub import LEADERBOARD_CHANNEL, RESYNC, SUBSCRIBER_QUEUE_SIZE, Hub, RedisBackend, Subscription, reset_broker
+from .rankings import IndexableSkiplist, board, bump_generation, user_totals_collection
+from .rollups import get_rollup_collection, write_deltas
+from .scoring import Window, WindowEngine, board as scoring_board
+from .sse import LEADERBOARD_STREAM_PATH
+from . import tokens
+from .serializers import ActivitySerializer, UserSerializer
+from .views import ActivityViewSet, LeaderboardViewSet, UserViewSet
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
+import asyncio
+import base64
+import csv
+import importlib
+import json
+import os
+import random
+import tempfile
 
 class TeamModelTest(TestCase):
     def setUp(self):
@@ -105,7 +143,7 @@ class TeamAPITest(APITestCase):
         
         response = self.client.get('/api/teams/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
 
 class UserAPITest(APITestCase):
     def setUp(self):
@@ -122,7 +160,7 @@ class UserAPITest(APITestCase):
         
         response = self.client.get('/api/users/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data['results']), 1)
 
 class WorkoutAPITest(APITestCase):
     def test_get_workouts(self):
@@ -138,7 +176,7 @@ class WorkoutAPITest(APITestCase):
         
         response = self.client.get('/api/workouts/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data['results']), 1)
 
 class LeaderboardAPITest(APITestCase):
     def setUp(self):
@@ -154,7 +192,7 @@ class LeaderboardAPITest(APITestCase):
         
         response = self.client.get('/api/leaderboard/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data['results']), 1)
 
 class ActivityAPITest(APITestCase):
     def setUp(self):
@@ -178,4 +216,1567 @@ class ActivityAPITest(APITestCase):
         
         response = self.client.get('/api/activities/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data['results']), 1)
+
+class LeaderboardEngineTest(APITestCase):
+    def setUp(self):
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        self.marvel = Team.objects.create(name='Team Marvel', description='Marvel')
+        self.dc = Team.objects.create(name='Team DC', description='DC')
+        self.ironman = User.objects.create(
+            email='ironman@avengers.com', username='Iron Man', password='stark123',
+            team_id=str(self.marvel._id)
+        )
+        self.batman = User.objects.create(
+            email='batman@wayne.com', username='Batman', password='gotham123',
+            team_id=str(self.dc._id)
+        )
+
+    def post_activity(self, user, calories):
+        return self.client.post('/api/activities/', {
+            'user_id': str(user._id),
+            'activity_type': 'Running',
+            'duration': 30,
+            'calories_burned': calories,
+            'date': '2026-01-01T10:00:00Z',
+        }, format='json')
+
+    def standings(self):
+        return {
+            row.team_id: (row.total_points, row.rank)
+            for row in Leaderboard.objects.all()
+        }
+
+    def test_activity_writes_update_totals_and_ranks(self):
+        """Test that creating, updating and deleting activities re-ranks teams"""
+        self.post_activity(self.ironman, 300)
+        response = self.post_activity(self.batman, 500)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        marvel, dc = str(self.marvel._id), str(self.dc._id)
+        self.assertEqual(self.standings(), {marvel: (300, 2), dc: (500, 1)})
+
+        activity_id = response.data['_id']
+        self.client.patch(f'/api/activities/{activity_id}/', {'calories_burned': 100}, format='json')
+        self.assertEqual(self.standings(), {marvel: (300, 1), dc: (100, 2)})
+
+        self.client.delete(f'/api/activities/{activity_id}/')
+        self.assertEqual(self.standings(), {marvel: (300, 1), dc: (0, 2)})
+
+    def test_team_moves_carry_user_points(self):
+        """Test that changing a user's team_id or deleting them moves their points like the watcher does"""
+        self.post_activity(self.ironman, 300)
+        self.post_activity(self.batman, 500)
+        marvel, dc = str(self.marvel._id), str(self.dc._id)
+
+        response = self.client.patch(f'/api/users/{self.ironman._id}/', {'team_id': dc}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.standings(), {marvel: (0, 2), dc: (800, 1)})
+
+        self.client.patch(f'/api/users/{self.ironman._id}/', {'username': 'Tony'}, format='json')
+        self.assertEqual(self.standings(), {marvel: (0, 2), dc: (800, 1)})
+
+        self.client.delete(f'/api/users/{self.batman._id}/')
+        self.assertEqual(self.standings(), {marvel: (0, 2), dc: (300, 1)})
+
+        incremental = self.standings()
+        Leaderboard.objects.all().delete()
+        call_command('rebuild_leaderboard', stdout=StringIO())
+        self.assertEqual(self.standings(), incremental)
+
+    def test_rebuild_matches_incremental_totals(self):
+        """Test that rebuild_leaderboard reproduces the incremental standings"""
+        self.post_activity(self.ironman, 300)
+        self.post_activity(self.batman, 200)
+        self.post_activity(self.batman, 250)
+        incremental = self.standings()
+
+        Leaderboard.objects.all().delete()
+        call_command('rebuild_leaderboard', stdout=StringIO())
+        self.assertEqual(self.standings(), incremental)
+
+class ActivityStatsAPITest(APITestCase):
+    def setUp(self):
+        for model in (Activity, User, Team):
+            model.objects.all().delete()
+        self.team = Team.objects.create(name='Team Marvel', description='Marvel')
+        self.user = User.objects.create(
+            email='thor@asgard.com', username='Thor', password='mjolnir123',
+            team_id=str(self.team._id)
+        )
+        for day, activity_type, calories, distance in [
+            (1, 'Running', 300, 5.0), (1, 'Yoga', 100, None), (2, 'Running', 200, 3.5),
+        ]:
+            Activity.objects.create(
+                user_id=str(self.user._id), activity_type=activity_type, duration=30,
+                distance=distance, calories_burned=calories, date=datetime(2026, 1, day, 9, tzinfo=timezone.utc)
+            )
+
+    def test_overall_totals(self):
+        """Test that stats returns summed totals"""
+        response = self.client.get('/api/activities/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['calories_burned'], 600)
+        self.assertEqual(response.data['distance'], 8.5)
+
+    def test_grouped_totals(self):
+        """Test that stats can be grouped by type, day and team"""
+        response = self.client.get('/api/activities/stats/activity_type/')
+        by_type = {row['key']: row['calories_burned'] for row in response.data['results']}
+        self.assertEqual(by_type, {'Running': 500, 'Yoga': 100})
+
+        response = self.client.get('/api/activities/stats/day/', {'since': '2026-01-02'})
+        self.assertEqual([row['key'] for row in response.data['results']], ['2026-01-02'])
+
+        response = self.client.get('/api/activities/stats/team/')
+        self.assertEqual(response.data['results'][0]['key'], str(self.team._id))
+        self.assertEqual(response.data['results'][0]['duration'], 90)
+
+    def test_unknown_grouping_is_rejected(self):
+        """Test that an unsupported grouping returns 400"""
+        response = self.client.get('/api/activities/stats/planet/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class PaginationAPITest(APITestCase):
+    def setUp(self):
+        Workout.objects.all().delete()
+        for i in range(5):
+            Workout.objects.create(
+                name=f'Workout {i}', description='Description', difficulty='Easy',
+                duration=30 + i, category='Cardio', exercises=[]
+            )
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        """Test that following next links returns each workout exactly once"""
+        names = []
+        url = '/api/workouts/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            names += [row['name'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(names, [f'Workout {i}' for i in range(5)])
+
+    def test_invalid_object_id_cursor_is_not_found(self):
+        """Test that an _id cursor whose position is not an ObjectId returns 404"""
+        cursor = base64.b64encode(b'p=not-an-id').decode()
+        response = self.client.get('/api/workouts/', {'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_date_cursor_walks_activities_newest_first(self):
+        """Test that following next links on -date ordering returns each activity exactly once"""
+        Activity.objects.all().delete()
+        start = datetime(2024, 1, 1)
+        for i in range(5):
+            Activity.objects.create(
+                user_id='user', activity_type=f'Activity {i}', duration=30,
+                calories_burned=100, date=start + timedelta(days=i)
+            )
+        types = []
+        url = '/api/activities/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            types += [row['activity_type'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(types, [f'Activity {i}' for i in reversed(range(5))])
+
+    def test_fields_projection(self):
+        """Test that ?fields= limits the serialized columns"""
+        response = self.client.get('/api/workouts/', {'fields': 'name,duration'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'name', 'duration'})
+
+        response = self.client.get('/api/workouts/', {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class IndexTest(TestCase):
+    def test_migrations_build_declared_indexes(self):
+        """Test that every Meta.indexes entry exists in MongoDB with matching keys"""
+        for model in (User, Activity, Leaderboard):
+            existing = get_collection(model).index_information()
+            for name, keys in declared_indexes(model).items():
+                self.assertEqual(existing[name]['key'], keys)
+
+    def test_ensure_indexes_recreates_missing(self):
+        """Test that ensure_indexes rebuilds a dropped index"""
+        get_collection(Activity).drop_index('activities_user_date_id_idx')
+        self.assertEqual(ensure_indexes(Activity), ['activities_user_date_id_idx'])
+        self.assertEqual(
+            get_collection(Activity).index_information()['activities_user_date_id_idx']['key'],
+            [('user_id', 1), ('date', -1), ('_id', -1)]
+        )
+
+class BulkActivityAPITest(APITestCase):
+    def setUp(self):
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        self.team = Team.objects.create(name='Team DC', description='DC')
+        self.user = User.objects.create(
+            email='flash@central.com', username='Flash', password='speedforce123',
+            team_id=str(self.team._id)
+        )
+
+    def activity(self, key, calories=100):
+        return {
+            'user_id': str(self.user._id), 'activity_type': 'Running', 'duration': 20,
+            'calories_burned': calories, 'date': '2026-01-01T07:00:00Z', 'idempotency_key': key,
+        }
+
+    def test_bulk_create_dedupes_and_reports_per_item(self):
+        """Test that bulk sync inserts valid rows once and reports each item"""
+        items = [self.activity('a'), self.activity('b', 200), self.activity('a'), {'user_id': 'x'}]
+        response = self.client.post('/api/activities/bulk/', items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'created', 'duplicate', 'invalid'])
+        self.assertEqual(response.data['results'][2]['_id'], response.data['results'][0]['_id'])
+        self.assertEqual(Activity.objects.count(), 2)
+        self.assertEqual(Leaderboard.objects.get(team_id=str(self.team._id)).total_points, 300)
+
+        response = self.client.post('/api/activities/bulk/', [self.activity('b', 200)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['duplicate'], 1)
+        self.assertEqual(Activity.objects.count(), 2)
+
+    def test_bulk_create_accepts_ndjson(self):
+        """Test that bulk sync parses newline-delimited JSON"""
+        body = '\n'.join(json.dumps(self.activity(key)) for key in ('n1', 'n2')) + '\n'
+        response = self.client.post('/api/activities/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+
+class PopulateDbCommandTest(TestCase):
+    def test_hero_dataset(self):
+        """Test that populate_db loads the hero dataset by default"""
+        call_command('populate_db', stdout=StringIO())
+        self.assertEqual(Team.objects.count(), 2)
+        self.assertEqual(User.objects.count(), 12)
+        self.assertEqual(Activity.objects.count(), 120)
+        self.assertEqual(Workout.objects.count(), 6)
+        self.assertEqual(sorted(row.rank for row in Leaderboard.objects.all()), [1, 2])
+        self.assertTrue(User.objects.get(email='thor@asgard.com').check_password('mjolnir123'))
+
+    def test_synthetic_dataset_is_deterministic(self):
+        """Test that synthetic generation is sized by options and reproducible by seed and end date"""
+        options = {'users': 20, 'teams': 3, 'activities_per_user': 5, 'batch_size': 7, 'seed': 7,
+                   'end_date': date(2026, 3, 1)}
+
+        def dataset():
+            return [
+                # Password hashes are salted per run.
+                sorted(get_collection(model).find({}, {'password': 0}), key=lambda document: document['_id'])
+                for model in (Team, User, Activity)
+            ]
+
+        call_command('populate_db', stdout=StringIO(), **options)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Activity.objects.count(), 100)
+        first = dataset()
+        self.assertTrue(all(activity['date'] < datetime(2026, 3, 1) for activity in first[2]))
+
+        call_command('populate_db', stdout=StringIO(), **dict(options, batch_size=50))
+        self.assertEqual(dataset(), first)
+
+class CachedResponseAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        Leaderboard.objects.all().delete()
+        self.team = Team.objects.create(name='Team Marvel', description='Marvel')
+        Leaderboard.objects.create(team_id=str(self.team._id), total_points=100, rank=1)
+
+    def test_etag_and_not_modified(self):
+        """Test that cached list responses carry an ETag and honour If-None-Match"""
+        response = self.client.get('/api/leaderboard/')
+        etag = response['ETag']
+        response = self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_links_follow_the_requested_host(self):
+        """Test that a page cached for one host or scheme is not served with its links to another"""
+        Leaderboard.objects.create(team_id='other', total_points=50, rank=2)
+        links = [
+            self.client.get('/api/leaderboard/', {'page_size': 1}, **headers).data['next']
+            for headers in ({}, {'HTTP_HOST': 'octofit.app.github.dev'}, {'secure': True})
+        ]
+        self.assertTrue(links[0].startswith('http://testserver/'))
+        self.assertTrue(links[1].startswith('http://octofit.app.github.dev/'))
+        self.assertTrue(links[2].startswith('https://testserver/'))
+
+    def test_signal_invalidation(self):
+        """Test that saving a model drops its cached responses"""
+        first = self.client.get('/api/leaderboard/')
+        row = Leaderboard.objects.get(team_id=str(self.team._id))
+        row.total_points = 900
+        row.save()
+        response = self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['total_points'], 900)
+
+    def test_leaderboard_engine_invalidation(self):
+        """Test that leaderboard updates written through pymongo drop cached responses"""
+        user = User.objects.create(
+            email='hulk@gamma.com', username='Hulk', password='smash123', team_id=str(self.team._id)
+        )
+        self.client.get('/api/leaderboard/')
+        self.client.post('/api/activities/', {
+            'user_id': str(user._id), 'activity_type': 'Boxing', 'duration': 30,
+            'calories_burned': 50, 'date': '2026-01-01T10:00:00Z',
+        }, format='json')
+        response = self.client.get('/api/leaderboard/')
+        self.assertEqual(response.data['results'][0]['total_points'], 150)
+
+class ExpandAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for model in (Activity, User, Team):
+            model.objects.all().delete()
+        self.team = Team.objects.create(name='Team DC', description='DC')
+        self.users = [
+            User.objects.create(
+                email=f'hero{i}@dc.com', username=f'Hero {i}', password='secret',
+                team_id=str(self.team._id)
+            )
+            for i in range(3)
+        ]
+        for user in self.users:
+            Activity.objects.create(
+                user_id=str(user._id), activity_type='Running', duration=10,
+                calories_burned=80, date=datetime(2026, 1, 1, tzinfo=timezone.utc)
+            )
+
+    def test_expand_team_on_users(self):
+        """Test that ?expand=team inlines the team with one batched lookup"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/', {'expand': 'team'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for row in response.data['results']:
+            self.assertEqual(row['team']['name'], 'Team DC')
+        # The page comes from the repository; one ORM query for the teams, whatever the page size.
+        self.assertEqual(len(queries), 1)
+
+    def test_expand_user_on_activities_with_fields(self):
+        """Test that expansion still resolves when ?fields= omits the id column"""
+        response = self.client.get('/api/activities/', {'expand': 'user', 'fields': 'calories_burned'})
+        usernames = {row['user']['username'] for row in response.data['results']}
+        self.assertEqual(usernames, {'Hero 0', 'Hero 1', 'Hero 2'})
+        self.assertNotIn('password', response.data['results'][0]['user'])
+
+    def test_unknown_expansion_is_rejected(self):
+        """Test that expanding an unknown relation returns 400"""
+        response = self.client.get('/api/workouts/', {'expand': 'team'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class AsyncAPITest(APITestCase):
+    def setUp(self):
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        self.team = Team.objects.create(name='Team Marvel', description='Marvel')
+        self.user = User.objects.create(
+            email='spiderman@daily.com', username='Spider-Man', password='parker123',
+            team_id=str(self.team._id)
+        )
+        for day in range(1, 6):
+            Activity.objects.create(
+                user_id=str(self.user._id), activity_type='Running', duration=10 * day,
+                distance=1.5, calories_burned=50 * day, date=datetime(2026, 1, day, 8, tzinfo=timezone.utc)
+            )
+
+    def test_async_activity_list_matches_sync_serializer(self):
+        """Test that async pages are newest first and rendered like ActivitySerializer"""
+        results = []
+        url = '/api/async/activities/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results += response.json()['results']
+            url = response.json()['next']
+        expected = self.client.get('/api/activities/').json()['results']
+        self.assertEqual(results, expected)
+
+    def test_async_stats_match_sync_stats(self):
+        """Test that async stats return the same totals as the sync endpoints"""
+        for path in ('stats/', 'stats/day/', 'stats/team/'):
+            sync = self.client.get(f'/api/activities/{path}').json()
+            self.assertEqual(self.client.get(f'/api/async/activities/{path}').json(), sync)
+
+    def test_sync_api_routes_without_motor(self):
+        """Test that the URLConf still loads the sync API when the Motor views cannot be imported"""
+        import octofit_tracker
+        import octofit_tracker.urls as urls
+        self.addCleanup(importlib.reload, urls)
+        self.addCleanup(setattr, octofit_tracker, 'async_views', octofit_tracker.async_views)
+        del octofit_tracker.async_views
+        with mock.patch.dict('sys.modules', {'octofit_tracker.async_views': None}):
+            importlib.reload(urls)
+        routes = [str(pattern.pattern) for pattern in urls.urlpatterns]
+        self.assertIn('api/', routes)
+        self.assertIn('api/auth/login/', routes)
+        self.assertFalse([route for route in routes if route.startswith('api/async/')])
+
+class ProfilingMiddlewareTest(APITestCase):
+    def test_server_timing_and_metrics(self):
+        """Test that API responses carry Server-Timing and feed /metrics"""
+        response = self.client.get('/api/activities/')
+        timings = [part.split(';')[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(timings, ['djongo', 'mongo', 'render', 'app', 'total'])
+
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        AdminUser.objects.filter(username='metrics').delete()
+        self.client.force_login(AdminUser.objects.create_user('metrics', password='secret', is_staff=True))
+        metrics = self.client.get('/metrics').content.decode()
+        self.assertIn('octofit_request_duration_seconds_count{view="ActivityViewSet.list"}', metrics)
+        self.assertIn('octofit_response_bytes_bucket{view="ActivityViewSet.list",le="+Inf"}', metrics)
+        self.client.logout()
+        with override_settings(OCTOFIT_METRICS_TOKEN='scrape'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_async_stack_stays_async(self):
+        """Test that the middleware runs natively under ASGI instead of forcing a thread hop"""
+        async def get_response(request):
+            return HttpResponse('ok')
+
+        middleware = QueryProfilingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get('/api/async/activities/')))
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+class RepositoryAPITest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        team = Team.objects.create(name='Team Marvel', description='Marvel')
+        user = User.objects.create(
+            email='ironman@stark.com', username='Iron Man', password='jarvis',
+            team_id=str(team._id)
+        )
+        for day in range(1, 6):
+            self.client.post('/api/activities/', {
+                'user_id': str(user._id), 'activity_type': 'Cycling', 'duration': 20 * day,
+                'distance': 3.5 * day, 'calories_burned': 40 * day,
+                'date': f'2026-02-0{day}T09:30:00Z', 'notes': f'Ride {day}'
+            }, format='json')
+        self.ids = {
+            'users': str(user._id),
+            'activities': str(Activity.objects.first()._id),
+            'leaderboard': str(Leaderboard.objects.first()._id),
+        }
+
+    def fetch_all(self, url):
+        pages = []
+        while url:
+            cache.clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.content)
+            url = response.data['next']
+        return pages
+
+    def test_repository_reads_match_orm_reads(self):
+        """Test that list pages, projections and detail views are byte-identical to the ORM path"""
+        viewsets = {'users': UserViewSet, 'activities': ActivityViewSet, 'leaderboard': LeaderboardViewSet}
+        for prefix, viewset in viewsets.items():
+            urls = [
+                f'/api/{prefix}/?page_size=2',
+                f'/api/{prefix}/?page_size=2&fields={viewset.serializer_class.Meta.fields[1]}',
+            ]
+            detail = f'/api/{prefix}/{self.ids[prefix]}/'
+            fast = [self.fetch_all(url) for url in urls] + [self.client.get(detail).content]
+            with mock.patch.object(viewset, 'repository', None):
+                slow = [self.fetch_all(url) for url in urls] + [self.client.get(detail).content]
+            self.assertEqual(fast, slow, prefix)
+
+    def test_repository_detail_missing_returns_404(self):
+        """Test that an unknown id on a repository-backed route returns 404"""
+        response = self.client.get('/api/activities/0123456789abcdef01234567/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_repository_list_skips_djongo(self):
+        """Test that repository-backed list pages issue no djongo SQL"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/activities/')
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(len(queries), 0)
+
+class RollupHistoryAPITest(APITestCase):
+    def setUp(self):
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        for period in ('day', 'week'):
+            get_rollup_collection(period).delete_many({})
+        self.team = Team.objects.create(name='Team DC', description='DC')
+        self.user = User.objects.create(
+            email='flash@dc.com', username='Flash', password='speed',
+            team_id=str(self.team._id)
+        )
+        # Monday and Tuesday of one ISO week, then the following Monday.
+        for day, calories in ((5, 100), (6, 50), (6, 25), (12, 10)):
+            self.client.post('/api/activities/', {
+                'user_id': str(self.user._id), 'activity_type': 'Running', 'duration': 10,
+                'distance': 2.5, 'calories_burned': calories, 'date': f'2026-01-{day:02d}T18:00:00Z'
+            }, format='json')
+
+    def history(self, prefix, object_id, **params):
+        params.setdefault('since', '2026-01-01')
+        response = self.client.get(f'/api/{prefix}/{object_id}/history/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(row['key'], row['count'], row['calories_burned']) for row in response.data['results']]
+
+    def test_history_is_maintained_on_writes(self):
+        """Test that daily and weekly buckets follow creates, updates and deletes"""
+        self.assertEqual(
+            self.history('users', self.user._id),
+            [('2026-01-05', 1, 100), ('2026-01-06', 2, 75), ('2026-01-12', 1, 10)]
+        )
+        self.assertEqual(
+            self.history('teams', self.team._id, period='week'),
+            [('2026-W02', 3, 175), ('2026-W03', 1, 10)]
+        )
+
+        activity = Activity.objects.get(calories_burned=10)
+        self.client.patch(f'/api/activities/{activity._id}/', {'date': '2026-01-06T07:00:00Z'}, format='json')
+        self.client.delete(f'/api/activities/{Activity.objects.get(calories_burned=100)._id}/')
+        self.assertEqual(self.history('users', self.user._id), [('2026-01-06', 3, 85)])
+        self.assertEqual(self.history('teams', self.team._id, period='week'), [('2026-W02', 3, 85)])
+
+    def test_history_reads_only_rollups(self):
+        """Test that history endpoints issue no djongo queries and honour since/until"""
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.history('users', self.user._id, since='2026-01-06', until='2026-01-12')
+        self.assertEqual(rows, [('2026-01-06', 2, 75)])
+        self.assertEqual(len(queries), 0)
+
+        response = self.client.get(f'/api/users/{self.user._id}/history/', {'period': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_backfill_matches_incremental(self):
+        """Test that backfill_rollups rebuilds the same buckets from activities and swaps them in at the end"""
+        incremental = {
+            period: sorted(get_rollup_collection(period).find({}, {'_id': 0}), key=str)
+            for period in ('day', 'week')
+        }
+        stale = {'scope': 'user', 'owner_id': 'gone', 'period': datetime(2025, 1, 6), 'count': 1}
+        for period in ('day', 'week'):
+            get_rollup_collection(period).insert_one(dict(stale))
+        live_counts = []
+
+        def counting_write(*args, **kwargs):
+            live_counts.append(get_rollup_collection('day').count_documents({}))
+            return write_deltas(*args, **kwargs)
+
+        with mock.patch('octofit_tracker.rollups.write_deltas', counting_write):
+            call_command('backfill_rollups', batch_size=2, stdout=StringIO())
+        self.assertEqual(set(live_counts), {len(incremental['day']) + 1})
+        for period in ('day', 'week'):
+            rebuilt = sorted(get_rollup_collection(period).find({}, {'_id': 0}), key=str)
+            self.assertEqual(rebuilt, incremental[period])
+
+    def test_backfill_keeps_activities_logged_during_the_run(self):
+        """Test that activities inserted while backfill_rollups scans are counted once after the swap"""
+        logged = []
+
+        def log_during_scan(*args, **kwargs):
+            if not logged:
+                logged.append(True)
+                # One behind the date-ordered scan cursor, one ahead of it.
+                for day, calories in ((5, 7), (20, 3)):
+                    self.client.post('/api/activities/', {
+                        'user_id': str(self.user._id), 'activity_type': 'Running', 'duration': 10,
+                        'distance': 1.0, 'calories_burned': calories, 'date': f'2026-01-{day:02d}T06:00:00Z'
+                    }, format='json')
+            return write_deltas(*args, **kwargs)
+
+        with mock.patch('octofit_tracker.rollups.write_deltas', log_during_scan):
+            call_command('backfill_rollups', batch_size=2, stdout=StringIO())
+        self.assertEqual(Activity.objects.count(), 6)
+        self.assertEqual(
+            self.history('users', self.user._id),
+            [('2026-01-05', 2, 107), ('2026-01-06', 2, 75), ('2026-01-12', 1, 10), ('2026-01-20', 1, 3)]
+        )
+
+class ExportAPITest(APITestCase):
+    def setUp(self):
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        self.users = [
+            User.objects.create(email=f'runner{i}@octofit.com', username=f'Runner {i}', password='secret')
+            for i in range(2)
+        ]
+        for day in range(1, 4):
+            for user in self.users:
+                Activity.objects.create(
+                    user_id=str(user._id), activity_type='Running', duration=10 * day,
+                    distance=1.25 * day, calories_burned=30 * day,
+                    date=datetime(2026, 3, day, 6, tzinfo=timezone.utc)
+                )
+
+    def test_ndjson_export_matches_api_rows(self):
+        """Test that NDJSON export streams the list API rows oldest first"""
+        response = self.client.get('/api/activities/export/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        exported = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        listed = self.client.get('/api/activities/').json()['results']
+        self.assertEqual(sorted(exported, key=lambda row: row['_id']), sorted(listed, key=lambda row: row['_id']))
+        dates = [row['date'] for row in exported]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_csv_export_with_filters(self):
+        """Test that CSV export writes a header and honours user and date filters"""
+        user_id = str(self.users[0]._id)
+        response = self.client.get('/api/activities/export/', {
+            'output': 'csv', 'user_id': user_id, 'since': '2026-03-02',
+        })
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row['calories_burned'] for row in rows], ['60', '90'])
+        self.assertEqual({row['user_id'] for row in rows}, {user_id})
+
+        response = self.client.get('/api/activities/export/', {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_command(self):
+        """Test that export_activities writes the same NDJSON as the endpoint"""
+        out = StringIO()
+        call_command('export_activities', stdout=out, batch_size=2)
+        endpoint = b''.join(self.client.get('/api/activities/export/').streaming_content).decode()
+        self.assertEqual(out.getvalue(), endpoint)
+
+class LeaderboardStreamTest(APITestCase):
+    def setUp(self):
+        reset_broker()
+        self.addCleanup(reset_broker)
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        self.teams = [Team.objects.create(name=f'Team {i}', description='Team') for i in range(2)]
+        self.users = [
+            User.objects.create(
+                email=f'athlete{i}@octofit.com', username=f'Athlete {i}', password='secret',
+                team_id=str(team._id)
+            )
+            for i, team in enumerate(self.teams)
+        ]
+
+    def log_burst(self):
+        for calories in (100, 20, 30):
+            for user in self.users:
+                self.client.post('/api/activities/', {
+                    'user_id': str(user._id), 'activity_type': 'Rowing', 'duration': 10,
+                    'calories_burned': calories if user is self.users[0] else calories * 2,
+                    'date': '2026-04-01T08:00:00Z'
+                }, format='json')
+
+    async def stream(self, during):
+        from .asgi import application
+
+        sent = []
+        closed = asyncio.Event()
+
+        async def receive():
+            await closed.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': LEADERBOARD_STREAM_PATH, 'headers': []}
+        task = asyncio.ensure_future(application(scope, receive, send))
+        await asyncio.sleep(0.01)
+        await asyncio.get_running_loop().run_in_executor(None, during)
+        await asyncio.sleep(0.3)
+        closed.set()
+        await task
+        return sent
+
+    @override_settings(OCTOFIT_PUSH_INTERVAL=0.1)
+    def test_burst_is_pushed_as_one_event(self):
+        """Test that a burst of activity writes reaches stream clients as one coalesced event"""
+        sent = asyncio.run(self.stream(self.log_burst))
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        events = [message['body'].decode() for message in sent[2:]]
+        self.assertEqual(len(events), 1)
+        event, data = events[0].strip().split('\n')
+        self.assertEqual(event, 'event: leaderboard')
+        changes = sorted(json.loads(data[len('data: '):])['changes'], key=lambda row: row['rank'])
+        self.assertEqual(changes, [
+            {'team_id': str(self.teams[1]._id), 'total_points': 300, 'rank': 1},
+            {'team_id': str(self.teams[0]._id), 'total_points': 150, 'rank': 2},
+        ])
+
+    def test_slow_subscriber_gets_resync(self):
+        """Test that an overflowing subscriber queue collapses into one resync message"""
+        async def overflow():
+            subscription = Subscription(LEADERBOARD_CHANNEL, asyncio.get_running_loop())
+            for n in range(SUBSCRIBER_QUEUE_SIZE + 1):
+                subscription.deliver({'changes': [n]})
+            return [await subscription.get() for _ in range(subscription.queue.qsize())]
+        self.assertEqual(asyncio.run(overflow()), [RESYNC])
+
+    def test_redis_listener_reconnects_and_resyncs(self):
+        """Test that a dropped Redis connection is retried and local subscribers are told to resync"""
+        class Stop(BaseException):
+            pass
+
+        def connection(*payloads, subscribe_error=None):
+            def listen():
+                for payload in payloads:
+                    data = json.dumps({'key': 'team_id', 'changes': [payload]})
+                    yield {'channel': b'octofit:pubsub:leaderboard', 'data': data}
+                raise ConnectionError('connection reset')
+            pubsub = mock.Mock()
+            pubsub.psubscribe.side_effect = subscribe_error
+            pubsub.listen.side_effect = listen
+            return pubsub
+
+        backend = RedisBackend.__new__(RedisBackend)
+        backend.hub = mock.Mock()
+        backend.client = mock.Mock()
+        backend.client.pubsub.side_effect = [connection('a'), connection(subscribe_error=ConnectionError), connection('b')]
+        with mock.patch('octofit_tracker.pubsub.time.sleep', side_effect=[None, None, Stop]) as sleep, \
+                self.assertLogs('octofit_tracker.pubsub', 'WARNING') as logs, self.assertRaises(Stop):
+            backend._listen()
+        self.assertEqual(len(logs.records), 3)
+        self.assertEqual(
+            [call.args for call in backend.hub.receive.call_args_list],
+            [('leaderboard', ['a'], 'team_id'), ('leaderboard', ['b'], 'team_id')]
+        )
+        self.assertEqual(backend.hub.resync.call_count, 1)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0, 0.5])
+
+    def test_hub_resync_reaches_every_subscriber(self):
+        """Test that a hub resync sends RESYNC to subscribers of every channel"""
+        async def resync():
+            hub = Hub(interval=60)
+            subscriptions = [hub.subscribe(LEADERBOARD_CHANNEL), hub.subscribe('other')]
+            hub.resync()
+            return [await asyncio.wait_for(subscription.get(), 1) for subscription in subscriptions]
+        self.assertEqual(asyncio.run(resync()), [RESYNC, RESYNC])
+
+class ImportActivitiesCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        get_collection(Activity).database['import_checkpoints'].delete_many({})
+        self.team = Team.objects.create(name='Team Import', description='Import')
+        self.user = User.objects.create(
+            email='Storm@Xmen.com', username='Storm', password='weather',
+            team_id=str(self.team._id)
+        )
+
+    def write_file(self, suffix, text):
+        handle = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        handle.write(text)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def test_csv_import_resolves_emails_and_is_idempotent(self):
+        """Test that CSV rows resolve users by email, report bad rows and re-run without duplicates"""
+        path = self.write_file('.csv', (
+            'email,activity_type,duration,distance,calories_burned,date,notes\n'
+            'storm@xmen.com,Running,30,5.5,300,2026-05-01T07:00:00Z,Morning run\n'
+            'STORM@xmen.com,Swimming,45,,400,2026-05-02T07:00:00Z,\n'
+            'nobody@xmen.com,Running,30,5,300,2026-05-03T07:00:00Z,\n'
+            'storm@xmen.com,Running,thirty,5,300,2026-05-04T07:00:00Z,\n'
+        ))
+        out = StringIO()
+        call_command('import_activities', path, chunk_size=3, stdout=out)
+        self.assertIn('Imported 2 activities from 4 rows', out.getvalue())
+        self.assertIn('2 invalid', out.getvalue())
+        self.assertEqual(
+            sorted(Activity.objects.values_list('calories_burned', flat=True)), [300, 400]
+        )
+        self.assertEqual(Activity.objects.get(activity_type='Swimming').distance, None)
+        self.assertEqual(Leaderboard.objects.get(team_id=str(self.team._id)).total_points, 700)
+
+        out = StringIO()
+        call_command('import_activities', path, chunk_size=3, stdout=out)
+        self.assertIn('Imported 0 activities from 4 rows', out.getvalue())
+        self.assertEqual(Activity.objects.count(), 2)
+
+        # Same name and size, different rows: not mistaken for a re-run.
+        with open(path, 'w') as handle:
+            handle.write(
+                'email,activity_type,duration,distance,calories_burned,date,notes\n'
+                'storm@xmen.com,Running,31,5.5,301,2026-06-01T07:00:00Z,Evening run\n'
+                'STORM@xmen.com,Swimming,46,,401,2026-06-02T07:00:00Z,\n'
+                'nobody@xmen.com,Running,30,5,300,2026-05-03T07:00:00Z,\n'
+                'storm@xmen.com,Running,thirty,5,300,2026-05-04T07:00:00Z,\n'
+            )
+        out = StringIO()
+        call_command('import_activities', path, chunk_size=3, stdout=out)
+        self.assertIn('Imported 2 activities from 4 rows', out.getvalue())
+        self.assertEqual(Activity.objects.count(), 4)
+
+    def test_ndjson_import_resumes_from_checkpoint(self):
+        """Test that --resume skips the rows recorded by the previous run"""
+        lines = [
+            json.dumps({
+                'user_id': str(self.user._id), 'activity_type': 'Cycling', 'duration': 10 + i,
+                'calories_burned': 10, 'date': f'2026-05-{i + 1:02d}T07:00:00Z'
+            })
+            for i in range(5)
+        ]
+        path = self.write_file('.ndjson', '\n'.join(lines[:3] + ['{not json'] + lines[3:]) + '\n')
+        errors = self.write_file('.ndjson', '')
+        call_command('import_activities', path, job='resume-test', chunk_size=2, errors=errors, stdout=StringIO())
+        self.assertEqual(Activity.objects.count(), 5)
+        with open(errors) as handle:
+            self.assertEqual([json.loads(line)['row'] for line in handle], [4])
+
+        out = StringIO()
+        call_command('import_activities', path, job='resume-test', resume=True, stdout=out)
+        self.assertIn('Resuming resume-test after row 6', out.getvalue())
+        self.assertIn('from 0 rows', out.getvalue())
+
+class UserRankingAPITest(APITestCase):
+    def setUp(self):
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        user_totals_collection().delete_many({})
+        board.reset()
+        self.users = [
+            User.objects.create(email=f'ranked{i}@octofit.com', username=f'Ranked {i}', password='secret')
+            for i in range(4)
+        ]
+        for user, calories in zip(self.users, (300, 500, 300, 0)):
+            if calories:
+                self.log(user, calories)
+
+    def log(self, user, calories):
+        return self.client.post('/api/activities/', {
+            'user_id': str(user._id), 'activity_type': 'Running', 'duration': calories // 10,
+            'distance': calories / 100, 'calories_burned': calories, 'date': '2026-06-01T07:00:00Z'
+        }, format='json')
+
+    def test_skiplist_matches_sorted_list(self):
+        """Test that the indexable skiplist agrees with a sorted list under random inserts and removes"""
+        rng = random.Random(3)
+        skiplist, expected = IndexableSkiplist(expected_size=64), []
+        for _ in range(2000):
+            key = (rng.randrange(50), rng.randrange(10))
+            if key in expected:
+                skiplist.remove(key)
+                expected.remove(key)
+            else:
+                skiplist.insert(key)
+                expected.append(key)
+                expected.sort()
+        self.assertEqual(len(skiplist), len(expected))
+        self.assertEqual(list(skiplist.islice(0, len(expected))), expected)
+        self.assertEqual(list(skiplist.islice(5, 12)), expected[5:12])
+        for probe in [(10, 0), (25, 5), (49, 9)]:
+            self.assertEqual(skiplist.bisect_left(probe), sum(1 for key in expected if key < probe))
+
+    def test_rankings_with_ties_and_updates(self):
+        """Test that top users share ranks on ties and follow activity writes"""
+        response = self.client.get('/api/users/rankings/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['rank'], row['score']) for row in response.data['results']],
+            [(1, 500), (2, 300), (2, 300)]
+        )
+        self.assertEqual(response.data['results'][0]['user_id'], str(self.users[1]._id))
+
+        activity_id = self.log(self.users[3], 600).data['_id']
+        response = self.client.get(f'/api/users/{self.users[3]._id}/rank/')
+        self.assertEqual((response.data['rank'], response.data['score']), (1, 600))
+
+        self.client.delete(f'/api/activities/{activity_id}/')
+        response = self.client.get(f'/api/users/{self.users[3]._id}/rank/')
+        self.assertEqual((response.data['rank'], response.data['score']), (4, 0))
+
+        response = self.client.get('/api/users/rankings/', {'metric': 'distance', 'offset': 1, 'limit': 1})
+        self.assertEqual([(row['rank'], row['score']) for row in response.data['results']], [(2, 3.0)])
+        self.assertEqual(self.client.get('/api/users/rankings/', {'metric': 'weight'}).status_code, 400)
+
+    def test_rebuild_rankings_matches_incremental(self):
+        """Test that rebuild_rankings recomputes the totals the write path maintained"""
+        incremental = self.client.get('/api/users/rankings/').data['results']
+        user_totals_collection().delete_many({})
+        call_command('rebuild_rankings', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/users/rankings/').data['results'], incremental)
+
+    @override_settings(OCTOFIT_RANKING_SYNC_SECONDS=0)
+    def test_migration_builds_totals_on_its_own_connection(self):
+        """Test that the user_totals migration rebuilds totals and loaded boards pick them up"""
+        incremental = self.client.get('/api/users/rankings/').data['results']
+        user_totals_collection().insert_one({'_id': 'gone', 'calories_burned': 900, 'updated_at': datetime.now(timezone.utc)})
+        bump_generation()
+        self.assertEqual(self.client.get('/api/users/rankings/').data['results'][0]['user_id'], 'gone')
+        migration = importlib.import_module('octofit_tracker.migrations.0006_user_totals')
+        migration.build_user_totals(None, connection.schema_editor())
+        self.assertIsNone(user_totals_collection().find_one({'_id': 'gone'}))
+        self.assertEqual(self.client.get('/api/users/rankings/').data['results'], incremental)
+
+    @override_settings(OCTOFIT_RANKING_SYNC_SECONDS=0)
+    def test_removed_totals_leave_other_processes_rankings(self):
+        """Test that totals removed elsewhere and deleted users drop out of a loaded board"""
+        self.assertEqual(self.client.get('/api/users/rankings/').data['count'], 3)
+        # What another process's rebuild does, without resetting this board.
+        user_totals_collection().delete_many({'_id': str(self.users[0]._id)})
+        bump_generation()
+        ranked = [row['user_id'] for row in self.client.get('/api/users/rankings/').data['results']]
+        self.assertEqual(ranked, [str(self.users[1]._id), str(self.users[2]._id)])
+
+        self.assertEqual(self.client.delete(f'/api/users/{self.users[1]._id}/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNone(user_totals_collection().find_one({'_id': str(self.users[1]._id)}))
+        ranked = [row['user_id'] for row in self.client.get('/api/users/rankings/').data['results']]
+        self.assertEqual(ranked, [str(self.users[2]._id)])
+
+class ScoringEngineTest(APITestCase):
+    def setUp(self):
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        scoring_board.reset()
+        self.addCleanup(scoring_board.reset)
+        self.team = Team.objects.create(name='Team Windows', description='Windows')
+        self.users = [
+            User.objects.create(
+                email=f'window{i}@octofit.com', username=f'Window {i}', password='secret',
+                team_id=str(self.team._id)
+            )
+            for i in range(2)
+        ]
+
+    def log(self, user, days_ago, **fields):
+        when = datetime.now(timezone.utc) - timedelta(days=days_ago)
+        return self.client.post('/api/activities/', dict({
+            'user_id': str(user._id), 'activity_type': 'Running', 'duration': 30,
+            'distance': 5.0, 'calories_burned': 100, 'date': when.isoformat()
+        }, **fields), format='json')
+
+    def test_ring_drops_expired_days(self):
+        """Test that advancing a day subtracts exactly the bucket that left each window"""
+        today = date(2026, 3, 2).toordinal()
+        engine = WindowEngine([Window('3d'), Window('month')], today)
+        engine.add('a', today - 3, 50)   # Feb 27: outside both windows
+        engine.add('a', today - 2, 10)   # Feb 28: in 3d only
+        engine.add('a', today, 5)
+        engine.add('b', today - 1, 7)    # Mar 1
+        self.assertEqual(engine.rankings['3d'].scores, {'a': 15, 'b': 7})
+        self.assertEqual(engine.rankings['month'].scores, {'a': 5, 'b': 7})
+
+        engine.advance(today + 2)
+        self.assertEqual(engine.rankings['3d'].scores, {'a': 5})
+        self.assertEqual(engine.rankings['month'].scores, {'a': 5, 'b': 7})
+        engine.add('b', today + 2, 3)
+        engine.advance(today + 40)
+        self.assertEqual(engine.rankings['3d'].scores, {})
+        self.assertEqual(engine.rankings['month'].scores, {})
+        self.assertTrue(all(not bucket for bucket in engine.slots))
+
+    @override_settings(OCTOFIT_POINT_FORMULAS={
+        'default': {'calories_burned': 1},
+        'Running': {'distance': 10, 'duration': 1},
+    })
+    def test_window_standings(self):
+        """Test that ?window= ranks teams and users by formula points inside the window"""
+        self.log(self.users[0], 0)                                   # 80 points
+        self.log(self.users[1], 1, activity_type='Yoga')            # 100 points
+        self.log(self.users[1], 10)                                  # outside 7d
+        response = self.client.get('/api/leaderboard/', {'window': '7d', 'scope': 'user'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['rank'], row['user_id'], row['points']) for row in response.data['results']],
+            [(1, str(self.users[1]._id), 100), (2, str(self.users[0]._id), 80)]
+        )
+
+        activity_id = self.log(self.users[0], 0, distance=20.0).data['_id']
+        response = self.client.get('/api/leaderboard/', {'window': '7d'})
+        self.assertEqual(response.data['results'], [{'rank': 1, 'team_id': str(self.team._id), 'points': 410}])
+        self.client.delete(f'/api/activities/{activity_id}/')
+        response = self.client.get('/api/leaderboard/', {'window': '30d'})
+        self.assertEqual(response.data['results'][0]['points'], 260)
+
+        self.assertEqual(self.client.get('/api/leaderboard/', {'window': '2y'}).status_code, 400)
+        self.assertIn('total_points', self.client.get('/api/leaderboard/').data['results'][0])
+
+    def test_other_workers_writes_are_caught_up_once(self):
+        """Test that activities written by other workers reach the standings through refreshes, counted once"""
+        self.log(self.users[0], 0)
+        standings = lambda: [
+            (row['user_id'], row['points'])
+            for row in self.client.get('/api/leaderboard/', {'window': '7d', 'scope': 'user'}).data['results']
+        ]
+        self.assertEqual(standings(), [(str(self.users[0]._id), 100)])
+
+        collection = get_collection(Activity)
+        other_id = collection.insert_one({
+            'user_id': str(self.users[1]._id), 'activity_type': 'Running', 'duration': 30, 'distance': 5.0,
+            'calories_burned': 150, 'date': datetime.now(timezone.utc).replace(tzinfo=None)
+        }).inserted_id
+        scoring_board.refresh()
+        scoring_board.refresh()
+        self.assertEqual(standings(), [(str(self.users[1]._id), 150), (str(self.users[0]._id), 100)])
+
+        # The catch-up only sees inserts; the periodic rebuild drops the other worker's delete.
+        collection.delete_one({'_id': other_id})
+        scoring_board.refresh(full=True)
+        self.assertEqual(standings(), [(str(self.users[0]._id), 100)])
+
+    @override_settings(OCTOFIT_SCORING_SYNC_SECONDS=0, OCTOFIT_SCORING_RELOAD_SECONDS=0)
+    def test_due_refresh_runs_off_the_request(self):
+        """Test that a due refresh is handed to a background thread instead of reloading in the request"""
+        self.log(self.users[0], 0)
+        self.client.get('/api/leaderboard/', {'window': '7d'})
+        with mock.patch('octofit_tracker.scoring.threading.Thread') as thread, \
+                mock.patch.object(scoring_board, '_rebuild') as rebuild:
+            response = self.client.get('/api/leaderboard/', {'window': '7d'})
+            scoring_board._refreshing.release()
+        self.assertEqual(response.data['results'][0]['points'], 100)
+        rebuild.assert_not_called()
+        thread.assert_called_once_with(target=scoring_board._refresh_in_background, name='scoring-refresh', daemon=True)
+
+@skipUnless(np is not None, 'numpy is not installed')
+class AnalyticsStoreTest(APITestCase):
+    def setUp(self):
+        for model in (Activity, User, Team):
+            model.objects.all().delete()
+        analytics_store.reset()
+        teams = [Team.objects.create(name=f'Analytics {i}', description='Team') for i in range(2)]
+        self.users = [
+            User.objects.create(
+                email=f'analytics{i}@octofit.com', username=f'Analytics {i}', password='secret',
+                team_id=str(teams[i % 2]._id) if i < 3 else None
+            )
+            for i in range(4)
+        ]
+        rng = random.Random(19)
+        for i in range(40):
+            Activity.objects.create(
+                user_id=str(rng.choice(self.users)._id), activity_type=rng.choice(['Running', 'Yoga', 'Cycling']),
+                duration=rng.randint(10, 90), distance=rng.choice([None, 2.5, 4.25, 10.0]),
+                calories_burned=rng.randint(50, 600),
+                date=datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(hours=rng.randint(0, 24 * 60))
+            )
+
+    def stats(self, path, params=None):
+        response = self.client.get(path, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_columnar_stats_match_aggregation(self):
+        """Test that the analytics store answers every grouping exactly like MongoDB"""
+        params = [{}, {'since': '2026-01-15', 'until': '2026-02-10'}, {'activity_type': 'Yoga'},
+                  {'team_id': self.users[0].team_id}, {'user_id': str(self.users[3]._id)}]
+        paths = ['/api/activities/stats/'] + [
+            f'/api/activities/stats/{group_by}/' for group_by in ('user', 'team', 'activity_type', 'day', 'week', 'month')
+        ]
+        expected = [self.stats(path, query) for path in paths for query in params]
+        with override_settings(OCTOFIT_ANALYTICS_STORE=True):
+            self.assertEqual([self.stats(path, query) for path in paths for query in params], expected)
+            self.assertEqual(self.client.get('/api/activities/stats/planet/').status_code, 400)
+
+    @override_settings(OCTOFIT_ANALYTICS_STORE=True)
+    def test_writes_update_loaded_columns(self):
+        """Test that created, updated and deleted activities are folded into the loaded columns"""
+        before = self.stats('/api/activities/stats/')
+        response = self.client.post('/api/activities/', {
+            'user_id': str(self.users[0]._id), 'activity_type': 'Rowing', 'duration': 45,
+            'distance': 3.0, 'calories_burned': 250, 'date': '2026-03-05T08:00:00Z'
+        }, format='json')
+        activity_id = response.data['_id']
+        self.assertEqual(self.stats('/api/activities/stats/')['count'], before['count'] + 1)
+        self.assertEqual(
+            self.stats('/api/activities/stats/activity_type/', {'activity_type': 'Rowing'})['results'][0]['calories_burned'],
+            250
+        )
+
+        self.client.patch(f'/api/activities/{activity_id}/', {'calories_burned': 100}, format='json')
+        self.assertEqual(self.stats('/api/activities/stats/')['calories_burned'], before['calories_burned'] + 100)
+
+        self.client.delete(f'/api/activities/{activity_id}/')
+        self.assertEqual(self.stats('/api/activities/stats/'), before)
+
+    @override_settings(OCTOFIT_ANALYTICS_STORE=True)
+    def test_other_workers_writes_are_caught_up(self):
+        """Test that a refresh appends other workers' inserts once and a reload drops their batch deletes"""
+        before = self.stats('/api/activities/stats/')
+        collection = get_collection(Activity)
+        documents = list(collection.find())
+        inserted = collection.insert_one({
+            'user_id': str(self.users[0]._id), 'activity_type': 'Rowing', 'duration': 45, 'distance': 3.0,
+            'calories_burned': 250, 'date': datetime(2026, 3, 5, 8)
+        }).inserted_id
+        analytics_store.refresh()
+        analytics_store.refresh()
+        self.assertEqual(self.stats('/api/activities/stats/')['count'], before['count'] + 1)
+
+        # Removing a batch that includes the last rows keeps every surviving row.
+        removed = documents[1::3] + documents[-2:] + [{'_id': inserted}]
+        analytics_store.apply((), removed)
+        collection.delete_many({'_id': {'$in': [document['_id'] for document in removed]}})
+        expected = self.stats('/api/activities/stats/user/')
+        analytics_store.refresh(full=True)
+        self.assertEqual(self.stats('/api/activities/stats/user/'), expected)
+        self.assertEqual(self.stats('/api/activities/stats/')['count'], len(documents) - len(removed) + 1)
+
+class FakeChangeStream:
+    """Replays queued change events, then reports itself closed."""
+
+    def __init__(self):
+        self.events = []
+        self.resume_token = {'_data': 'start'}
+        self.alive = True
+
+    def record(self, operation, model, _id):
+        document = get_collection(model).find_one({'_id': _id})
+        event = {
+            '_id': {'_data': f'{operation}:{_id}'}, 'operationType': operation,
+            'ns': {'db': 'test', 'coll': model._meta.db_table}, 'documentKey': {'_id': _id},
+        }
+        if operation != 'delete':
+            event['fullDocument'] = document
+        self.events.append(event)
+
+    def try_next(self):
+        if not self.events:
+            self.alive = False
+            return None
+        event = self.events.pop(0)
+        self.resume_token = event['_id']
+        return event
+
+    def close(self):
+        self.alive = False
+
+
+@override_settings(OCTOFIT_DERIVED_DATA_MODE='changestream')
+class WatchChangesTest(APITestCase):
+    def setUp(self):
+        for model in (Activity, User, Team, Leaderboard):
+            model.objects.all().delete()
+        for name in ('change_stream_tokens', 'change_state_activities', 'change_state_users', 'user_totals'):
+            get_collection(Activity).database[name].delete_many({})
+        self.teams = [Team.objects.create(name=f'Stream {i}', description='Team') for i in range(2)]
+        self.user = User.objects.create(
+            email='stream@octofit.com', username='Stream', password='secret', team_id=str(self.teams[0]._id)
+        )
+        self.stream = FakeChangeStream()
+
+    def insert_activity(self, calories):
+        _id = get_collection(Activity).insert_one({
+            'user_id': str(self.user._id), 'activity_type': 'Running', 'duration': 30, 'distance': 5.0,
+            'calories_burned': calories, 'date': datetime(2026, 2, 3, 7), 'notes': '', 'idempotency_key': None,
+        }).inserted_id
+        self.stream.record('insert', Activity, _id)
+        return _id
+
+    def points(self):
+        return {row.team_id: row.total_points for row in Leaderboard.objects.all()}
+
+    def watch(self):
+        with mock.patch.object(ChangeWatcher, 'watch', return_value=self.stream) as watch:
+            out = StringIO()
+            call_command('watch_changes', stdout=out)
+        return watch, out.getvalue()
+
+    def test_api_writes_wait_for_the_stream(self):
+        """Test that in changestream mode API writes leave derived data to the watcher"""
+        self.watch()
+        response = self.client.post('/api/activities/', {
+            'user_id': str(self.user._id), 'activity_type': 'Yoga', 'duration': 20,
+            'calories_burned': 90, 'date': '2026-02-03T08:00:00Z'
+        }, format='json')
+        self.assertEqual(self.points(), {})
+        self.stream = FakeChangeStream()
+        self.stream.record('insert', Activity, to_object_id(response.data['_id']))
+        self.watch()
+        self.assertEqual(self.points(), {str(self.teams[0]._id): 90})
+
+    def test_direct_writes_update_derived_data(self):
+        """Test that inserts, updates, deletes and team moves made outside Django reach every handler"""
+        watch, out = self.watch()
+        watch.assert_called_once_with(None)
+        self.stream = FakeChangeStream()
+        first = self.insert_activity(300)
+        second = self.insert_activity(200)
+        get_collection(Activity).update_one({'_id': second}, {'$set': {'calories_burned': 250, 'notes': 'hill'}})
+        self.stream.record('update', Activity, second)
+        watch, out = self.watch()
+        watch.assert_called_once_with({'_data': 'start'})
+        self.assertIn('Dispatched 3 events', out)
+        self.assertEqual(load_token('derived'), {'_data': f'update:{second}'})
+        team_a, team_b = str(self.teams[0]._id), str(self.teams[1]._id)
+        self.assertEqual(self.points(), {team_a: 550})
+        self.assertEqual(user_totals_collection().find_one({'_id': str(self.user._id)})['calories_burned'], 550)
+        history = self.client.get(f'/api/users/{self.user._id}/history/', {'since': '2026-02-01', 'until': '2026-02-05'})
+        self.assertEqual(history.data['results'][-1]['calories_burned'], 550)
+
+        # Re-delivered events already in the remembered state change nothing.
+        self.stream = FakeChangeStream()
+        self.stream.record('insert', Activity, first)
+        get_collection(User).update_one({'_id': self.user._id}, {'$set': {'team_id': team_b}})
+        self.stream.record('update', User, self.user._id)
+        get_collection(Activity).delete_one({'_id': first})
+        self.stream.record('delete', Activity, first)
+        self.watch()
+        self.assertEqual(self.points(), {team_a: 0, team_b: 250})
+
+        get_collection(Team).delete_one({'_id': self.teams[1]._id})
+        self.stream = FakeChangeStream()
+        self.stream.record('delete', Team, self.teams[1]._id)
+        self.watch()
+        self.assertEqual(self.points(), {team_a: 0})
+
+    def test_activity_before_team_move_in_separate_batches(self):
+        """Test that activities count for the team their user had at that point in the stream"""
+        self.watch()
+        team_a, team_b = str(self.teams[0]._id), str(self.teams[1]._id)
+        self.stream = FakeChangeStream()
+        self.insert_activity(100)
+        self.watch()
+        self.assertEqual(self.points(), {team_a: 100})
+
+        self.stream = FakeChangeStream()
+        self.insert_activity(50)
+        get_collection(User).update_one({'_id': self.user._id}, {'$set': {'team_id': team_b}})
+        self.watch()
+        self.assertEqual(self.points(), {team_a: 150})
+        self.stream = FakeChangeStream()
+        self.stream.record('update', User, self.user._id)
+        self.watch()
+        self.assertEqual(self.points(), {team_a: 0, team_b: 150})
+
+class FastSerializationTest(APITestCase):
+    def setUp(self):
+        for model in (Activity, User, Team):
+            model.objects.all().delete()
+        self.team = Team.objects.create(name='Team Fast', description='Fast')
+        self.user = User.objects.create(
+            email='fast@octofit.com', username='Fäst', password='secret', team_id=str(self.team._id)
+        )
+        for i, (distance, notes) in enumerate([(5.0, ''), (None, 'line\u2028break'), (1e-06, 'tiny'), (12.345, 'ünïcode')]):
+            Activity.objects.create(
+                user_id=str(self.user._id), activity_type='Running', duration=30 + i, distance=distance,
+                calories_burned=100 * i, date=datetime(2026, 1, 1 + i, 7, 30, 15, 123456), notes=notes
+            )
+
+    def test_compiled_list_matches_per_row_serializer(self):
+        """Test that many=True renders the same bytes as serializing each row on its own"""
+        renderer = JSONRenderer()
+        for serializer_class, rows in (
+            (ActivitySerializer, list(Activity.objects.all())),
+            (ActivitySerializer, list(repositories.activities.query())),
+            (UserSerializer, list(repositories.users.query())),
+        ):
+            compiled = serializer_class(rows, many=True).data
+            per_row = [serializer_class(row).data for row in rows]
+            self.assertEqual(renderer.render(compiled), renderer.render(per_row))
+        rows = Activity.objects.all()
+        fields = ActivitySerializer(rows, many=True, context={'fields': ['_id', 'date']}).data
+        self.assertEqual(list(fields[0]), ['_id', 'date'])
+
+    def test_fast_renderer_is_byte_identical(self):
+        """Test that FastJSONRenderer output matches JSONRenderer, including its fallbacks"""
+        data = {
+            'text': 'a\u2028b\u2029c ünïcode "quoted"', 'floats': [5.0, 0.1, 1e16, 2.5e-07, -0.0],
+            'when': datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc), 'day': date(2026, 1, 2),
+            'amount': Decimal('1.50'), 'big': 2 ** 70, 'nested': [{'a': None, 'b': True}], 'empty': {},
+        }
+        for sample in (data, {'plain': [1, 2.5, 'x']}, {1: 'int key'}, []):
+            self.assertEqual(FastJSONRenderer().render(sample), JSONRenderer().render(sample))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        self.assertEqual(
+            FastJSONRenderer().render({'a': 1}, 'application/json; indent=2'),
+            JSONRenderer().render({'a': 1}, 'application/json; indent=2')
+        )
+
+    def test_list_response_bytes(self):
+        """Test that list responses render exactly as DRF's serializers and renderer would"""
+        response = self.client.get('/api/activities/', {'page_size': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        expected = [ActivitySerializer(row).data for row in Activity.objects.order_by('-date')]
+        self.assertEqual(JSONRenderer().render(response.data['results']), JSONRenderer().render(expected))
+
+        response = self.client.get('/api/users/', {'expand': 'team'})
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertEqual(response.data['results'][0]['team']['name'], 'Team Fast')
+
+class LoginAPITest(APITestCase):
+    def setUp(self):
+        User.objects.all().delete()
+        reset_pool()
+
+    def tearDown(self):
+        reset_pool()
+
+    def login(self, email, password):
+        return self.client.post('/api/auth/login/', {'email': email, 'password': password}, format='json')
+
+    def test_signup_stores_hash_and_login_checks_it(self):
+        """Test that created users get a hashed password and can log in with the original"""
+        response = self.client.post('/api/users/', {
+            'email': 'hash@octofit.com', 'username': 'Hash', 'password': 'correct horse'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('password', response.data)
+        user = User.objects.get(email='hash@octofit.com')
+        self.assertNotEqual(user.password, 'correct horse')
+        self.assertTrue(user.check_password('correct horse'))
+
+        response = self.login('hash@octofit.com', 'correct horse')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['_id'], str(user._id))
+        self.assertNotIn('password', response.json())
+        self.assertEqual(self.login('hash@octofit.com', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('nobody@octofit.com', 'correct horse').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('hash@octofit.com', '').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/auth/login/').status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_login_upgrades_outdated_hash(self):
+        """Test that a correct login re-hashes a password stored with an old hasher"""
+        user = User.objects.create(
+            email='old@octofit.com', username='Old', password=make_password('secret', hasher='md5')
+        )
+        self.assertEqual(self.login('old@octofit.com', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(User.objects.get(_id=user._id).password.startswith('md5$'))
+        self.assertEqual(self.login('old@octofit.com', 'secret').status_code, status.HTTP_200_OK)
+        user = User.objects.get(_id=user._id)
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('secret'))
+
+    @override_settings(OCTOFIT_PASSWORD_QUEUE=0)
+    def test_full_pool_is_rejected(self):
+        """Test that logins and signups beyond the queue bound get 503 instead of waiting"""
+        response = self.login('any@octofit.com', 'secret')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        response = self.client.post('/api/users/', {
+            'email': 'busy@octofit.com', 'username': 'Busy', 'password': 'secret'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(User.objects.filter(email='busy@octofit.com').exists())
+
+    def test_migration_hashes_plain_passwords(self):
+        """Test that the data migration hashes plain-text passwords and leaves hashes alone"""
+        plain = User.objects.create(email='plain@octofit.com', username='Plain', password='plain123')
+        hashed = User.objects.create(email='done@octofit.com', username='Done', password=make_password('done123'))
+        migration = importlib.import_module('octofit_tracker.migrations.0007_hash_user_passwords')
+        migration.hash_passwords(None, connection.schema_editor())
+        self.assertTrue(User.objects.get(_id=plain._id).check_password('plain123'))
+        self.assertEqual(User.objects.get(_id=hashed._id).password, hashed.password)
+
+
+class TokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        User.objects.all().delete()
+        reset_pool()
+        tokens.verified.clear()
+        self.user = User.objects.create(email='token@octofit.com', username='Token', password=make_password('secret'))
+
+    def tearDown(self):
+        reset_pool()
+        tokens.verified.clear()
+
+    def login(self):
+        response = self.client.post('/api/auth/login/', {'email': 'token@octofit.com', 'password': 'secret'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['token']
+
+    def test_login_token_authenticates_without_mongo_on_repeat(self):
+        """Test that a login token authenticates and repeat checks are served from the cache"""
+        token = self.login()
+        self.assertEqual(tokens.verify_token(token)._id, self.user._id)
+        with mock.patch.object(tokens, 'get_collection', side_effect=AssertionError('Mongo was queried')):
+            self.assertEqual(tokens.verify_token(token).email, 'token@octofit.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/users/').status_code, status.HTTP_200_OK)
+
+    def test_bad_and_expired_tokens_are_rejected(self):
+        """Test that tampered, malformed and expired tokens get 401"""
+        token = self.login()
+        for bad in [token[:-1] + ('A' if token[-1] != 'A' else 'B'), 'garbage', f'{token} extra']:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {bad}')
+            self.assertEqual(self.client.get('/api/users/').status_code, status.HTTP_401_UNAUTHORIZED)
+        with override_settings(OCTOFIT_TOKEN_MAX_AGE=-1):
+            self.assertIsNone(tokens.verify_token(tokens.issue_token(self.user._id)))
+
+    def test_logout_revokes_tokens(self):
+        """Test that logging out invalidates every token issued before it"""
+        first, second = self.login(), self.login()
+        self.assertIsNotNone(tokens.verify_token(second))
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {first}')
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNone(tokens.verify_token(first))
+        self.assertIsNone(tokens.verify_token(second))
+        self.assertIsNotNone(tokens.verify_token(self.login()))
+
+    def test_password_change_revokes_tokens(self):
+        """Test that changing the password revokes tokens and other edits do not"""
+        token = self.login()
+        url = f'/api/users/{self.user._id}/'
+        self.assertEqual(self.client.patch(url, {'username': 'Renamed'}, format='json').status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(tokens.verify_token(token))
+        self.assertEqual(self.client.patch(url, {'password': 'changed'}, format='json').status_code, status.HTTP_200_OK)
+        self.assertIsNone(tokens.verify_token(token))
+        self.assertEqual(User.objects.get(_id=self.user._id).token_version, 1)
+
+    def test_migration_defaults_missing_token_versions(self):
+        """Test that the data migration sets token_version on users written before the field existed"""
+        get_collection(User).update_one({'_id': self.user._id}, {'$unset': {'token_version': ''}})
+        migration = importlib.import_module('octofit_tracker.migrations.0008_user_token_version')
+        migration.default_token_versions(None, connection.schema_editor())
+        self.assertEqual(get_collection(User).find_one({'_id': self.user._id})['token_version'], 0)
+
+
+class UserActivityFeedTest(APITestCase):
+    def setUp(self):
+        for model in (Leaderboard, Activity, User, Team):
+            model.objects.all().delete()
+        get_collection(Activity).database['feed_versions'].delete_many({})
+        self.users = [
+            User.objects.create(email=f'feed{i}@octofit.com', username=f'Feed {i}', password='secret')
+            for i in range(2)
+        ]
+        for day in range(1, 6):
+            for user in self.users:
+                Activity.objects.create(
+                    user_id=str(user._id), activity_type='Running' if day % 2 else 'Yoga', duration=10 * day,
+                    calories_burned=30 * day, date=datetime(2026, 3, day, 6, tzinfo=timezone.utc)
+                )
+        self.url = f'/api/users/{self.users[0]._id}/activities/'
+
+    def test_filters_and_keyset_pages(self):
+        """Test that the feed is one user's newest-first activities, filtered and paged by cursor"""
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = response.json()['results']
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'])
+            rows += response.json()['results']
+        self.assertEqual([row['duration'] for row in rows], [50, 40, 30, 20, 10])
+        self.assertEqual({row['user_id'] for row in rows}, {str(self.users[0]._id)})
+
+        response = self.client.get(self.url, {'since': '2026-03-02', 'until': '2026-03-05', 'activity_type': 'Running'})
+        self.assertEqual([row['duration'] for row in response.json()['results']], [30])
+        self.assertEqual(self.client.get(self.url, {'since': 'soon'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'bogus'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/users/nope/activities/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_conditional_get_skips_mongo_until_feed_changes(self):
+        """Test that a current ETag gets 304 without a query and a new activity changes it"""
+        etag = self.client.get(self.url)['ETag']
+        with mock.patch('octofit_tracker.views.user_feed', side_effect=AssertionError('Mongo was queried')):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertNotEqual(self.client.get(self.url, {'activity_type': 'Yoga'})['ETag'], etag)
+
+        self.client.post('/api/activities/', {
+            'user_id': str(self.users[1]._id), 'activity_type': 'Running', 'duration': 5,
+            'calories_burned': 10, 'date': '2026-03-09T06:00:00Z',
+        }, format='json')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.post('/api/activities/', {
+            'user_id': str(self.users[0]._id), 'activity_type': 'Running', 'duration': 5,
+            'calories_burned': 10, 'date': '2026-03-09T06:00:00Z',
+        }, format='json')
+        # Versions are shared through MongoDB, not this process's cache.
+        cache.clear()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['duration'], 5)
+
+
+@override_settings(OCTOFIT_ADMIN_PERFORMANCE_MODE=True)
+class AdminPerformanceModeTest(TestCase):
+    def setUp(self):
+        for model in (Activity, User):
+            model.objects.all().delete()
+        AdminUser.objects.filter(username='admin').delete()
+        cache.clear()
+        self.client.force_login(AdminUser.objects.create_superuser('admin', 'admin@octofit.com', 'secret'))
+        user_id = str(User.objects.create(email='admin-feed@octofit.com', username='Feed', password='secret')._id)
+        for day in (1, 2, 2, 2, 2, 3, 4):
+            Activity.objects.create(
+                user_id=user_id, activity_type='Running' if day % 2 else 'Yoga', duration=10,
+                calories_burned=30, date=datetime(2026, 3, day, 6, tzinfo=timezone.utc)
+            )
+        self.url = '/admin/octofit_tracker/activity/'
+
+    def test_keyset_pages_cover_every_activity_once(self):
+        """Test that cursor pages walk the changelist newest first without gaps or repeats"""
+        expected = [a._id for a in sorted(Activity.objects.all(), key=lambda a: (a.date, a._id), reverse=True)]
+        seen, url = [], self.url
+        with mock.patch.object(ActivityAdmin, 'list_per_page', 3):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                cl = response.context['cl']
+                self.assertIsInstance(cl, KeysetChangeList)
+                self.assertTrue(cl.keyset)
+                self.assertEqual(cl.result_count, 7)
+                seen += [row._id for row in cl.result_list]
+                url = cl.next_url and self.url + cl.next_url
+        self.assertEqual(seen, expected)
+        self.assertContains(response, 'First page')
+        self.assertEqual(self.client.get(self.url, {'cursor': 'bogus'}).status_code, status.HTTP_302_FOUND)
+
+    def test_cached_filter_choices_and_prefix_search(self):
+        """Test that filter choices are cached and search matches prefixes only"""
+        cl = self.client.get(self.url).context['cl']
+        self.assertEqual(list(cl.filter_specs[0].lookup_choices), ['Running', 'Yoga'])
+        Activity.objects.create(
+            user_id='swimmer', activity_type='Swimming', duration=10, calories_burned=30,
+            date=datetime(2026, 3, 6, tzinfo=timezone.utc)
+        )
+        cl = self.client.get(self.url).context['cl']
+        self.assertEqual(list(cl.filter_specs[0].lookup_choices), ['Running', 'Yoga'])
+        cl = self.client.get(self.url, {'q': 'Runn'}).context['cl']
+        self.assertEqual({row.activity_type for row in cl.result_list}, {'Running'})
+        self.assertEqual(cl.result_count, 2)
+        self.assertEqual(list(self.client.get(self.url, {'q': 'unning'}).context['cl'].result_list), [])
+        response = self.client.get(self.url, {'o': '3'})
+        self.assertFalse(response.context['cl'].keyset)
+        self.assertEqual(response.context['cl'].result_count, 8)
+
+    def test_filtered_keyset_pages_skip_the_count(self):
+        """Test that filtered keyset pages issue no COUNT and only link to the next page"""
+        with mock.patch.object(ActivityAdmin, 'list_per_page', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'activity_type': 'Yoga'})
+        cl = response.context['cl']
+        self.assertTrue(cl.keyset)
+        self.assertFalse([query for query in queries if 'COUNT' in query['sql'].upper()])
+        self.assertEqual(cl.result_count, 2)
+        self.assertTrue(cl.next_url)
+        self.assertContains(response, f'2+ {Activity._meta.verbose_name_plural}')
+
+    def test_numbered_pages_skip_the_count(self):
+        """Test that the User changelist and sorted Activity changelists issue no COUNT either"""
+        for i, team in enumerate(['red', 'red', 'red', 'blue']):
+            User.objects.create(email=f'admin{i}@octofit.com', username=f'Admin {i}', password='secret', team_id=team)
+        users_url = '/admin/octofit_tracker/user/'
+        pages, url = [], users_url + '?team_id=red'
+        with mock.patch.object(UserAdmin, 'list_per_page', 2), CaptureQueriesContext(connection) as queries:
+            while url:
+                cl = self.client.get(url).context['cl']
+                self.assertFalse(cl.keyset)
+                pages.append(sorted(user.username for user in cl.result_list))
+                url = cl.next_url and users_url + cl.next_url
+            response = self.client.get(users_url)
+            sorted_page = self.client.get(self.url, {'o': '3', 'activity_type': 'Yoga'}).context['cl']
+            self.client.get(self.url, {'o': '3'})
+        self.assertFalse([query for query in queries if 'COUNT' in query['sql'].upper()])
+        self.assertEqual(pages, [['Admin 1', 'Admin 2'], ['Admin 0']])
+        self.assertEqual(cl.first_url, '?team_id=red')
+        self.assertEqual(response.context['cl'].result_count, 5)
+        self.assertEqual((sorted_page.result_count, sorted_page.next_url), (5, None))
+
+    @override_settings(OCTOFIT_ADMIN_PERFORMANCE_MODE=False)
+    def test_disabled_mode_uses_django_changelist(self):
+        """Test that the admin is unchanged when performance mode is off"""
+        cl = self.client.get(self.url, {'q': 'unning'}).context['cl']
+        self.assertNotIsInstance(cl, KeysetChangeList)
+        self.assertEqual(cl.result_count, 2)
+
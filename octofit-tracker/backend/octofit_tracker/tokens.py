@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from pymongo import ReturnDocument
+from rest_framework import authentication, exceptions
+
+from .models import User
+from .mongo import get_collection, to_object_id
+
+TOKEN_SALT = 'octofit_tracker.tokens'
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields]
+
+
+def _signer():
+    return signing.TimestampSigner(salt=TOKEN_SALT)
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire at a per-entry deadline."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard_where(self, predicate):
+        with self._lock:
+            for key in [key for key, (value, _) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+verified = TTLCache(settings.OCTOFIT_TOKEN_CACHE_SIZE)
+
+
+def issue_token(user_id, version=0):
+    """Sign ``user_id`` and its current token version; valid for OCTOFIT_TOKEN_MAX_AGE seconds."""
+    return _signer().sign(f'{user_id}:{version or 0}')
+
+
+def load_user(user_id):
+    object_id = to_object_id(user_id)
+    document = get_collection(User).find_one({'_id': object_id}, dict.fromkeys(USER_FIELDS, 1)) if object_id else None
+    if document is None:
+        return None
+    return User(**{name: document.get(name) for name in USER_FIELDS})
+
+
+def verify_token(token):
+    """Return the User a token was issued to, or None if it is invalid, expired or revoked.
+
+    Verified tokens and their users are kept for up to
+    OCTOFIT_TOKEN_CACHE_SECONDS, so repeat requests cost one dict lookup
+    and no Mongo round trip. A miss re-reads the user's token_version, so a
+    revocation made by another process is seen once that entry expires.
+    """
+    now = time.monotonic()
+    user = verified.get(token, now)
+    if user is not None:
+        return user
+    max_age = settings.OCTOFIT_TOKEN_MAX_AGE
+    try:
+        value = _signer().unsign(token, max_age=max_age)
+        user_id, version = value.rsplit(':', 1)
+        issued = signing.b62_decode(token.rsplit(':', 2)[1])
+        version = int(version)
+    except (signing.BadSignature, ValueError):
+        return None
+    user = load_user(user_id)
+    if user is None or (user.token_version or 0) != version:
+        return None
+    lifetime = min(settings.OCTOFIT_TOKEN_CACHE_SECONDS, issued + max_age - time.time())
+    verified.set(token, user, now + lifetime)
+    return user
+
+
+def revoke_tokens(user_id):
+    """Invalidate every token issued to ``user_id`` so far and return the new version."""
+    document = get_collection(User).find_one_and_update(
+        {'_id': to_object_id(user_id)}, {'$inc': {'token_version': 1}},
+        projection={'token_version': 1}, return_document=ReturnDocument.AFTER,
+    )
+    if document is None:
+        return None
+    verified.discard_where(lambda user: str(user._id) == str(user_id))
+    return document['token_version']
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """``Authorization: Bearer <token>`` with tokens from /api/auth/login/."""
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            token = header[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        user = verify_token(token)
+        if user is None:
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        return user, token
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -16,9 +16,17 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, TeamViewSet, ActivityViewSet, LeaderboardViewSet, WorkoutViewSet
+from . import profiling
+from .views import login, logout, UserViewSet, TeamViewSet, ActivityViewSet, LeaderboardViewSet, WorkoutViewSet
 import os
 
+try:
+    from . import async_views
+except (ImportError, AttributeError):
+    # motor 2.x (the last release djongo's pymongo 3 allows) uses asyncio.coroutine,
+    # which Python 3.11 removed; the sync API, login included, still works there.
+    async_views = None
+
 # This Django app runs on GitHub Codespaces at: <codespace-name>-8000.app.github.dev
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -29,6 +37,20 @@ router.register(r'workouts', WorkoutViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', profiling.metrics_view),
+    path('api/auth/login/', login),
+    path('api/auth/logout/', logout),
+]
+if async_views is not None:
+    urlpatterns += [
+        # Async (Motor) read paths, for ASGI only: serve with uvicorn octofit_tracker.asgi:application.
+        # Under WSGI every call runs in a fresh event loop, and so builds a fresh Motor client.
+        path('api/async/activities/', async_views.activity_list),
+        path('api/async/activities/stats/', async_views.activity_stats),
+        path('api/async/activities/stats/<str:group_by>/', async_views.activity_stats),
+        path('api/async/leaderboard/', async_views.leaderboard),
+    ]
+urlpatterns += [
     path('api/', include(router.urls)),
     path('', include(router.urls)),  # Root points to API
 ]
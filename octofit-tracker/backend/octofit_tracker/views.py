@@ -1,23 +1,358 @@
-from rest_framework import viewsets
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .bulk import BULK_MAX_ITEMS, bulk_create_activities
+from .cache import CachedResponseMixin, etag_matches, make_etag
+from .derived import activity_snapshot, apply_activity_changes
+from .exports import EXPORT_CONTENT_TYPES, export_activities
+from .feeds import feed_query, feed_version, user_feed
+from .keyset import encode_cursor
 from .models import User, Team, Activity, Leaderboard, Workout
-from .serializers import UserSerializer, TeamSerializer, ActivitySerializer, LeaderboardSerializer, WorkoutSerializer
+from .mongo import get_collection, to_object_id
+from .pagination import DateCursorPagination, RankCursorPagination
+from .parsers import NDJSONParser
+from .passwords import verify_password
+from . import analytics, repositories
+from .rankings import RANKING_METRICS, board as ranking_board
+from .rollups import COLLECTIONS as ROLLUP_PERIODS, read_history
+from .scoring import SCOPES as SCORING_SCOPES, board as scoring_board
+from .serializers import (
+    UserSerializer, TeamSerializer, ActivitySerializer, LeaderboardSerializer, WorkoutSerializer, represent_document
+)
+from .stats import EMPTY_TOTALS, parse_when, activity_match, activity_stats
+from .tokens import SignedTokenAuthentication, issue_token, revoke_tokens
 
-class UserViewSet(viewsets.ModelViewSet):
+LOGIN_FIELDS = [name for name in UserSerializer.Meta.fields if name != 'password']
+
+class ObjectIdLookupMixin:
+    """Resolve detail routes by ObjectId; djongo does not coerce the hex string itself."""
+
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        object_id = to_object_id(self.kwargs[lookup_url_kwarg])
+        if object_id is None:
+            raise Http404
+        self.kwargs[lookup_url_kwarg] = object_id
+        return super().get_object()
+
+class FieldProjectionMixin:
+    """Honour ``?fields=a,b`` on reads in both the serializer and the Mongo projection."""
+
+    def get_requested_fields(self):
+        raw = self.request.query_params.get('fields') if self.request else None
+        if not raw or self.request.method not in permissions.SAFE_METHODS:
+            return None
+        requested = {name.strip() for name in raw.split(',') if name.strip()}
+        available = self.get_serializer_class().Meta.fields
+        unknown = requested - set(available)
+        if unknown:
+            raise ValidationError({'fields': f'Unknown fields: {", ".join(sorted(unknown))}'})
+        return [name for name in available if name in requested]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+
+    def get_projection_fields(self, fields):
+        # The cursor paginator reads its ordering field from every row.
+        ordering = getattr(self.pagination_class, 'ordering', None)
+        if isinstance(ordering, str):
+            fields = fields + [ordering.lstrip('-')]
+        return fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields:
+            queryset = queryset.only(*self.get_projection_fields(fields))
+        return queryset
+
+class ExpandMixin:
+    """Inline related objects for ``?expand=team`` / ``?expand=user``.
+
+    The string ids on the page are resolved with one ``$in`` query per
+    expansion, never one query per row.
+    """
+
+    def get_requested_expansions(self):
+        raw = self.request.query_params.get('expand') if self.request else None
+        if not raw or self.request.method not in permissions.SAFE_METHODS:
+            return []
+        requested = [name.strip() for name in raw.split(',') if name.strip()]
+        expandable = self.get_serializer_class().expandable_fields
+        unknown = set(requested) - set(expandable)
+        if unknown:
+            raise ValidationError({'expand': f'Cannot expand: {", ".join(sorted(unknown))}'})
+        return requested
+
+    def get_projection_fields(self, fields):
+        expandable = self.get_serializer_class().expandable_fields
+        sources = [expandable[name][0] for name in self.get_requested_expansions()]
+        return super().get_projection_fields(fields) + sources
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        expansions = self.get_requested_expansions()
+        if args and expansions:
+            rows = args[0] if kwargs.get('many') else [args[0]]
+            serializer.context['expanded'] = self.resolve_expansions(rows, expansions)
+        return serializer
+
+    def resolve_expansions(self, rows, expansions):
+        expandable = self.get_serializer_class().expandable_fields
+        expanded = {}
+        for name in expansions:
+            source, serializer_class = expandable[name]
+            ids = {getattr(row, source) for row in rows}
+            object_ids = [oid for oid in map(to_object_id, ids) if oid is not None]
+            related = serializer_class.Meta.model.objects.filter(_id__in=object_ids) if object_ids else []
+            expanded[name] = {
+                item['_id']: item for item in serializer_class(related, many=True).data
+            }
+        return expanded
+
+class RepositoryMixin:
+    """Serve ``repository_actions`` from a pymongo repository instead of the ORM.
+
+    The repository query stands in for the queryset, so pagination,
+    projection and detail lookups work unchanged while rows skip djongo's
+    SQL translation and model instantiation. Writes always use the ORM.
+    """
+    repository = None
+    repository_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        if self.repository is not None and self.action in self.repository_actions:
+            return self.repository.query()
+        return super().get_queryset()
+
+def get_limit_offset(request, default=100, maximum=1000):
+    try:
+        limit = min(max(int(request.query_params.get('limit', default)), 1), maximum)
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+    except ValueError:
+        raise ValidationError({'limit': 'limit and offset must be integers.'})
+    return limit, offset
+
+class HistoryMixin:
+    """``/{id}/history/?period=day|week&since=&until=`` read only from the activity rollups."""
+    history_scope = None
+
+    @action(detail=True, url_path='history')
+    def history(self, request, pk=None):
+        if to_object_id(pk) is None:
+            raise Http404
+        period = request.query_params.get('period', 'day')
+        if period not in ROLLUP_PERIODS:
+            raise ValidationError({'period': f'Expected one of: {", ".join(ROLLUP_PERIODS)}'})
+        since, until = (
+            parse_when(name, request.query_params[name]) if request.query_params.get(name) else None
+            for name in ('since', 'until')
+        )
+        rows = read_history(self.history_scope, pk, period, since=since, until=until)
+        return Response({'period': period, 'results': rows})
+
+class MongoModelViewSet(ObjectIdLookupMixin, ExpandMixin, FieldProjectionMixin, RepositoryMixin, viewsets.ModelViewSet):
+    pass
+
+class UserViewSet(HistoryMixin, MongoModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    repository = repositories.users
+    history_scope = 'user'
+
+    def get_metric(self):
+        metric = self.request.query_params.get('metric', RANKING_METRICS[0])
+        if metric not in RANKING_METRICS:
+            raise ValidationError({'metric': f'Expected one of: {", ".join(RANKING_METRICS)}'})
+        return metric
+
+    @action(detail=False, url_path='rankings')
+    def rankings(self, request):
+        """Top users by ``?metric=``, paged with ``limit`` and ``offset``."""
+        metric = self.get_metric()
+        limit, offset = get_limit_offset(request)
+        count, rows = ranking_board.top(metric, limit, offset)
+        return Response({'metric': metric, 'count': count, 'results': rows})
+
+    @action(detail=True, url_path='rank')
+    def rank(self, request, pk=None):
+        """One user's rank and score by ``?metric=``; users without activities score 0."""
+        if to_object_id(pk) is None:
+            raise Http404
+        metric = self.get_metric()
+        count, (rank, score) = ranking_board.rank(metric, pk)
+        return Response({'user_id': pk, 'metric': metric, 'rank': rank, 'score': score, 'count': count})
+
+    @action(detail=True, url_path='activities')
+    def activities(self, request, pk=None):
+        """Newest-first activities of one user, filtered by ``since``, ``until`` and ``activity_type``.
 
-class TeamViewSet(viewsets.ModelViewSet):
+        Pages are keyset pages on (date, _id). The ETag is derived from the
+        user's feed version, so a poll whose If-None-Match is still current
+        gets a 304 after one ``_id`` lookup instead of the page query.
+        """
+        if to_object_id(pk) is None:
+            raise Http404
+        query = feed_query(pk, request.query_params)
+        # Read the version before the rows: a write in between can only make the ETag older.
+        etag = make_etag([pk, feed_version(pk), sorted(request.query_params.lists()), request.accepted_renderer.format])
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        size = self.paginator.get_page_size(request)
+        rows = user_feed(repositories.activities, query, size)
+        next_url = None
+        if len(rows) > size:
+            rows = rows[:size]
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(rows[-1].date, rows[-1]._id))
+        return Response({
+            'next': next_url,
+            'previous': None,
+            'results': ActivitySerializer(rows, many=True).data,
+        }, headers={'ETag': etag})
+
+    def perform_update(self, serializer):
+        password = serializer.instance.password
+        user = serializer.save()
+        if user.password != password:
+            revoke_tokens(user._id)
+
+class TeamViewSet(HistoryMixin, CachedResponseMixin, MongoModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
+    history_scope = 'team'
 
-class ActivityViewSet(viewsets.ModelViewSet):
+class ActivityViewSet(MongoModelViewSet):
     queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
+    pagination_class = DateCursorPagination
+    repository = repositories.activities
+
+    def perform_create(self, serializer):
+        activity = serializer.save()
+        apply_activity_changes(added=[activity_snapshot(activity)])
+
+    def perform_update(self, serializer):
+        before = activity_snapshot(serializer.instance)
+        activity = serializer.save()
+        apply_activity_changes(added=[activity_snapshot(activity)], removed=[before])
+
+    def perform_destroy(self, instance):
+        before = activity_snapshot(instance)
+        instance.delete()
+        apply_activity_changes(removed=[before])
 
-class LeaderboardViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """Create up to BULK_MAX_ITEMS activities from a JSON array or NDJSON body."""
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of activities.']})
+        if len(items) > BULK_MAX_ITEMS:
+            raise ValidationError({'non_field_errors': [f'At most {BULK_MAX_ITEMS} activities per request.']})
+        results = bulk_create_activities(items, self.get_serializer(data=items, many=True))
+        counts = {'created': 0, 'duplicate': 0, 'invalid': 0, 'failed': 0}
+        for result in results:
+            counts[result['status']] += 1
+        ok = not (counts['invalid'] or counts['failed'])
+        return Response(
+            dict(counts, results=results),
+            status=status.HTTP_201_CREATED if ok else status.HTTP_207_MULTI_STATUS,
+        )
+
+    @action(detail=False, url_path='export')
+    def export(self, request):
+        """Stream every matching activity as NDJSON or CSV (``?output=ndjson|csv``)."""
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_CONTENT_TYPES:
+            raise ValidationError({'output': f'Expected one of: {", ".join(EXPORT_CONTENT_TYPES)}'})
+        match = activity_match(request.query_params)
+        response = StreamingHttpResponse(export_activities(match, output), content_type=EXPORT_CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="activities.{output}"'
+        return response
+
+    @action(detail=False, url_path='stats')
+    def stats(self, request):
+        """Overall totals, from the analytics store when enabled, else aggregated in MongoDB."""
+        rows = self.activity_stats(None, request.query_params)
+        return Response(rows[0] if rows else EMPTY_TOTALS)
+
+    @action(detail=False, url_path=r'stats/(?P<group_by>[a-z_]+)')
+    def grouped_stats(self, request, group_by=None):
+        """Totals per user, team, activity_type, day, week or month."""
+        rows = self.activity_stats(group_by, request.query_params)
+        return Response({'group_by': group_by, 'results': rows})
+
+    def activity_stats(self, group_by, query_params):
+        if analytics.enabled():
+            return analytics.store.stats(group_by, query_params)
+        return activity_stats(group_by, match=activity_match(query_params))
+
+class LeaderboardViewSet(CachedResponseMixin, MongoModelViewSet):
     queryset = Leaderboard.objects.all().order_by('rank')
     serializer_class = LeaderboardSerializer
+    pagination_class = RankCursorPagination
+    repository = repositories.leaderboard
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        if 'window' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.window_standings(request)
+
+    def window_standings(self, request):
+        """Points per team or user (``?scope=``) over ``?window=``, from the scoring engine."""
+        window = request.query_params['window']
+        if window not in settings.OCTOFIT_SCORING_WINDOWS:
+            raise ValidationError({'window': f'Expected one of: {", ".join(settings.OCTOFIT_SCORING_WINDOWS)}'})
+        scope = request.query_params.get('scope', 'team')
+        if scope not in SCORING_SCOPES:
+            raise ValidationError({'scope': f'Expected one of: {", ".join(SCORING_SCOPES)}'})
+        limit, offset = get_limit_offset(request)
+        start, count, rows = scoring_board.standings(scope, window, limit, offset)
+        return Response({
+            'window': window,
+            'scope': scope,
+            'start': start.isoformat(),
+            'count': count,
+            'results': [
+                {'rank': row['rank'], f'{scope}_id': row['user_id'], 'points': row['score']}
+                for row in rows
+            ],
+        })
+
+class WorkoutViewSet(CachedResponseMixin, MongoModelViewSet):
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def login(request):
+    """Check ``{"email", "password"}`` and return the user with an API token.
+
+    Hashing runs on the bounded password pool; a full pool answers 503.
+    """
+    data = request.data if isinstance(request.data, dict) else {}
+    email, password = data.get('email'), data.get('password')
+    if not isinstance(email, str) or not isinstance(password, str) or not email or not password:
+        return Response({'detail': 'email and password are required.'}, status=status.HTTP_400_BAD_REQUEST)
+    projection = dict.fromkeys(LOGIN_FIELDS + ['password', 'token_version'], 1)
+    document = get_collection(User).find_one({'email': email}, projection)
+    if not verify_password(password, document and document.get('password'), document and document['_id']):
+        return Response({'detail': 'Invalid email or password.'}, status=status.HTTP_401_UNAUTHORIZED)
+    token = issue_token(document['_id'], document.get('token_version'))
+    return Response(dict(represent_document(document, LOGIN_FIELDS), token=token))
+
+@api_view(['POST'])
+@authentication_classes([SignedTokenAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def logout(request):
+    """Revoke every token issued to the caller, on all devices."""
+    revoke_tokens(request.user._id)
+    return Response(status=status.HTTP_204_NO_CONTENT)
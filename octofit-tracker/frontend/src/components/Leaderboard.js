@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 
 function Leaderboard() {
   const [leaderboard, setLeaderboard] = useState([]);
@@ -6,11 +6,12 @@ function Leaderboard() {
   const [error, setError] = useState(null);
 
   const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/leaderboard/`;
+  const streamUrl = `${apiUrl}stream/`;
 
-  useEffect(() => {
+  const fetchLeaderboard = useCallback(() => {
     console.log('Leaderboard Component - Fetching from API:', apiUrl);
     
-    fetch(apiUrl)
+    return fetch(apiUrl)
       .then(response => {
         console.log('Leaderboard Component - Response status:', response.status);
         if (!response.ok) {
@@ -33,6 +34,29 @@ function Leaderboard() {
       });
   }, [apiUrl]);
 
+  useEffect(() => {
+    fetchLeaderboard();
+
+    // Apply pushed rank and point changes instead of polling the API.
+    const source = new EventSource(streamUrl);
+    source.addEventListener('leaderboard', event => {
+      const { changes } = JSON.parse(event.data);
+      setLeaderboard(current => {
+        const byTeam = new Map(current.map(entry => [entry.team_id, entry]));
+        changes.forEach(change => {
+          if (change.deleted) {
+            byTeam.delete(change.team_id);
+          } else {
+            byTeam.set(change.team_id, { ...byTeam.get(change.team_id), ...change });
+          }
+        });
+        return [...byTeam.values()].sort((a, b) => a.rank - b.rank);
+      });
+    });
+    source.addEventListener('resync', fetchLeaderboard);
+    return () => source.close();
+  }, [fetchLeaderboard, streamUrl]);
+
   if (loading) return <div className="container mt-4"><p>Loading leaderboard...</p></div>;
   if (error) return <div className="container mt-4"><p className="text-danger">Error: {error}</p></div>;
 
@@ -55,7 +79,7 @@ function Leaderboard() {
             </thead>
             <tbody>
               {leaderboard.map((entry, index) => (
-                <tr key={entry.id}>
+                <tr key={entry.team_id}>
                   <td><span className="badge bg-success">{index + 1}</span></td>
                   <td>{entry.user}</td>
                   <td>{entry.team}</td>
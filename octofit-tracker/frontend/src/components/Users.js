@@ -2,49 +2,31 @@ import React, { useState, useEffect } from 'react';
 
 function Users() {
   const [users, setUsers] = useState([]);
-  const [teams, setTeams] = useState({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/users/`;
-  const teamsApiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/teams/`;
+  // expand=team inlines each user's team, so no separate /api/teams/ download is needed
+  const apiUrl = `https://${process.env.REACT_APP_CODESPACE_NAME}-8000.app.github.dev/api/users/?expand=team`;
 
   useEffect(() => {
     console.log('Users Component - Fetching from API:', apiUrl);
     
-    // Fetch teams first to map team_id to team names
-    Promise.all([
-      fetch(apiUrl).then(response => {
+    fetch(apiUrl)
+      .then(response => {
         console.log('Users Component - Response status:', response.status);
         if (!response.ok) {
           throw new Error(`HTTP error! status: ${response.status}`);
         }
         return response.json();
-      }),
-      fetch(teamsApiUrl).then(response => {
-        if (!response.ok) {
-          throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        return response.json();
       })
-    ])
-      .then(([usersData, teamsData]) => {
+      .then(usersData => {
         console.log('Users Component - Raw data received:', usersData);
         // Handle both paginated (.results) and plain array responses
         const usersArray = usersData.results || usersData;
-        const teamsArray = teamsData.results || teamsData;
-        
-        // Create a map of team_id to team name
-        const teamsMap = {};
-        teamsArray.forEach(team => {
-          teamsMap[team._id] = team.name;
-        });
         
         console.log('Users Component - Processed users:', usersArray);
-        console.log('Users Component - Teams map:', teamsMap);
         
         setUsers(Array.isArray(usersArray) ? usersArray : []);
-        setTeams(teamsMap);
         setLoading(false);
       })
       .catch(error => {
@@ -52,7 +34,7 @@ function Users() {
         setError(error.message);
         setLoading(false);
       });
-  }, [apiUrl, teamsApiUrl]);
+  }, [apiUrl]);
 
   if (loading) return <div className="container mt-4"><p>Loading users...</p></div>;
   if (error) return <div className="container mt-4"><p className="text-danger">Error: {error}</p></div>;
@@ -80,7 +62,7 @@ function Users() {
                   <td>{user.email}</td>
                   <td>
                     {user.team_id ? (
-                      <span className="badge bg-primary">{teams[user.team_id] || 'Unknown Team'}</span>
+                      <span className="badge bg-primary">{user.team ? user.team.name : 'Unknown Team'}</span>
                     ) : (
                       <span className="badge bg-secondary">No Team</span>
                     )}